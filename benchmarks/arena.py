@@ -0,0 +1,75 @@
+"""Arena benchmark
+
+Stores the benchmark program in a pyast.arena.Arena and compares its memory
+and counting over its columns with the Node tree.
+
+    python benchmarks/arena.py
+"""
+import gc
+import timeit
+import tracemalloc
+
+import jsast
+import pyast as ast
+from pyast import arena as columns
+from pyast.arena import Arena
+from pyast.visit import walk
+
+
+def allocated(make):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    value = make()
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return value, size
+
+
+def scan(prog):
+    return sum(1 for node in walk(prog)
+               if isinstance(node, jsast.Literal) and
+               isinstance(node.value, int))
+
+
+def run(size=10 ** 5):
+    ast.set_debug(False, jsast.Node)
+    prog, tree_size = allocated(lambda: jsast.program(size))
+    arena, arena_size = allocated(lambda: Arena(prog))
+    nodes = len(arena)
+    print('%d Nodes: tree %.1fMB (%d bytes/Node), arena %.1fMB '
+          '(%d bytes/Node)' % (nodes, tree_size / 1e6, tree_size / nodes,
+                               arena_size / 1e6, arena_size / nodes))
+    time = min(timeit.repeat(lambda: Arena(prog), number=1, repeat=3))
+    print('%-40s %9.1fms' % ('Arena(tree)', time * 1e3))
+    time = min(timeit.repeat(arena.tree, number=1, repeat=3))
+    print('%-40s %9.1fms' % ('arena.tree()', time * 1e3))
+
+    assert arena.count(jsast.Literal, value=int) == scan(prog)
+    backends = [('array', False)]
+    if columns.numpy is not None:
+        backends.append(('numpy', True))
+    cases = [('walk, Literal with int values', lambda: scan(prog))]
+    for label, use_numpy in backends:
+        cases.extend([
+            ('%s, count Literal with int values' % label,
+             lambda use_numpy=use_numpy: _with(
+                 arena, use_numpy, lambda: arena.count(jsast.Literal,
+                                                       value=int))),
+            ('%s, find Identifier named x5' % label,
+             lambda use_numpy=use_numpy: _with(
+                 arena, use_numpy, lambda: arena.find(jsast.Identifier,
+                                                      name='x5'))),
+        ])
+    for label, func in cases:
+        time = min(timeit.repeat(func, number=1, repeat=3))
+        print('%-40s %9.3fms' % (label, time * 1e3))
+
+
+def _with(arena, use_numpy, func):
+    arena.use_numpy = use_numpy
+    return func()
+
+
+if __name__ == '__main__':
+    run()
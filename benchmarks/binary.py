@@ -0,0 +1,32 @@
+"""Binary dump benchmark
+
+Compares the size and speed of pyast.dump.binary with pyast.dump.js.
+
+    python benchmarks/binary.py
+"""
+import timeit
+
+import jsast
+from pyast.dump import binary, js
+
+
+def run(sizes=(10 ** 4, 10 ** 5)):
+    for size in sizes:
+        prog = jsast.program(size)
+        text = js.dump(prog)
+        data = binary.dump(prog)
+        tjs = min(timeit.repeat(lambda: js.dump(prog), number=1, repeat=3))
+        dump = min(timeit.repeat(lambda: binary.dump(prog),
+                                 number=1, repeat=3))
+        load = min(timeit.repeat(lambda: binary.load(data),
+                                 number=1, repeat=3))
+        check = min(timeit.repeat(lambda: binary.load(data, validate=True),
+                                  number=1, repeat=3))
+        print('%7d js: %9d bytes %7.1fms  binary: %8d bytes  dump: %7.1fms  '
+              'load: %7.1fms  validated: %7.1fms' % (
+                  size, len(text), tjs * 1e3, len(data), dump * 1e3,
+                  load * 1e3, check * 1e3))
+
+
+if __name__ == '__main__':
+    run()
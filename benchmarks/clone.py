@@ -0,0 +1,44 @@
+"""Deep copy benchmark
+
+Compares Node.clone() (also used by copy.deepcopy) with the previous
+deepcopy path, which rebuilt every Node through __setstate__/__init__ and
+re-validated its fields, in debug and non-debug mode.
+
+    python benchmarks/clone.py
+"""
+import copy
+import timeit
+
+import jsast
+import pyast as ast
+
+
+def reinit(node):
+    """copy.deepcopy() as it worked before Node.__deepcopy__"""
+    classes = (ast.Node, ast.TypedList, ast.TypedDict)
+    methods = [cls.__deepcopy__ for cls in classes]
+    for cls in classes:
+        del cls.__deepcopy__
+    try:
+        return copy.deepcopy(node)
+    finally:
+        for cls, method in zip(classes, methods):
+            cls.__deepcopy__ = method
+
+
+def run(sizes=(10 ** 4, 10 ** 5)):
+    for debug in (True, False):
+        ast.set_debug(debug, jsast.Node)
+        for size in sizes:
+            prog = jsast.program(size)
+            old = min(timeit.repeat(lambda: reinit(prog), number=1, repeat=3))
+            deep = min(timeit.repeat(lambda: copy.deepcopy(prog),
+                                     number=1, repeat=3))
+            clone = min(timeit.repeat(prog.clone, number=1, repeat=3))
+            print('%-5s %7d __setstate__: %7.1fms  deepcopy: %7.1fms  '
+                  'clone: %7.1fms' % (debug, size, old * 1e3, deep * 1e3,
+                                      clone * 1e3))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,47 @@
+"""Node construction benchmark
+
+Compares the constructors generated by NodeBase with the generic
+Node.__init__ loop, in debug and non-debug mode.
+
+    python benchmarks/construction.py
+"""
+import timeit
+
+import jsast
+import pyast as ast
+
+
+def generic(cls, *args, **kwargs):
+    node = cls.__new__(cls)
+    ast.Node.__init__(node, *args, **kwargs)
+    return node
+
+
+def build(make):
+    return make(jsast.ExpressionStatement,
+                make(jsast.AssignmentExpression,
+                     make(jsast.Operator, "="),
+                     make(jsast.Identifier, "x"),
+                     make(jsast.Literal, 2)))
+
+
+def generated(cls, *args, **kwargs):
+    return cls(*args, **kwargs)
+
+
+def run(number=20000):
+    for debug in (True, False):
+        ast.set_debug(debug, jsast.Node)
+        times = {}
+        for name, make in (('generic', generic), ('generated', generated)):
+            times[name] = min(timeit.repeat(lambda: build(make),
+                                            number=number, repeat=5))
+        print('debug=%-5s generic: %.3fus/tree  generated: %.3fus/tree  '
+              'speedup: %.2fx' % (debug,
+                                  times['generic'] / number * 1e6,
+                                  times['generated'] / number * 1e6,
+                                  times['generic'] / times['generated']))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,51 @@
+"""Tree diff benchmark
+
+Times pyast.diff.diff() between the benchmark program and copies of it with
+a few statements changed, inserted, deleted and moved, at growing sizes, and
+apply_patch() of the edits; a == b of two equal programs is the baseline.
+
+    python benchmarks/diff.py
+"""
+import random
+import timeit
+
+import jsast
+import pyast as ast
+from pyast.diff import diff, apply_patch
+
+
+def edited(size, count, rng):
+    prog = jsast.program(size)
+    body = prog.body
+    for _ in range(count):
+        body[rng.randrange(size)].expression.right.value = -1
+        body.insert(rng.randrange(size), jsast.statement(size))
+        del body[rng.randrange(size)]
+        body.insert(rng.randrange(size), body.pop(rng.randrange(size)))
+    return prog
+
+
+def run(sizes=(10 ** 3, 10 ** 4, 10 ** 5), count=10):
+    ast.set_debug(False, jsast.Node)
+    rng = random.Random(0)
+    for size in sizes:
+        a = jsast.program(size)
+        b = edited(size, count, rng)
+        c = jsast.program(size)
+        equal = min(timeit.repeat(lambda: a == c,
+                                  number=1, repeat=3))
+        # the hashes of both trees are computed once and cached
+        first = timeit.timeit(lambda: diff(a, b), number=1)
+        edits = diff(a, b)
+        cached = min(timeit.repeat(lambda: diff(a, b), number=1, repeat=3))
+        copy = a.clone()
+        patch = timeit.timeit(lambda: apply_patch(copy, edits), number=1)
+        assert copy == b
+        print('%7d statements, %3d edits  a == b: %8.1fms  diff: %8.1fms  '
+              'cached: %8.1fms  apply_patch: %6.1fms' % (
+                  size, len(edits), equal * 1e3, first * 1e3, cached * 1e3,
+                  patch * 1e3))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,41 @@
+"""Structural hash and equality benchmark
+
+Times the first (uncached) and repeated hash() of a program, equality of
+two equal and two different programs, and a dict lookup keyed by a statement,
+in both modes.
+
+    python benchmarks/hashing.py
+"""
+import timeit
+
+import jsast
+import pyast as ast
+
+
+def run(sizes=(10 ** 4, 10 ** 5)):
+    for debug in (True, False):
+        ast.set_debug(debug, jsast.Node)
+        for size in sizes:
+            a = jsast.program(size)
+            b = jsast.program(size)
+            c = jsast.program(size)
+            c.body[-1].expression.right.value = -1
+            first = timeit.timeit(lambda: hash(a), number=1)
+            cached = min(timeit.repeat(lambda: hash(a), number=1, repeat=5))
+            hash(b)
+            hash(c)
+            equal = min(timeit.repeat(lambda: a == b, number=1, repeat=3))
+            differ = min(timeit.repeat(lambda: a == c, number=1000,
+                                       repeat=3)) / 1000
+            index = {a.body[0]: True}
+            key = b.body[0]
+            lookup = min(timeit.repeat(lambda: index[key], number=1000,
+                                       repeat=3)) / 1000
+            print('%-5s %7d hash: %7.2fms  cached: %6.2fus  '
+                  'a == b: %7.2fms  a == c: %6.2fus  lookup: %5.2fus' % (
+                      debug, size, first * 1e3, cached * 1e6, equal * 1e3,
+                      differ * 1e6, lookup * 1e6))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,62 @@
+"""Index benchmark
+
+Compares lookups through pyast.index.Index with walking the tree, on the
+benchmark program and after editing it.
+
+    python benchmarks/index.py
+"""
+import timeit
+
+import jsast
+import pyast as ast
+from pyast.index import Index
+from pyast.visit import walk
+
+
+def scan(prog, name):
+    return [node for node in walk(prog)
+            if isinstance(node, jsast.Identifier) and node.name == name]
+
+
+def run(size=10 ** 5):
+    ast.set_debug(True, jsast.Node)
+    prog = jsast.program(size)
+    time = min(timeit.repeat(
+        lambda: Index(prog, fields=[(jsast.Identifier, 'name')]),
+        number=1, repeat=3))
+    print('index %d statements: %7.1fms' % (size, time * 1e3))
+    index = Index(prog, fields=[(jsast.Identifier, 'name')])
+    assert len(index.find(jsast.Identifier, name='x5')) == \
+        len(scan(prog, 'x5'))
+    cases = (
+        ('walk', lambda: scan(prog, 'x5')),
+        ('find by class', lambda: index.find(jsast.AssignmentExpression)),
+        ('find by name', lambda: index.find(jsast.Identifier, name='x5')),
+    )
+    for label, func in cases:
+        time = min(timeit.repeat(func, number=1, repeat=3))
+        print('%-30s %9.3fms' % (label, time * 1e3))
+
+    def rename():
+        for node in index.find(jsast.Identifier, name='x5'):
+            node.name = 'y5'
+        for node in index.find(jsast.Identifier, name='y5'):
+            node.name = 'x5'
+    time = min(timeit.repeat(rename, number=1, repeat=3))
+    print('%-30s %9.3fms' % ('rename 1% and back', time * 1e3))
+
+    def edit():
+        prog.body[size // 2].expression.left = jsast.Identifier('x5')
+        return index.find(jsast.Identifier, name='x5')
+    time = min(timeit.repeat(edit, number=1, repeat=3))
+    print('%-30s %9.3fms' % ('replace a Node, find', time * 1e3))
+
+    def append():
+        prog.body.append(jsast.statement(5))
+        return index.find(jsast.Identifier, name='x5')
+    time = min(timeit.repeat(append, number=1, repeat=3))
+    print('%-30s %9.3fms' % ('append a statement, find', time * 1e3))
+
+
+if __name__ == '__main__':
+    run()
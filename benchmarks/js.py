@@ -0,0 +1,81 @@
+"""JSON dump and load benchmark
+
+Compares the streaming pyast.dump.js writer with the previous dump, which
+built a tree of OrderedDicts and passed it to json.dumps: time and peak
+memory allocated while writing a program to a file that discards it.
+
+Then compares pyast.dump.js.load, with and without validation, with
+json.loads reading the same document into plain dicts.
+
+    python benchmarks/js.py
+"""
+import json
+import timeit
+import tracemalloc
+from collections import OrderedDict
+
+import jsast
+import pyast as ast
+from pyast.dump import js
+
+
+class Sink(object):
+    def write(self, data):
+        pass
+
+
+def struct(node):
+    """The tree of OrderedDicts the previous dump passed to json.dumps"""
+    if node is None or isinstance(node, (int, bool, str)):
+        return node
+    result = OrderedDict({'type': None})
+    if isinstance(node, ast.Node):
+        result['type'] = node.__class__.__name__
+        for name in node._fields:
+            result[name] = struct(getattr(node, name))
+    elif isinstance(node, list):
+        result = [struct(item) for item in node]
+    elif isinstance(node, dict):
+        result = dict((key, struct(item)) for key, item in node.items())
+    return result
+
+
+def previous(prog, fp):
+    fp.write(json.dumps(struct(prog), indent=2))
+
+
+def peak(func):
+    tracemalloc.start()
+    func()
+    size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size
+
+
+def run(sizes=(10 ** 4, 10 ** 5)):
+    for size in sizes:
+        prog = jsast.program(size)
+        cases = (
+            ('json.dumps', lambda: previous(prog, Sink())),
+            ('dump', lambda: js.dump(prog, Sink())),
+            ('compact', lambda: js.dump(prog, Sink(), compact=True)),
+        )
+        for label, func in cases:
+            time = min(timeit.repeat(func, number=1, repeat=3))
+            print('%7d %-10s %7.1fms  peak: %8.1fKB' % (
+                size, label, time * 1e3, peak(func) / 1024.0))
+        text = js.dump(prog)
+        assert js.load(text) == prog
+        cases = (
+            ('json.loads', lambda: json.loads(text)),
+            ('load', lambda: js.load(text)),
+            ('validated', lambda: js.load(text, validate=True)),
+        )
+        for label, func in cases:
+            time = min(timeit.repeat(func, number=1, repeat=3))
+            print('%7d %-10s %7.1fms  peak: %8.1fKB' % (
+                size, label, time * 1e3, peak(func) / 1024.0))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,62 @@
+"""Small JavaScript-like grammar shared by the benchmarks
+
+Mirrors the example from the README.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pyast as ast
+
+
+class Node(ast.Node):
+    _abstract = True
+
+
+class Statement(Node):
+    _abstract = True
+
+
+class Expression(Node):
+    _abstract = True
+
+
+class Operator(Node):
+    token = ast.field(("+", "=", "-", "==", "!=", ">", "<"))
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    value = ast.field((str, bool, int), null=True)
+
+
+class Program(Node):
+    body = ast.seq(Statement, null=True)
+
+
+class ExpressionStatement(Statement):
+    expression = ast.field(Expression)
+
+
+class AssignmentExpression(Expression):
+    operator = ast.field(Operator)
+    left = ast.field(Expression)
+    right = ast.field(Expression)
+
+
+def statement(i):
+    return ExpressionStatement(
+        AssignmentExpression(
+            Operator("="),
+            Identifier("x%d" % (i % 100)),
+            Literal(i)))
+
+
+def program(size):
+    prog = Program()
+    for i in range(size):
+        prog.body.append(statement(i))
+    return prog
@@ -0,0 +1,66 @@
+"""Mapped tree benchmark
+
+Writes the benchmark program with pyast.dump.mapped and pyast.dump.binary,
+and compares the time and memory taken to read a few statements of it, and
+all of it, from the mapped file and from a full binary load. Memory is the
+Python heap held by the tree, the mapped pages are not counted.
+
+    python benchmarks/mapped.py
+"""
+import gc
+import os
+import tempfile
+import timeit
+import tracemalloc
+
+import jsast
+import pyast as ast
+from pyast.dump import binary, mapped
+from pyast.visit import walk
+
+
+def allocated(make):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    value = make()
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return value, size
+
+
+def read(load, count):
+    """Loads a tree and reads its first count statements and the Nodes below
+    them"""
+    root = load()
+    for statement in root.body[:count]:
+        for node in walk(statement):
+            pass
+    return root
+
+
+def run(size=10 ** 5, touched=100):
+    ast.set_debug(False, jsast.Node)
+    prog = jsast.program(size)
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        mapped.dump(prog, path)
+        data = binary.dump(prog)
+        print('%d Nodes: mapped file %.1fMB, binary dump %.1fMB' % (
+            size * 5 + 1, os.path.getsize(path) / 1e6, len(data) / 1e6))
+        loaders = [('binary.load()', lambda: binary.load(data)),
+                   ('mapped.load()', lambda: mapped.load(path).root)]
+        for count in (touched, size):
+            for label, load in loaders:
+                memory = allocated(lambda: read(load, count))[1]
+                time = min(timeit.repeat(lambda: read(load, count),
+                                         number=1, repeat=3))
+                print('%-14s %6d statements %9.1fms %9.1fMB' % (
+                    label, count, time * 1e3, memory / 1e6))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,103 @@
+"""Node memory benchmark
+
+Measures the bytes allocated per Node for the default __dict__ layout and
+the _slots = True layout.
+
+    python benchmarks/memory.py
+"""
+import gc
+import tracemalloc
+
+import jsast  # noqa, puts pyast on sys.path
+import pyast as ast
+
+
+def grammar(slots):
+    class Node(ast.Node):
+        _abstract = True
+        _debug = False
+        _slots = slots
+
+    class Operator(Node):
+        token = ast.field(("+", "=", "-", "==", "!=", ">", "<"))
+
+    class Identifier(Node):
+        name = ast.field(str)
+
+    class Literal(Node):
+        value = ast.field((str, bool, int), null=True)
+
+    class AssignmentExpression(Node):
+        operator = ast.field(Operator)
+        left = ast.field(Node)
+        right = ast.field(Node)
+
+    return Operator, Identifier, Literal, AssignmentExpression
+
+
+def measure(make, number):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    nodes = [make(i) for i in range(number)]
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    # the list holding the nodes is not part of the per-node cost
+    size -= nodes.__sizeof__()
+    return float(size) / number
+
+
+def run(number=100000):
+    names = ['x%d' % i for i in range(100)]
+    for slots in (False, True):
+        Operator, Identifier, Literal, AssignmentExpression = grammar(slots)
+        print('slots=%s' % slots)
+        for label, make in (
+                ('Identifier', lambda i: Identifier(names[i % 100])),
+                ('Literal', lambda i: Literal(i % 100)),
+                ('Operator', lambda i: Operator('=')),
+                ('Assignment', lambda i: AssignmentExpression(None, None,
+                                                              None))):
+            print('  %-10s %6.1f bytes/node' % (label, measure(make, number)))
+
+
+def frozen_grammar():
+    class Node(ast.FrozenNode):
+        _abstract = True
+        _debug = False
+        _slots = True
+
+    class Operator(Node):
+        token = ast.field(("+", "=", "-", "==", "!=", ">", "<"))
+
+    class Identifier(Node):
+        name = ast.field(str)
+
+    class Literal(Node):
+        value = ast.field((str, bool, int), null=True)
+
+    class AssignmentExpression(Node):
+        operator = ast.field(Operator)
+        left = ast.field(Node)
+        right = ast.field(Node)
+
+    return Operator, Identifier, Literal, AssignmentExpression
+
+
+def run_frozen(number=100000):
+    """Trees with many repeated subtrees, regular vs hash-consed"""
+    names = ['x%d' % i for i in range(100)]
+    for label, classes in (('regular', grammar(True)),
+                           ('frozen', frozen_grammar())):
+        Operator, Identifier, Literal, AssignmentExpression = classes
+
+        def make(i):
+            return AssignmentExpression(Operator('='),
+                                        Identifier(names[i % 100]),
+                                        Literal(i % 10))
+        print('%-8s %6.1f bytes/assignment' % (label, measure(make, number)))
+
+
+if __name__ == '__main__':
+    run()
+    run_frozen()
@@ -0,0 +1,51 @@
+"""Parallel rendering benchmark
+
+Times pyast.parallel.render(), dump_js() and dump_raw() on the benchmark
+program with a growing number of workers, for both transports, against the
+serial functions. Speedups need as many free cores as workers.
+
+    python benchmarks/parallel.py
+"""
+import multiprocessing
+import timeit
+
+import jsast
+import pyast as ast
+from pyast import parallel
+from pyast.dump import js, raw
+from pyast.template import render
+
+jsast.Program._template = '%(body)s'
+jsast.ExpressionStatement._template = '%(expression)s;'
+jsast.AssignmentExpression._template = '%(left)s%(operator)s%(right)s'
+jsast.Operator._template = '%(token)s'
+jsast.Identifier._template = '%(name)s'
+jsast.Literal._template = '%(value)s'
+
+
+def run(size=10 ** 5):
+    ast.set_debug(False, jsast.Node)
+    prog = jsast.program(size)
+    cpus = multiprocessing.cpu_count()
+    counts = [n for n in (2, 4, 8, 16, 32) if n <= max(2, cpus)]
+    print('%d statements, %d CPUs' % (size, cpus))
+    cases = [('render', render, parallel.render),
+             ('js', js.dump, parallel.dump_js),
+             ('raw', raw.dump, parallel.dump_raw)]
+    for label, serial, func in cases:
+        text = serial(prog)
+        base = min(timeit.repeat(lambda: serial(prog), number=1, repeat=3))
+        print('%-8s serial %27.1fms' % (label, base * 1e3))
+        for transport in ('fork', 'binary'):
+            for workers in counts:
+                assert func(prog, workers=workers,
+                            transport=transport) == text
+                time = min(timeit.repeat(
+                    lambda: func(prog, workers=workers, transport=transport),
+                    number=1, repeat=3))
+                print('%-8s %-6s %2d workers %10.1fms %6.2fx' % (
+                    label, transport, workers, time * 1e3, base / time))
+
+
+if __name__ == '__main__':
+    run()
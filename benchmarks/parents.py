@@ -0,0 +1,67 @@
+"""Parent pointers benchmark
+
+Builds the benchmark program with the jsast classes and with subclasses of
+them setting _parents, in debug and non-debug mode, then times path() on
+every statement.
+
+    python benchmarks/parents.py
+"""
+import timeit
+
+import jsast
+import pyast as ast
+
+
+def parented(cls):
+    return type(cls.__name__, (cls,), {'_parents': True})
+
+
+Operator = parented(jsast.Operator)
+Identifier = parented(jsast.Identifier)
+Literal = parented(jsast.Literal)
+Program = parented(jsast.Program)
+ExpressionStatement = parented(jsast.ExpressionStatement)
+AssignmentExpression = parented(jsast.AssignmentExpression)
+
+
+def statement(i):
+    return ExpressionStatement(
+        AssignmentExpression(
+            Operator("="),
+            Identifier("x%d" % (i % 100)),
+            Literal(i)))
+
+
+def program(size):
+    prog = Program()
+    for i in range(size):
+        prog.body.append(statement(i))
+    return prog
+
+
+def paths(prog):
+    for stmt in prog.body:
+        stmt.expression.left.path()
+
+
+def run(size=10 ** 5):
+    for debug in (True, False):
+        ast.set_debug(debug, jsast.Node)
+        base = min(timeit.repeat(lambda: jsast.program(size),
+                                 number=1, repeat=3))
+        time = min(timeit.repeat(lambda: program(size), number=1, repeat=3))
+        print('debug=%-5s build %d statements: %7.1fms, with parents: '
+              '%7.1fms (%.2fx)' % (debug, size, base * 1e3, time * 1e3,
+                                   time / base))
+        prog = program(size)
+        time = min(timeit.repeat(lambda: paths(prog), number=1, repeat=3))
+        print('debug=%-5s path() of %d Identifiers: %7.1fms' % (
+            debug, size, time * 1e3))
+        prog.body.insert(0, statement(-1))
+        time = min(timeit.repeat(lambda: paths(prog), number=1, repeat=1))
+        print('debug=%-5s path() after an insertion at 0: %7.1fms' % (
+            debug, time * 1e3))
+
+
+if __name__ == '__main__':
+    run()
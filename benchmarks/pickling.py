@@ -0,0 +1,68 @@
+"""Pickle benchmark
+
+Compares the size and round-trip time of pickled programs with the compact
+__reduce_ex__ generated for Node classes and with the default object protocol used before, which
+stored field names with every Node and re-validated everything through
+__setstate__/__init__ when loading. TypedLists use their __reduce_ex__ in
+both cases: with the default protocol they are extended before their
+__dict__ is restored, which fails.
+
+    python benchmarks/pickling.py
+"""
+import pickle
+import timeit
+
+import jsast
+import pyast as ast
+
+
+class default_protocol(object):
+    """Temporarily removes the generated Node __reduce_ex__ methods"""
+
+    def __enter__(self):
+        self.classes = []
+        stack = [ast.Node]
+        while stack:
+            cls = stack.pop()
+            stack.extend(cls.__subclasses__())
+            if '__reduce_ex__' in cls.__dict__:
+                self.classes.append(cls)
+        self.methods = [cls.__dict__['__reduce_ex__'] for cls in self.classes]
+        for cls in self.classes:
+            del cls.__reduce_ex__
+
+    def __exit__(self, *exc):
+        for cls, method in zip(self.classes, self.methods):
+            cls.__reduce_ex__ = method
+
+
+def measure(prog):
+    data = pickle.dumps(prog, pickle.HIGHEST_PROTOCOL)
+    dumps = min(timeit.repeat(
+        lambda: pickle.dumps(prog, pickle.HIGHEST_PROTOCOL),
+        number=1, repeat=3))
+    loads = min(timeit.repeat(lambda: pickle.loads(data),
+                              number=1, repeat=3))
+    return len(data), dumps, loads
+
+
+def run(sizes=(10 ** 4, 2 * 10 ** 5)):
+    for debug in (True, False):
+        ast.set_debug(debug, jsast.Node)
+        for size in sizes:
+            prog = jsast.program(size)
+            with default_protocol():
+                before = measure(prog)
+            after = measure(prog)
+            assert pickle.loads(pickle.dumps(prog)) == prog
+            # every statement is 5 Nodes
+            for label, (length, dumps, loads) in (('default', before),
+                                                  ('compact', after)):
+                print('%-5s %8d nodes %-8s %6.1f bytes/node  '
+                      'dumps: %7.1fms  loads: %7.1fms' % (
+                          debug, size * 5, label, float(length) / size / 5,
+                          dumps * 1e3, loads * 1e3))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,50 @@
+"""Selector benchmark
+
+Reports the throughput of pyast.query selectors on the benchmark program,
+in Nodes walked and matches per second, next to walking the tree.
+
+    python benchmarks/query.py
+"""
+import timeit
+
+import jsast
+import pyast as ast
+from pyast.query import compile_selector
+from pyast.visit import walk
+
+classes = [jsast.Node, jsast.Statement, jsast.Expression, jsast.Operator,
+           jsast.Identifier, jsast.Literal, jsast.Program,
+           jsast.ExpressionStatement, jsast.AssignmentExpression]
+
+selectors = (
+    'AssignmentExpression > Identifier[name="x5"]',
+    'Program.body[*] ExpressionStatement',
+    'Literal[value=7]',
+    '*[token="="]',
+    'AssignmentExpression.left',
+    'ExpressionStatement',
+)
+
+
+def run(size=10 ** 5):
+    prog = jsast.program(size)
+    nodes = 5 * size + 1
+    for debug in (True, False):
+        ast.set_debug(debug, jsast.Node)
+        print('debug' if debug else 'no debug')
+        time = min(timeit.repeat(lambda: sum(1 for node in walk(prog)),
+                                 number=1, repeat=3))
+        print('%-46s %7.1fms %6.2fM nodes/s' % ('walk', time * 1e3,
+                                                nodes / time / 1e6))
+        for text in selectors:
+            selector = compile_selector(text, classes)
+            matches = len(selector.select(prog))
+            time = min(timeit.repeat(lambda: selector.select(prog),
+                                     number=1, repeat=3))
+            print('%-46s %7.1fms %6.2fM nodes/s %9.0f matches/s (%d)' % (
+                text, time * 1e3, nodes / time / 1e6, matches / time,
+                matches))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,76 @@
+"""Raw dump benchmark
+
+Compares the iterative pyast.dump.raw writer with the previous recursive
+dump, which built a list of lines and concatenated them one by one, and
+times a dump limited by max_nodes.
+
+    python benchmarks/raw.py
+"""
+import timeit
+import tracemalloc
+
+import jsast
+from pyast.dump import raw
+
+
+class Sink(object):
+    def write(self, data):
+        pass
+
+
+def lines(node, name=None, indent=0):
+    """The list of (indent, line) the previous dump built recursively"""
+    if node is None:
+        return []
+    if isinstance(node, (str, int)):
+        cl = ('%s="%s"' if isinstance(node, str) else '%s=%s') % (
+            node.__class__.__name__, node)
+    else:
+        cl = node.__class__.__name__
+    tree = [(indent, '%s[%s]' % ('.%s' % name if name else '', cl))]
+    if isinstance(node, (str, int)):
+        return tree
+    indent += 2
+    for i in node._fields:
+        field = getattr(node, i)
+        if isinstance(field, (list, dict)):
+            tree.append((indent, '.%s' % i))
+            items = field.values() if isinstance(field, dict) else field
+            for item in items:
+                tree.extend(lines(item, indent=indent + 2))
+        else:
+            tree.extend(lines(field, name=i, indent=indent))
+    return tree
+
+
+def previous(prog):
+    string = ""
+    for (indent, i) in lines(prog):
+        string += "%s%s\n" % (indent * " ", i)
+    return string
+
+
+def peak(func):
+    tracemalloc.start()
+    func()
+    size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size
+
+
+def run(sizes=(10 ** 4, 10 ** 5)):
+    for size in sizes:
+        prog = jsast.program(size)
+        cases = (
+            ('previous', lambda: previous(prog)),
+            ('dump', lambda: raw.dump(prog, Sink())),
+            ('max_nodes', lambda: raw.dump(prog, Sink(), max_nodes=1000)),
+        )
+        for label, func in cases:
+            time = min(timeit.repeat(func, number=1, repeat=3))
+            print('%7d %-10s %9.2fms  peak: %8.1fKB' % (
+                size, label, time * 1e3, peak(func) / 1024.0))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,121 @@
+"""Rewrite benchmark
+
+Applies three small rewrites to the benchmark program, once as separate
+recursive passes assigning fields one by one, then batched by a
+pyast.rewrite.Rewriter in one traversal, and a rule no Node of the
+statements can match.
+
+    python benchmarks/rewrite.py
+"""
+import gc
+import sys
+import time
+
+import jsast
+import pyast as ast
+from pyast.rewrite import Rewriter
+
+
+def rename(node):
+    if isinstance(node, jsast.Identifier):
+        if node.name == 'x5':
+            node.name = 'y5'
+        return
+    for name in node._child_fields:
+        value = getattr(node, name)
+        if isinstance(value, list):
+            for item in value:
+                rename(item)
+        elif isinstance(value, ast.Node):
+            rename(value)
+
+
+def replace(node):
+    for name in node._child_fields:
+        value = getattr(node, name)
+        if isinstance(value, list):
+            for i, item in enumerate(value):
+                if isinstance(item, jsast.Literal) and item.value == 7:
+                    value[i] = jsast.Literal(70)
+                else:
+                    replace(item)
+        elif isinstance(value, jsast.Literal) and value.value == 7:
+            setattr(node, name, jsast.Literal(70))
+        elif isinstance(value, ast.Node):
+            replace(value)
+
+
+def fold(node):
+    if isinstance(node, jsast.AssignmentExpression):
+        if isinstance(node.right, jsast.Literal) and \
+           node.right.value % 1000 == 0 and node.right.value:
+            node.right = jsast.Literal(0)
+    for name in node._child_fields:
+        value = getattr(node, name)
+        if isinstance(value, list):
+            for item in value:
+                fold(item)
+        elif isinstance(value, ast.Node):
+            fold(value)
+
+
+rules = Rewriter()
+rules.add(jsast.Identifier, lambda node: {'name': 'y5'}, name='x5')
+rules.add(jsast.Literal, lambda node: jsast.Literal(70), value=7)
+
+
+@rules.rule(jsast.AssignmentExpression, right=jsast.Literal)
+def zero(node):
+    if node.right.value % 1000 == 0 and node.right.value:
+        return {'right': jsast.Literal(0)}
+
+
+def passes(prog):
+    rename(prog)
+    replace(prog)
+    fold(prog)
+
+
+# no Node below a Program can match
+program_only = Rewriter()
+program_only.add(jsast.Program, lambda node: None)
+
+
+def timed(func, size, repeat=5):
+    best = None
+    for i in range(repeat):
+        prog = jsast.program(size)
+        # as timeit does
+        gc.disable()
+        start = time.time()
+        func(prog)
+        elapsed = time.time() - start
+        gc.enable()
+        if best is None or elapsed < best:
+            best = elapsed
+            result = prog
+    return best, result
+
+
+def run(size=10 ** 5):
+    sys.setrecursionlimit(10000)
+    ast.set_debug(True, jsast.Node)
+    cases = (
+        ('separate passes', passes),
+        ('Rewriter', rules.rewrite),
+    )
+    results = []
+    for label, func in cases:
+        elapsed, prog = timed(func, size)
+        results.append(prog)
+        print('%-30s %7.1fms' % (label, elapsed * 1e3))
+    assert results[0] == results[1]
+    elapsed, prog = timed(lambda prog: rules.rewrite(rules.rewrite(prog)),
+                          size)
+    print('%-30s %7.1fms' % ('Rewriter, twice', elapsed * 1e3))
+    elapsed, prog = timed(program_only.rewrite, size)
+    print('%-30s %7.1fms' % ('Rewriter, Program rule only', elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    run()
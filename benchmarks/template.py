@@ -0,0 +1,91 @@
+"""Template rendering benchmark
+
+Compares repr() of a program rendered by pyast.template with the previous
+Node.__repr__, which formatted the template of every Node with a dict of the
+reprs of all its fields, and times rendering to a file that discards it.
+
+Then times re-rendering the program with a RenderCache after changing one
+statement.
+
+    python benchmarks/template.py
+"""
+import timeit
+
+import jsast
+import pyast
+from pyast.node import basestring
+from pyast.template import render, RenderCache
+
+jsast.Program._template = '%(body)s'
+jsast.ExpressionStatement._template = '%(expression)s;'
+jsast.AssignmentExpression._template = '%(left)s%(operator)s%(right)s'
+jsast.Operator._template = '%(token)s'
+jsast.Identifier._template = '%(name)s'
+jsast.Literal._template = '%(value)s'
+
+
+def previous(self, fields=None, serializer=None):
+    if hasattr(self, '_template'):
+        if fields is None:
+            fields = {}
+            for leaf in self._fields:
+                field = getattr(self, leaf)
+                if isinstance(field, (int, basestring)):
+                    fields[leaf] = field
+                elif isinstance(field, list):
+                    if hasattr(self, '_template_%s' % leaf):
+                        template = getattr(self, '_template_%s' % leaf)
+                    else:
+                        template = None
+                    fields[leaf] = field.__repr__(template)
+                else:
+                    fields[leaf] = field.__repr__()
+        return self._template % fields
+    return '<Node:%s (%s)>' % (self.__class__.__name__,
+                               ', '.join(self._fields))
+
+
+class Sink(object):
+    def write(self, data):
+        pass
+
+
+def old(prog):
+    current = pyast.Node.__repr__
+    pyast.Node.__repr__ = previous
+    try:
+        return repr(prog)
+    finally:
+        pyast.Node.__repr__ = current
+
+
+def run(sizes=(10 ** 4, 10 ** 5)):
+    for size in sizes:
+        prog = jsast.program(size)
+        assert old(prog) == repr(prog)
+        cases = (
+            ('previous', lambda: old(prog)),
+            ('repr', lambda: repr(prog)),
+            ('render', lambda: render(prog, Sink())),
+        )
+        for label, func in cases:
+            time = min(timeit.repeat(func, number=1, repeat=3))
+            print('%7d %-10s %7.1fms' % (size, label, time * 1e3))
+
+        cache = RenderCache()
+        first = timeit.timeit(lambda: cache.render(prog), number=1)
+        statement = prog.body[size // 2].expression
+
+        def change():
+            statement.right.value += 1
+            return cache.render(prog)
+        assert change() == repr(prog)
+        time = min(timeit.repeat(change, number=1, repeat=3))
+        print('%7d %-10s %7.1fms  first render: %7.1fms  unchanged: %7.3fms'
+              % (size, 'cached', time * 1e3, first * 1e3,
+                 timeit.timeit(lambda: cache.render(prog), number=1) * 1e3))
+        cache.close()
+
+
+if __name__ == '__main__':
+    run()
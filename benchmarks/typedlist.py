@@ -0,0 +1,65 @@
+"""TypedList/TypedDict bulk validation benchmark
+
+Times construction from an initial iterable, extend() and slice assignment
+of large homogeneous and mixed sequences.
+
+    python benchmarks/typedlist.py
+"""
+import timeit
+
+import jsast
+from pyast.typedlist import TypedList
+from pyast.typeddict import TypedDict
+
+
+def run(sizes=(10 ** 5, 10 ** 6)):
+    nodes = [jsast.Identifier('x'), jsast.Literal(1), jsast.Literal('a')]
+    cases = (
+        ('str', (str,), lambda i: 'x'),
+        ('str|int', (str, int), lambda i: 'x' if i % 2 else i),
+        ('nodes', (jsast.Identifier, jsast.Literal), lambda i: nodes[i % 3]),
+        ('enum', ('+', '-', 1), lambda i: ('+', '-', 1)[i % 3]),
+    )
+    for size in sizes:
+        for label, types, make in cases:
+            items = [make(i) for i in range(size)]
+            mapping = dict(enumerate(items))
+            init = min(timeit.repeat(lambda: TypedList(types, items),
+                                     number=1, repeat=3))
+            lst = TypedList(types, null=True)
+            extend = min(timeit.repeat(lambda: lst.extend(items),
+                                       number=1, repeat=3))
+            lst = TypedList(types, items)
+            setslice = min(timeit.repeat(lambda: lst.__setitem__(
+                slice(0, size), items), number=1, repeat=3))
+            dct = min(timeit.repeat(lambda: TypedDict(types, mapping),
+                                    number=1, repeat=3))
+            print('%8d %-8s init: %6.1fms  extend: %6.1fms  '
+                  'slice: %6.1fms  dict: %6.1fms' % (
+                      size, label, init * 1e3, extend * 1e3,
+                      setslice * 1e3, dct * 1e3))
+
+
+def run_deferred(size=10 ** 5):
+    statements = [jsast.statement(i) for i in range(100)]
+
+    def build():
+        prog = jsast.Program()
+        for i in range(size):
+            prog.body.append(statements[i % 100])
+
+    def build_deferred():
+        prog = jsast.Program()
+        with prog.deferred():
+            for i in range(size):
+                prog.body.append(statements[i % 100])
+
+    checked = min(timeit.repeat(build, number=1, repeat=3))
+    deferred = min(timeit.repeat(build_deferred, number=1, repeat=3))
+    print('%8d appends  checked: %6.1fms  deferred: %6.1fms' % (
+        size, checked * 1e3, deferred * 1e3))
+
+
+if __name__ == '__main__':
+    run()
+    run_deferred()
@@ -0,0 +1,60 @@
+"""Field validation benchmark
+
+Compares the compiled guard validators with the generic checks that read
+the guard dict on every assignment.
+
+    python benchmarks/validators.py
+"""
+import timeit
+
+import jsast
+import pyast as ast
+from pyast.field import field
+
+
+class Deep(jsast.Expression):
+    pass
+
+
+class Deeper(Deep):
+    pass
+
+
+class Deepest(Deeper):
+    value = ast.field(int)
+
+
+def generic(name, guard):
+    def validate(val):
+        if val is None:
+            if guard['null'] is False:
+                raise TypeError('Element %s must not be empty' % name)
+            return val
+        if field._check(val, guard):
+            return val
+        raise TypeError(name)
+    return validate
+
+
+def run(number=200000):
+    cases = (
+        ('str enum', ast.field(("+", "=", "-", "==", "!=", ">", "<")), '<'),
+        ('pattern', ast.field(tuple(ast.re(p) for p in
+                                    ("[a-z]+", "_[0-9]+", "[A-Z][a-z]*"))),
+         'Foo'),
+        ('class', ast.field((jsast.Literal, jsast.Identifier, Deep)),
+         Deepest(1)),
+    )
+    for label, guard, value in cases:
+        compiled = field.validator('f', guard)
+        times = []
+        for validate in (generic('f', guard), compiled):
+            times.append(min(timeit.repeat(lambda: validate(value),
+                                           number=number, repeat=5)))
+        print('%-8s generic: %.0fns  compiled: %.0fns  speedup: %.2fx' % (
+            label, times[0] / number * 1e9, times[1] / number * 1e9,
+            times[0] / times[1]))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,84 @@
+"""Traversal benchmark
+
+Compares pyast.visit.walk() and NodeVisitor with a recursive walk looking at
+every field of every Node, as the dumpers used to, and with a visitor
+written like ast.NodeVisitor on top of it.
+
+    python benchmarks/visit.py
+"""
+import timeit
+
+import jsast
+import pyast
+from pyast.visit import walk, NodeVisitor
+
+
+def recursive(node, found):
+    found.append(node)
+    for name in node._fields:
+        value = getattr(node, name)
+        if isinstance(value, pyast.Node):
+            recursive(value, found)
+        elif isinstance(value, (list, dict)):
+            if isinstance(value, dict):
+                value = value.values()
+            for item in value:
+                if isinstance(item, pyast.Node):
+                    recursive(item, found)
+    return found
+
+
+class Recursive(object):
+    count = 0
+
+    def visit(self, node):
+        method = getattr(self, 'visit_' + node.__class__.__name__,
+                         self.generic_visit)
+        return method(node)
+
+    def generic_visit(self, node):
+        for name in node._fields:
+            value = getattr(node, name)
+            if isinstance(value, pyast.Node):
+                self.visit(value)
+            elif isinstance(value, (list, dict)):
+                if isinstance(value, dict):
+                    value = value.values()
+                for item in value:
+                    if isinstance(item, pyast.Node):
+                        self.visit(item)
+
+    def visit_Identifier(self, node):
+        self.count += 1
+
+    def visit_Literal(self, node):
+        self.count += 1
+
+
+class Counter(NodeVisitor):
+    count = 0
+
+    def visit_Identifier(self, node):
+        self.count += 1
+
+    def visit_Literal(self, node):
+        self.count += 1
+
+
+def run(sizes=(10 ** 4, 10 ** 5)):
+    for size in sizes:
+        prog = jsast.program(size)
+        assert len(recursive(prog, [])) == len(list(walk(prog)))
+        cases = (
+            ('recursive', lambda: recursive(prog, [])),
+            ('walk', lambda: list(walk(prog))),
+            ('recursive visitor', lambda: Recursive().visit(prog)),
+            ('visitor', lambda: Counter().visit(prog)),
+        )
+        for label, func in cases:
+            time = min(timeit.repeat(func, number=1, repeat=3))
+            print('%7d %-18s %7.1fms' % (size, label, time * 1e3))
+
+
+if __name__ == '__main__':
+    run()
@@ -1,4 +1,8 @@
+# Enables type checks on Nodes which don't set _debug themselves.
+# Read when a Node class is created; use set_debug() to switch at runtime.
+DEBUG = True
+
 from .field import field, seq, dict, re
-from .node import Node
-from .typedlist import TypedList
-from .typeddict import TypedDict
+from .node import Node, FrozenNode, set_debug
+from .typedlist import TypedList, FrozenList
+from .typeddict import TypedDict, FrozenDict
@@ -0,0 +1,536 @@
+"""Columnar storage of Node trees
+
+An Arena stores a tree as parallel arrays instead of one Python object per
+Node, in depth-first field order (pre-order):
+
+    classes     class id of each Node, an index into Arena.types
+    parents     index of the Node holding each Node, -1 for the root
+    ends        index following the last Node below each Node: the first
+                child of Node i is i + 1 when ends[i] > i + 1 and its next
+                sibling is ends[i]
+    rows        row of each Node in the columns of its class
+
+Each class has a pair of columns per field, a tag and a 64 bit value per
+Node of the class: integers are stored as they are, strings as indexes into
+Arena.strings, Nodes as their index, lists, tuples and dicts as the offset
+of their items in the item columns (their length, then one tag and value
+per item, keys and values for dicts). Values of other types are kept as
+they are in Arena.objects.
+
+    arena = Arena(program)
+    arena.count(Literal, value=int)
+    arena.find(Identifier, name='x')
+    arena.root.body[0].expression.left.name
+    arena.tree()
+
+count() and find() take patterns like pyast.rewrite rules, a class or a
+tuple of classes matching instances, any other value the values equal to it,
+and run over the columns without building Nodes; with NumPy installed the
+columns are compared as NumPy arrays sharing their memory. Arena[i] returns
+a NodeView reading the fields of Node i from the columns. tree() builds the
+Nodes back without validating them again, like pyast.dump.binary.load().
+"""
+import struct
+import sys
+from array import array
+from itertools import compress, repeat
+from operator import add, and_, eq
+
+from .node import Node
+from .dump.binary import _builder
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if sys.version >= '3':
+    basestring = str
+
+NONE, FALSE, TRUE, INT, FLOAT, STR, NODE, LIST, TUPLE, DICT, OBJECT = \
+    range(11)
+
+_double = struct.Struct('<d')
+_long = struct.Struct('<q')
+
+_MIN, _MAX = -1 << 63, (1 << 63) - 1
+
+# the tags of the values of a type
+_type_tags = (
+    (bool, (FALSE, TRUE)),
+    (int, (INT,)),
+    (float, (FLOAT,)),
+    (basestring, (STR,)),
+    (type(None), (NONE,)),
+    (list, (LIST,)),
+    (tuple, (TUPLE,)),
+    (dict, (DICT,)),
+    (Node, (NODE,)),
+)
+
+
+class NodeView(object):
+    """Read-only view of a Node of an Arena
+
+    Fields are read from the columns of the Arena when accessed; Nodes are
+    returned as NodeViews, lists, tuples and dicts as new plain containers.
+    """
+    __slots__ = ('_arena', '_index')
+
+    def __init__(self, arena, index):
+        self._arena = arena
+        self._index = index
+
+    @property
+    def _class(self):
+        """The class of the Node"""
+        arena = self._arena
+        return arena.types[arena.classes[self._index]]
+
+    @property
+    def _fields(self):
+        return self._class._fields
+
+    def __getattr__(self, name):
+        return self._arena._read(self._index, name)
+
+    def __eq__(self, other):
+        return isinstance(other, NodeView) and \
+            self._arena is other._arena and self._index == other._index
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self._arena), self._index))
+
+    def __repr__(self):
+        return '<NodeView:%s %d>' % (self._class.__name__, self._index)
+
+    @property
+    def parent(self):
+        """The view of the Node holding this one, or None"""
+        index = self._arena.parents[self._index]
+        return None if index < 0 else NodeView(self._arena, index)
+
+    def materialize(self):
+        """Returns the Node as a Node tree"""
+        return self._arena.tree(self._index)
+
+
+class Arena(object):
+    """The tree rooted at root stored as columns, see the module docstring
+
+    Set use_numpy to False to run count() and find() with the array module
+    even when NumPy is installed.
+    """
+
+    def __init__(self, root, use_numpy=None):
+        if not isinstance(root, Node):
+            raise TypeError('Arena stores Node trees, not %r' % (root,))
+        self.use_numpy = numpy is not None if use_numpy is None else \
+            use_numpy and numpy is not None
+        self.types = []
+        self.strings = []
+        self.objects = []
+        self.classes = array('i')
+        self.parents = array('i')
+        self.rows = array('i')
+        self.item_tags = array('b')
+        self.item_values = array('q')
+        # class id -> array of the indexes of its Nodes
+        self._nodes = []
+        # class id -> [(tags, values) of each field, in _fields order]
+        self._columns = []
+        # class id -> {field name: position in _fields}
+        self._positions = []
+        self._type_ids = {}
+        self._string_ids = {}
+        self._store(root)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError('Arena index out of range')
+        return NodeView(self, index % len(self))
+
+    @property
+    def root(self):
+        return NodeView(self, 0)
+
+    def _type_id(self, cls):
+        cid = self._type_ids.get(cls)
+        if cid is None:
+            cid = self._type_ids[cls] = len(self.types)
+            self.types.append(cls)
+            self._nodes.append(array('i'))
+            self._columns.append([(array('b'), array('q'))
+                                  for name in cls._fields])
+            self._positions.append(dict((name, i) for i, name in
+                                        enumerate(cls._fields)))
+        return cid
+
+    def _encode(self, value, pending, target, pos, parent):
+        """Returns the (tag, value) storing value, adding the Nodes it holds
+        to pending with the column and position of their index and the
+        index of their parent"""
+        t = value.__class__
+        if t is bool:
+            return (TRUE if value else FALSE), 0
+        if t is int and _MIN <= value <= _MAX:
+            return INT, value
+        if t is str or t is not int and isinstance(value, basestring):
+            index = self._string_ids.get(value)
+            if index is None:
+                index = self._string(value)
+            return STR, index
+        if value is None:
+            return NONE, 0
+        if isinstance(value, Node):
+            pending.append((value, target, pos, parent))
+            return NODE, -1
+        if t is float:
+            return FLOAT, _long.unpack(_double.pack(value))[0]
+        if isinstance(value, (list, tuple, dict)):
+            tags = self.item_tags
+            values = self.item_values
+            offset = len(values)
+            if isinstance(value, dict):
+                items = []
+                for key, item in value.items():
+                    items.append(key)
+                    items.append(item)
+                tag = DICT
+            else:
+                items = value
+                tag = TUPLE if isinstance(value, tuple) else LIST
+            tags.append(INT)
+            values.append(len(value))
+            # reserved first, nested containers follow
+            tags.extend(repeat(NONE, len(items)))
+            values.extend(repeat(0, len(items)))
+            for i, item in enumerate(items, offset + 1):
+                tags[i], values[i] = self._encode(item, pending, values, i,
+                                                  parent)
+            return tag, offset
+        self.objects.append(value)
+        return OBJECT, len(self.objects) - 1
+
+    def _string(self, value):
+        index = self._string_ids[value] = len(self.strings)
+        self.strings.append(value)
+        return index
+
+    def _store(self, root):
+        classes = self.classes
+        parents = self.parents
+        rows = self.rows
+        strings = self._string_ids
+        encode = self._encode
+        # class -> (class id, indexes of its Nodes, [(field name, tags,
+        #           values)])
+        layouts = {}
+        # (Node, column holding its index, position, parent index)
+        stack = [(root, None, 0, -1)]
+        pop = stack.pop
+        while stack:
+            node, target, pos, parent = pop()
+            index = len(classes)
+            if target is not None:
+                target[pos] = index
+            cls = node.__class__
+            layout = layouts.get(cls)
+            if layout is None:
+                cid = self._type_id(cls)
+                layout = layouts[cls] = (cid, self._nodes[cid], [
+                    (name, tags, values) for name, (tags, values) in
+                    zip(cls._fields, self._columns[cid])])
+            cid, nodes, fields = layout
+            classes.append(cid)
+            parents.append(parent)
+            rows.append(len(nodes))
+            nodes.append(index)
+            pending = []
+            for name, tags, values in fields:
+                value = getattr(node, name)
+                if value.__class__ is str:
+                    string = strings.get(value)
+                    if string is None:
+                        string = self._string(value)
+                    tags.append(STR)
+                    values.append(string)
+                elif isinstance(value, Node):
+                    pending.append((value, values, len(values), index))
+                    tags.append(NODE)
+                    values.append(-1)
+                elif value.__class__ is int and _MIN <= value <= _MAX:
+                    tags.append(INT)
+                    values.append(value)
+                else:
+                    tag, value = encode(value, pending, values, len(values),
+                                        index)
+                    tags.append(tag)
+                    values.append(value)
+            if pending:
+                pending.reverse()
+                stack.extend(pending)
+        # the subtree of a Node ends after the subtrees of its children
+        sizes = array('i', repeat(1, len(classes)))
+        for i in range(len(classes) - 1, 0, -1):
+            sizes[parents[i]] += sizes[i]
+        self.ends = array('i', map(add, range(len(classes)), sizes))
+
+    def _decode(self, tag, value, node):
+        """Returns the value stored as (tag, value); node(index) returns the
+        value of the Node at index"""
+        if tag == STR:
+            return self.strings[value]
+        if tag == INT:
+            return value
+        if tag == NODE:
+            return node(value)
+        if tag == NONE:
+            return None
+        if tag == TRUE:
+            return True
+        if tag == FALSE:
+            return False
+        if tag == FLOAT:
+            return _double.unpack(_long.pack(value))[0]
+        if tag == OBJECT:
+            return self.objects[value]
+        tags = self.item_tags
+        values = self.item_values
+        size = values[value]
+        if tag == DICT:
+            size *= 2
+        items = [self._decode(tags[i], values[i], node)
+                 for i in range(value + 1, value + 1 + size)]
+        if tag == LIST:
+            return items
+        if tag == TUPLE:
+            return tuple(items)
+        return dict(zip(items[::2], items[1::2]))
+
+    def _read(self, index, name):
+        cid = self.classes[index]
+        pos = self._positions[cid].get(name)
+        if pos is None:
+            raise AttributeError('%s has no field %s' % (
+                self.types[cid].__name__, name))
+        tags, values = self._columns[cid][pos]
+        row = self.rows[index]
+        return self._decode(tags[row], values[row],
+                            lambda i: NodeView(self, i))
+
+    def tree(self, index=0):
+        """Builds the Nodes of the subtree of Node index and returns its
+        root"""
+        classes = self.classes
+        rows = self.rows
+        types = self.types
+        columns = self._columns
+        decode = self._decode
+        builders = {}
+        built = {}
+        node = built.pop
+        # children first
+        for i in range(self.ends[index] - 1, index - 1, -1):
+            cid = classes[i]
+            build = builders.get(cid)
+            if build is None:
+                cls = types[cid]
+                build = builders[cid] = _builder(cls, cls._fields, False)
+            row = rows[i]
+            built[i] = build([decode(tags[row], values[row], node)
+                              for tags, values in columns[cid]])
+        return built[index]
+
+    def _class_ids(self, cls):
+        return [cid for cid, t in enumerate(self.types) if issubclass(t, cls)]
+
+    def _kinds(self, types):
+        """Returns the tags of the values which are instances of types and
+        the ids of the classes of the Nodes which are, or None for any"""
+        tags = set()
+        nodes = []
+        for t in types:
+            for base, found in _type_tags:
+                if issubclass(base, t) or (t is int and base is bool):
+                    tags.update(found)
+            if issubclass(t, Node) and t is not Node:
+                nodes.extend(self._class_ids(t))
+        return tags, nodes
+
+    def _masks(self, cid, pattern):
+        """Returns the masks of the rows of the class id matching pattern,
+        or None if none of them can"""
+        masks = []
+        for name, expected in pattern.items():
+            pos = self._positions[cid].get(name)
+            if pos is None:
+                return None
+            tags, values = self._columns[cid][pos]
+            if not _vectorized(expected, tags):
+                # compared one by one
+                check = _checker(expected)
+                masks.append([check(self._decode(tag, value, self.__getitem__))
+                              for tag, value in zip(tags, values)])
+            elif self.use_numpy:
+                masks.append(self._numpy_mask(tags, values, expected))
+            else:
+                masks.append(self._mask(tags, values, expected))
+        return masks
+
+    def _mask(self, tags, values, expected):
+        if isinstance(expected, type) or isinstance(expected, tuple):
+            found, nodes = self._kinds(
+                expected if isinstance(expected, tuple) else (expected,))
+            if nodes:
+                nodes = frozenset(nodes)
+                classes = self.classes
+                held = map(lambda tag, value: tag == NODE and
+                           classes[value] in nodes, tags, values)
+                if not found:
+                    return held
+                return map(bool.__or__, map(found.__contains__, tags), held)
+            if len(found) == 1:
+                return map(eq, tags, repeat(found.pop()))
+            return map(found.__contains__, tags)
+        tag, value = _stored(expected, self._string_ids)
+        if tag is None:
+            return repeat(False, len(tags))
+        if value is None:
+            return map(eq, tags, repeat(tag))
+        return map(and_, map(eq, tags, repeat(tag)),
+                   map(eq, values, repeat(value)))
+
+    def _numpy_mask(self, tags, values, expected):
+        tags = numpy.frombuffer(tags, dtype=numpy.int8)
+        values = numpy.frombuffer(values, dtype=numpy.int64)
+        if isinstance(expected, type) or isinstance(expected, tuple):
+            found, nodes = self._kinds(
+                expected if isinstance(expected, tuple) else (expected,))
+            mask = numpy.isin(tags, sorted(found))
+            if nodes:
+                classes = numpy.frombuffer(self.classes, dtype=numpy.int32)
+                held = tags == NODE
+                mask[held] |= numpy.isin(classes[values[held]], nodes)
+            return mask
+        tag, value = _stored(expected, self._string_ids)
+        if tag is None:
+            return numpy.zeros(len(tags), dtype=bool)
+        if value is None:
+            return tags == tag
+        return (tags == tag) & (values == value)
+
+    def count(self, cls, **pattern):
+        """Returns the number of Nodes of cls or of its subclasses whose
+        fields match pattern"""
+        total = 0
+        for cid in self._class_ids(cls):
+            if not pattern:
+                total += len(self._nodes[cid])
+                continue
+            masks = self._masks(cid, pattern)
+            if masks is None:
+                continue
+            if self.use_numpy and not any(isinstance(m, list)
+                                          for m in masks):
+                mask = masks[0]
+                for other in masks[1:]:
+                    mask = mask & other
+                total += int(numpy.count_nonzero(mask))
+            else:
+                total += sum(_combine(masks))
+        return total
+
+    def find(self, cls, **pattern):
+        """Returns the indexes of the Nodes of cls or of its subclasses
+        whose fields match pattern, in tree order, as an array"""
+        found = []
+        for cid in self._class_ids(cls):
+            nodes = self._nodes[cid]
+            if not pattern:
+                found.append(nodes)
+                continue
+            masks = self._masks(cid, pattern)
+            if masks is None:
+                continue
+            if self.use_numpy and not any(isinstance(m, list)
+                                          for m in masks):
+                mask = masks[0]
+                for other in masks[1:]:
+                    mask = mask & other
+                indexes = numpy.frombuffer(nodes, dtype=numpy.int32)[mask]
+                result = array('i')
+                result.frombytes(indexes.tobytes())
+                found.append(result)
+            else:
+                found.append(array('i', compress(nodes, _combine(masks))))
+        if len(found) == 1:
+            return found[0]
+        return array('i', sorted(index for indexes in found
+                                 for index in indexes))
+
+
+def _combine(masks):
+    mask = masks[0]
+    for other in masks[1:]:
+        mask = map(and_, mask, other)
+    return mask
+
+
+def _vectorized(expected, tags):
+    """Tells if the values stored in tags can be compared with expected
+    through their tags and values"""
+    if tags.count(OBJECT):
+        return False
+    if isinstance(expected, type):
+        return True
+    if isinstance(expected, tuple):
+        return all(isinstance(t, type) for t in expected)
+    if expected is None or isinstance(expected, (bool, basestring)):
+        return True
+    if isinstance(expected, int):
+        # 1 == 1.0
+        return not tags.count(FLOAT)
+    return False
+
+
+def _checker(expected):
+    """Returns the function telling if a field value matches expected"""
+    if isinstance(expected, tuple) and expected and \
+       all(isinstance(t, type) for t in expected) or \
+       isinstance(expected, type):
+        def check(value):
+            if isinstance(value, NodeView):
+                return issubclass(value._class, expected)
+            return isinstance(value, expected)
+        return check
+    if expected is None or expected is True or expected is False:
+        return lambda value: value is expected
+    # not 1 == True
+    return lambda value: value == expected and \
+        isinstance(value, bool) == isinstance(expected, bool)
+
+
+def _stored(expected, strings):
+    """Returns the (tag, value) of the stored values equal to expected,
+    value None to compare the tags only, or tag None if none can be"""
+    if expected is None:
+        return NONE, None
+    if expected is True:
+        return TRUE, None
+    if expected is False:
+        return FALSE, None
+    if isinstance(expected, int):
+        if not _MIN <= expected <= _MAX:
+            return None, None
+        return INT, expected
+    index = strings.get(expected)
+    if index is None:
+        return None, None
+    return STR, index
@@ -0,0 +1,352 @@
+"""Edit scripts between two trees
+
+diff(a, b) returns the edits turning the tree a into the tree b, and
+apply_patch(a, edits) applies them:
+
+    edits = diff(old, new)
+    root = apply_patch(old, edits)    # old == new
+
+An edit is a tuple starting with its kind:
+
+    (UPDATE, path, value)   sets the field, item or key at path to value
+    (INSERT, path, value)   inserts value in a list at the index ending path,
+                            or adds the key ending path to a dict
+    (DELETE, path)          removes the item or key at path
+    (MOVE, path, index)     moves the list item at path to index in the same
+                            list, counted once it is removed
+
+A path is a tuple of steps from the root, as returned by Node.path(): field
+names, each followed by the index or key of the item for list and dict
+fields. The empty path is the root. The edits are applied in order and each
+path is read in the tree left by the edits before it.
+
+Subtrees are matched by their structural hash (see pyast.node), so equal
+regions are found without being compared Node by Node and the cost is about
+linear in the size of the trees: Nodes of the same class in the same place
+are compared field by field, Nodes of other classes and values of other
+types are replaced whole. In lists, the items found unchanged in both are
+matched by hash; the longest run of them in the same order stays in place
+and the others are moved, the other items are compared in order with the
+items of the same class between them, and the rest are replaced in order,
+deleted or inserted.
+FrozenNodes, tuples and FrozenLists are replaced whole.
+"""
+from collections import deque
+
+from .node import Node, structural_hash
+
+UPDATE, INSERT, DELETE, MOVE = 'update', 'insert', 'delete', 'move'
+
+# what diff() looks into, by concrete type
+_SCALAR, _NODE, _LIST, _DICT = range(4)
+_kinds = {}
+
+
+def _kind(t):
+    if issubclass(t, Node):
+        kind = _SCALAR if t._frozen else _NODE
+    elif issubclass(t, list):
+        kind = _LIST
+    elif issubclass(t, dict):
+        kind = _DICT
+    else:
+        kind = _SCALAR
+    _kinds[t] = kind
+    return kind
+
+
+def _key(value):
+    """Returns the hash identifying value among list items, or None"""
+    try:
+        if isinstance(value, Node):
+            return structural_hash(value)
+        return hash((value.__class__, value))
+    except TypeError:
+        return None
+
+
+def _same(a, b):
+    return a.__class__ is b.__class__ and (a is b or a == b)
+
+
+def _lis(pairs):
+    """Returns the longest run of pairs, sorted by their first item, whose
+    second items increase"""
+    # index in pairs of the last pair of the best run of each length
+    tails = []
+    tail_values = []
+    previous = [-1] * len(pairs)
+    for i, (_, j) in enumerate(pairs):
+        lo, hi = 0, len(tail_values)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tail_values[mid] < j:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo:
+            previous[i] = tails[lo - 1]
+        if lo == len(tails):
+            tails.append(i)
+            tail_values.append(j)
+        else:
+            tails[lo] = i
+            tail_values[lo] = j
+    run = []
+    i = tails[-1] if tails else -1
+    while i != -1:
+        run.append(pairs[i])
+        i = previous[i]
+    run.reverse()
+    return run
+
+
+class _Counts(object):
+    """Fenwick tree counting the items present among size slots"""
+
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def add(self, slot, delta):
+        tree = self.tree
+        slot += 1
+        while slot < len(tree):
+            tree[slot] += delta
+            slot += slot & -slot
+
+    def before(self, slot):
+        """Returns the number of items present in the slots before slot"""
+        tree = self.tree
+        count = 0
+        while slot > 0:
+            count += tree[slot]
+            slot -= slot & -slot
+        return count
+
+
+def _match(old, new):
+    """Returns the (index in old, index in new) pairs of the items of the
+    lists old and new: equal and staying in place, to compare, and equal and
+    moved"""
+    positions = {}
+    for i, item in enumerate(old):
+        key = _key(item)
+        if key is not None:
+            positions.setdefault(key, []).append(i)
+    # the k-th item of new with a hash is matched to its k-th item in old
+    firsts = dict.fromkeys(positions, 0)
+    matched = []
+    for j, item in enumerate(new):
+        key = _key(item)
+        if key not in firsts:
+            continue
+        candidates = positions[key]
+        first = firsts[key]
+        while first < len(candidates):
+            i = candidates[first]
+            first += 1
+            if _same(old[i], item):
+                matched.append((i, j))
+                break
+        firsts[key] = first
+    matched.sort()
+    kept = _lis(matched)
+    staying = set(kept)
+    moved = [pair for pair in matched if pair not in staying]
+    used_old = set(i for i, _ in matched)
+    used_new = set(j for _, j in matched)
+    # items between the kept ones, compared in order when of the same class:
+    # each item of new is paired with the first item of old of its class
+    # after the last one paired, found in a queue of the indexes of each class
+    pairs = []
+    start_old = start_new = 0
+    for end_old, end_new in kept + [(len(old), len(new))]:
+        queues = {}
+        for i in range(start_old, end_old):
+            if i not in used_old:
+                queues.setdefault(old[i].__class__, deque()).append(i)
+        found = []
+        last = -1
+        for j in range(start_new, end_new):
+            if j in used_new:
+                continue
+            queue = queues.get(new[j].__class__)
+            while queue and queue[0] < last:
+                queue.popleft()
+            if queue:
+                last = queue.popleft()
+                found.append((last, j))
+        # the items left between these are replaced in order, so that a list
+        # is only shortened by as many items as it loses
+        i, j = start_old, start_new
+        for next_old, next_new in found + [(end_old, end_new)]:
+            while i < next_old and j < next_new:
+                if i in used_old:
+                    i += 1
+                elif j in used_new:
+                    j += 1
+                else:
+                    pairs.append((i, j))
+                    i += 1
+                    j += 1
+            pairs.append((next_old, next_new))
+            i, j = next_old + 1, next_new + 1
+        pairs.pop()
+        start_old, start_new = end_old + 1, end_new + 1
+    return kept, pairs, moved
+
+
+def _list_edits(path, old, new, kept, pairs, moved):
+    """Returns the deletions, moves and insertions turning old into new once
+    the pairs are updated in place"""
+    edits = []
+    by_new = dict((j, i) for i, j in kept)
+    by_new.update((j, i) for i, j in pairs)
+    source = dict((j, i) for i, j in moved)
+    present = set(by_new.values())
+    present.update(source.values())
+    # deletions, last first so that the indexes before them stay valid
+    for i in range(len(old) - 1, -1, -1):
+        if i not in present:
+            edits.append((DELETE, path + (i,)))
+    if moved:
+        # each item left is keyed by its place once moved: (index in old, 0)
+        # for the items staying, (index in old of the item staying before it
+        # in new, rank after that item) for the moved ones. A Fenwick tree
+        # over the sorted keys counts the items before a key, giving the
+        # index of the item to move and the index it goes to
+        keys = [(i, 0) for i in sorted(present)]
+        targets = []
+        anchor, rank = -1, 0
+        for j in range(len(new)):
+            if j in by_new:
+                anchor, rank = by_new[j], 0
+            elif j in source:
+                rank += 1
+                targets.append((source[j], (anchor, rank)))
+                keys.append((anchor, rank))
+        keys.sort()
+        slots = dict((key, slot) for slot, key in enumerate(keys))
+        counts = _Counts(len(keys))
+        for i in present:
+            counts.add(slots[(i, 0)], 1)
+        for i, key in targets:
+            slot = slots[(i, 0)]
+            index = counts.before(slot)
+            counts.add(slot, -1)
+            target = counts.before(slots[key])
+            counts.add(slots[key], 1)
+            if index != target:
+                edits.append((MOVE, path + (index,), target))
+    for j in range(len(new)):
+        if j not in by_new and j not in source:
+            edits.append((INSERT, path + (j,), new[j]))
+    return edits
+
+
+def diff(a, b):
+    """Returns the edits turning the tree rooted at a into the tree rooted at
+    b, see apply_patch()
+
+    The values of the edits are the objects of b, not copies.
+    """
+    edits = []
+    kinds = _kinds
+    # (old value, new value, path) to compare, and lists of edits written
+    # once the values below them are compared
+    stack = [(a, b, ())]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        task = pop()
+        if task.__class__ is list:
+            edits.extend(task)
+            continue
+        old, new, path = task
+        if old is new:
+            continue
+        kind = kinds.get(old.__class__)
+        if kind is None:
+            kind = _kind(old.__class__)
+        if old.__class__ is not new.__class__ or kind == _SCALAR:
+            if not _same(old, new):
+                edits.append((UPDATE, path, new))
+            continue
+        if kind == _NODE:
+            if _key(old) == _key(new) and old == new:
+                continue
+            for name in reversed(old._fields):
+                push((getattr(old, name), getattr(new, name), path + (name,)))
+        elif kind == _LIST:
+            kept, pairs, moved = _match(old, new)
+            push(_list_edits(path, old, new, kept, pairs, moved))
+            for i, j in reversed(pairs):
+                push((old[i], new[j], path + (i,)))
+        else:
+            # keys added first, so that a dict is never emptied on the way
+            later = []
+            for key, value in new.items():
+                if key not in old:
+                    later.append((INSERT, path + (key,), value))
+            for key in old:
+                if key not in new:
+                    later.append((DELETE, path + (key,)))
+            push(later)
+            for key in reversed(list(old)):
+                if key in new:
+                    push((old[key], new[key], path + (key,)))
+    return edits
+
+
+def _copy(value):
+    if isinstance(value, Node):
+        return value.clone()
+    return value
+
+
+def _locate(root, path):
+    """Returns the Node, list or dict holding the last step of path"""
+    holder = root
+    for step in path[:-1]:
+        if isinstance(holder, Node):
+            holder = getattr(holder, step)
+        else:
+            holder = holder[step]
+    return holder
+
+
+def apply_patch(root, edits):
+    """Applies edits, as returned by diff(), to the tree rooted at root and
+    returns its root, root itself unless an edit replaced it
+
+    Nodes, lists and dicts are changed in place through their usual
+    assignment, so values are validated and writes observed. The Nodes of
+    the edits are copied with clone(), the patched tree shares no Node
+    with the tree they were taken from, except FrozenNodes.
+    """
+    for edit in edits:
+        kind, path = edit[0], edit[1]
+        if not path:
+            if kind != UPDATE:
+                raise ValueError('Cannot %s the root' % kind)
+            root = _copy(edit[2])
+            continue
+        holder = _locate(root, path)
+        step = path[-1]
+        if kind == UPDATE:
+            if isinstance(holder, Node):
+                setattr(holder, step, _copy(edit[2]))
+            else:
+                holder[step] = _copy(edit[2])
+        elif kind == INSERT:
+            if isinstance(holder, list):
+                holder.insert(step, _copy(edit[2]))
+            else:
+                holder[step] = _copy(edit[2])
+        elif kind == DELETE:
+            del holder[step]
+        elif kind == MOVE:
+            holder.insert(edit[2], holder.pop(step))
+        else:
+            raise ValueError('Unknown edit %r' % (kind,))
+    return root
@@ -0,0 +1,328 @@
+"""Compact binary serialization of Node trees
+
+Layout of a dump:
+
+    magic       b'PYAST\\x01'
+    strings     varint count, then each string as varint length + UTF-8
+    classes     varint count, then for each class the string index of its
+                classpath, varint field count and the string index of every
+                field name, in _fields order
+    tree        the root value
+
+Values start with a one byte tag. Strings are stored once in the string
+table and referenced by index, Nodes as a class index followed by their
+field values, lists and dicts as a varint length followed by their items
+(dicts as key, value pairs). Integers are zigzag varints.
+
+The tree is written and read with an explicit stack, so deep trees don't hit
+the recursion limit. Nodes reachable through more than one parent are
+written once per parent.
+"""
+import struct
+import sys
+
+import pyast
+from pyast.node import _classes, classpath
+from pyast.typecheck import normalize
+from pyast.typedlist import TypedList, _restore as _typedlist
+from pyast.typeddict import TypedDict, _restore as _typeddict
+
+if sys.version >= '3':
+    basestring = str
+else:
+    pass
+
+MAGIC = b'PYAST\x01'
+
+NONE, FALSE, TRUE, INT, FLOAT, STR, NODE, LIST, TUPLE, DICT = range(10)
+
+_double = struct.Struct('<d')
+
+
+def _varint(out, n):
+    while n > 0x7f:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(view, pos):
+    n = 0
+    shift = 0
+    while True:
+        b = view[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+# value tag by concrete type
+_tags = {
+    type(None): NONE,
+    bool: None,
+    int: INT,
+    float: FLOAT,
+    str: STR,
+    list: LIST,
+    tuple: TUPLE,
+    dict: DICT,
+}
+
+
+def _tag(t):
+    if issubclass(t, pyast.Node):
+        tag = NODE
+    elif issubclass(t, bool):
+        tag = None
+    elif issubclass(t, int):
+        tag = INT
+    elif issubclass(t, basestring):
+        tag = STR
+    elif issubclass(t, list):
+        tag = LIST
+    elif issubclass(t, tuple):
+        tag = TUPLE
+    elif issubclass(t, dict):
+        tag = DICT
+    elif issubclass(t, float):
+        tag = FLOAT
+    else:
+        raise TypeError('Cannot dump values of type %s' % t.__name__)
+    _tags[t] = tag
+    return tag
+
+
+def dump(ast, fp=None):
+    """Serializes the tree rooted at ast
+
+    Returns the dump as bytes, or writes it to the binary file object fp.
+    """
+    strings = {}
+    classes = {}
+    tags = _tags
+    out = bytearray()
+    append = out.append
+    stack = [ast]
+    pop = stack.pop
+    while stack:
+        value = pop()
+        t = value.__class__
+        tag = tags.get(t, -1)
+        if tag == -1:
+            tag = _tag(t)
+        if tag == STR:
+            index = strings.get(value)
+            if index is None:
+                index = strings[value] = len(strings)
+            append(STR)
+            if index < 0x80:
+                append(index)
+            else:
+                _varint(out, index)
+        elif tag == NODE:
+            index = classes.get(t)
+            if index is None:
+                index = classes[t] = len(classes)
+                for name in (classpath(t),) + tuple(t._fields):
+                    if not name in strings:
+                        strings[name] = len(strings)
+            append(NODE)
+            if index < 0x80:
+                append(index)
+            else:
+                _varint(out, index)
+            for name in reversed(t._fields):
+                stack.append(getattr(value, name))
+        elif tag == LIST or tag == TUPLE:
+            append(tag)
+            _varint(out, len(value))
+            stack.extend(reversed(value))
+        elif tag == DICT:
+            append(DICT)
+            _varint(out, len(value))
+            for key, item in reversed(list(value.items())):
+                stack.append(item)
+                stack.append(key)
+        elif tag is None:
+            append(TRUE if value else FALSE)
+        elif tag == INT:
+            append(INT)
+            _varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+        elif tag == FLOAT:
+            append(FLOAT)
+            out += _double.pack(value)
+        else:
+            append(NONE)
+
+    header = bytearray(MAGIC)
+    _varint(header, len(strings))
+    for string in sorted(strings, key=strings.get):
+        data = string.encode('utf-8')
+        _varint(header, len(data))
+        header += data
+    _varint(header, len(classes))
+    for cls in sorted(classes, key=classes.get):
+        _varint(header, strings[classpath(cls)])
+        _varint(header, len(cls._fields))
+        for name in cls._fields:
+            _varint(header, strings[name])
+    if fp is not None:
+        fp.write(header)
+        fp.write(out)
+        return None
+    return bytes(header + out)
+
+
+def _containers(cls):
+    """Returns (index, restore, typed class, plain class, types, null) for
+    the seq and dict fields of cls, whose dumped values are plain lists and
+    dicts"""
+    containers = []
+    for i, name in enumerate(cls._fields):
+        guard = cls._guards[name]
+        field_cls = guard['field_cls']
+        if issubclass(field_cls, pyast.seq):
+            containers.append((i, _typedlist, TypedList, list,
+                               normalize(guard['types']), guard['null']))
+        elif issubclass(field_cls, pyast.dict):
+            containers.append((i, _typeddict, TypedDict, dict,
+                               normalize(guard['types']), guard['null']))
+    return containers
+
+
+def _builder(cls, fields, validate):
+    """Returns the function building a cls Node from the dumped values"""
+    if list(fields) != list(cls._fields):
+        # dumped with another version of the class
+        unknown = set(fields) - set(cls._fields)
+        if unknown:
+            raise ValueError('%s has no fields %s' % (
+                cls.__name__, ', '.join(sorted(unknown))))
+        return lambda values: cls(**dict(zip(fields, values)))
+    if validate or cls._frozen:
+        return lambda values: cls(*values)
+    restore = cls._restore
+    containers = _containers(cls)
+    if not containers:
+        return lambda values: restore(*values)
+
+    def build(values):
+        for i, make, typed, plain, types, null in containers:
+            value = values[i]
+            if value.__class__ is plain:
+                values[i] = make(typed, types, null, value)
+        return restore(*values)
+    return build
+
+
+def _same(values):
+    return values
+
+
+def _pairs(values):
+    return dict(zip(values[::2], values[1::2]))
+
+
+def load(data, validate=False, classes=None):
+    """Reads a tree written by dump()
+
+    data may be any bytes-like object; it is read through a memoryview
+    without being copied. Node classes are looked up by module and qualified
+    name among the classes defined so far, or in classes (an iterable of
+    Node classes) when given. Nodes are not validated again unless validate
+    is True.
+    """
+    view = memoryview(data)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError('Not a pyast binary dump')
+    pos = len(MAGIC)
+
+    count, pos = _read_varint(view, pos)
+    strings = []
+    for i in range(count):
+        size, pos = _read_varint(view, pos)
+        strings.append(str(view[pos:pos + size], 'utf-8'))
+        pos += size
+
+    if classes is None:
+        known = _classes
+    else:
+        known = dict((classpath(cls), cls) for cls in classes)
+    count, pos = _read_varint(view, pos)
+    schema = []
+    for i in range(count):
+        index, pos = _read_varint(view, pos)
+        path = strings[index]
+        try:
+            cls = known[path]
+        except KeyError:
+            raise ValueError('Unknown Node class %s' % path)
+        size, pos = _read_varint(view, pos)
+        fields = []
+        for j in range(size):
+            index, pos = _read_varint(view, pos)
+            fields.append(strings[index])
+        schema.append((_builder(cls, fields, validate), size))
+
+    # frames of the Nodes and containers being read:
+    # [build, values still to read, values]
+    stack = []
+    unpack_double = _double.unpack_from
+    while True:
+        tag = view[pos]
+        pos += 1
+        if tag == STR or tag == NODE:
+            index = view[pos]
+            pos += 1
+            if index > 0x7f:
+                index, pos = _read_varint(view, pos - 1)
+            if tag == STR:
+                value = strings[index]
+            else:
+                build, size = schema[index]
+                if size:
+                    stack.append([build, size, []])
+                    continue
+                value = build([])
+        elif tag == NONE:
+            value = None
+        elif tag == INT:
+            n, pos = _read_varint(view, pos)
+            value = -((n + 1) >> 1) if n & 1 else n >> 1
+        elif tag == LIST or tag == TUPLE or tag == DICT:
+            size, pos = _read_varint(view, pos)
+            if tag == LIST:
+                build = _same
+            elif tag == TUPLE:
+                build = tuple
+            else:
+                build = _pairs
+                size *= 2
+            if size:
+                stack.append([build, size, []])
+                continue
+            value = build([])
+        elif tag == TRUE:
+            value = True
+        elif tag == FALSE:
+            value = False
+        elif tag == FLOAT:
+            value = unpack_double(view, pos)[0]
+            pos += 8
+        else:
+            raise ValueError('Invalid tag %d at offset %d' % (tag, pos - 1))
+        # hand the value to its parents, completing them
+        while stack:
+            frame = stack[-1]
+            frame[2].append(value)
+            frame[1] -= 1
+            if frame[1]:
+                break
+            stack.pop()
+            value = frame[0](frame[2])
+        else:
+            return value
@@ -1,36 +1,199 @@
-import json
 import pyast
-from collections import OrderedDict
+import json
+from json.encoder import encode_basestring_ascii
+from pyast.node import _classes
+from pyast.dump.binary import _builder
 
 import sys
 
 if sys.version >= '3':
     basestring = str
 else:
-    pass 
-
-def _dump_node(node, name=None, indent=0):
-    if node is None:
-        return None
-    if isinstance(node, (int, bool, basestring)):
-        return node
-
-    struct = OrderedDict({'type': None})
-    if isinstance(node, pyast.Node):
-        struct['type'] = node.__class__.__name__
-        for field in node._fields:
-            struct[field] = _dump_node(getattr(node, field))
-    elif isinstance(node, list):
-        struct = []
-        for elem in node:
-            struct.append(_dump_node(elem))
-    elif isinstance(node, dict):
-        struct = {}
-        for key, elem in node.items():
-            struct[key] =_dump_node(elem)
-    return struct
-
-def dump(ast):
-    struct = _dump_node(ast)
-    o = json.dumps(struct, indent=2)
-    return o
+    pass
+
+# number of pieces joined into each chunk yielded by iterdump()
+CHUNK_SIZE = 4096
+
+# the key of list items on the stack of _iterdump(), as dicts may use None
+_ITEM = object()
+
+def _encode_key(key):
+    # the same conversions as json.dumps
+    if isinstance(key, basestring):
+        return encode_basestring_ascii(key)
+    if key is True:
+        return '"true"'
+    if key is False:
+        return '"false"'
+    if key is None:
+        return '"null"'
+    if isinstance(key, int):
+        return '"%s"' % int.__repr__(key)
+    if isinstance(key, float):
+        return '"%s"' % float.__repr__(key)
+    raise TypeError('keys must be str, int, float, bool or None, not %s' %
+                    key.__class__.__name__)
+
+def iterdump(ast, compact=False):
+    """Yields the JSON dump of the tree rooted at ast in chunks
+
+    The output is the same as dump() but no intermediate structure is built
+    and the tree is walked with an explicit stack. With compact=True the
+    JSON has no indentation and no spaces.
+    """
+    return _iterdump(ast, compact)
+
+def _iterdump(ast, compact, depth=0, done=None):
+    """Yields the dump of ast written at depth
+
+    done maps (id, depth) of values already dumped to their JSON, written as
+    is, see pyast.parallel.
+    """
+    comma = ','
+    if compact:
+        colon = ':'
+        indents = None
+    else:
+        colon = ': '
+        indents = ['\n']
+    parts = []
+    append = parts.append
+    # values still to write with their depth, and literal strings
+    stack = [(ast, depth)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        item = pop()
+        if item.__class__ is str:
+            append(item)
+        else:
+            value, depth = item
+            if value is None:
+                append('null')
+            elif value is True:
+                append('true')
+            elif value is False:
+                append('false')
+            elif isinstance(value, basestring):
+                append(encode_basestring_ascii(value))
+            elif isinstance(value, int):
+                append(int.__repr__(value))
+            else:
+                if done is not None:
+                    text = done.get((id(value), depth))
+                    if text is not None:
+                        append(text)
+                        continue
+                if isinstance(value, pyast.Node):
+                    fields = value._fields
+                    if 'type' in fields:
+                        items = [('type', getattr(value, 'type'))] + [
+                            (name, getattr(value, name))
+                            for name in fields if name != 'type']
+                    else:
+                        items = [('type', value.__class__.__name__)] + [
+                            (name, getattr(value, name)) for name in fields]
+                    opening, closing = '{', '}'
+                elif isinstance(value, (list, tuple)):
+                    # FrozenLists are tuples
+                    items = [(_ITEM, i) for i in value]
+                    opening, closing = '[', ']'
+                elif isinstance(value, dict):
+                    items = list(value.items())
+                    opening, closing = '{', '}'
+                else:
+                    # neither a Node nor a list or dict
+                    items = [('type', None)]
+                    opening, closing = '{', '}'
+                if not items:
+                    append(opening + closing)
+                    continue
+                append(opening)
+                if indents is None:
+                    inner = outer = ''
+                else:
+                    while len(indents) < depth + 2:
+                        indents.append('\n' + '  ' * len(indents))
+                    inner = indents[depth + 1]
+                    outer = indents[depth]
+                push(outer + closing)
+                depth += 1
+                last = len(items) - 1
+                for i in range(last, -1, -1):
+                    key, child = items[i]
+                    push((child, depth))
+                    if key is _ITEM:
+                        push(inner if i == 0 else comma + inner)
+                    else:
+                        push('%s%s%s%s' % ('' if i == 0 else comma, inner,
+                                           _encode_key(key), colon))
+        if len(parts) >= CHUNK_SIZE:
+            yield ''.join(parts)
+            del parts[:]
+    if parts:
+        yield ''.join(parts)
+
+def dump(ast, fp=None, compact=False):
+    """Dumps the tree rooted at ast as JSON
+
+    Returns the JSON string, or writes it to the text file object fp in
+    chunks. See iterdump().
+    """
+    if fp is None:
+        return ''.join(iterdump(ast, compact))
+    write = fp.write
+    for chunk in iterdump(ast, compact):
+        write(chunk)
+
+def registry(classes=None):
+    """Returns the Node classes by name, as written in the "type" keys
+
+    classes is an iterable of Node classes, every concrete Node class defined
+    so far by default. Names shared by several classes map to None.
+    """
+    if classes is None:
+        classes = list(_classes.values())
+    names = {}
+    for cls in classes:
+        if cls._abstract:
+            continue
+        name = cls.__name__
+        names[name] = cls if names.get(name, cls) is cls else None
+    return names
+
+def load(data, validate=False, classes=None):
+    """Reads a tree written by dump()
+
+    data is a JSON str or bytes. Objects with a string "type" key are built
+    into Nodes of the class with that name, looked up in registry(classes),
+    as soon as they are parsed, so no dict is kept for them; other objects
+    are read as dicts. Lists and dicts in seq and dict fields become
+    TypedLists and TypedDicts. Nodes are not validated again unless validate
+    is True.
+
+    Tuples are written as lists and read back as lists, or as FrozenLists
+    in the seq fields of FrozenNodes. Values dump() cannot represent
+    (floats) and Nodes with a field named "type" don't survive the round
+    trip.
+    """
+    names = registry(classes)
+    builders = {}
+
+    def build(pairs):
+        if not pairs or pairs[0][0] != 'type' or \
+           not isinstance(pairs[0][1], basestring):
+            return dict(pairs)
+        keys, values = zip(*pairs)
+        name = values[0]
+        # the builder of the last fields dumped for the class
+        entry = builders.get(name)
+        if entry is None or entry[0] != keys:
+            try:
+                cls = names[name]
+            except KeyError:
+                raise ValueError('Unknown Node class %s' % name)
+            if cls is None:
+                raise ValueError('Node class name %s is ambiguous' % name)
+            entry = builders[name] = (keys, _builder(cls, keys[1:], validate))
+        return entry[1](list(values[1:]))
+    return json.loads(data, object_pairs_hook=build)
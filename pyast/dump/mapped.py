@@ -0,0 +1,400 @@
+"""Memory-mapped tree files whose Nodes are read on first use
+
+Layout of a file:
+
+    magic         b'PYASTM\\x01'
+    header        little-endian uint64s: number of Nodes, offset of the Node
+                  index, number of strings, offset of the string index and
+                  offset of the classes
+    records       one record per Node
+    strings       the UTF-8 strings, back to back
+    string index  uint64 offset of every string, then of the end of the last
+    classes       varint count, then for each class the string index of its
+                  classpath, varint field count and the string index of every
+                  field name, in _fields order
+    Node index    uint64 offset of the record of every Node
+
+Nodes are numbered breadth-first from the root, numbered 0, so siblings have
+neighbouring records. A record is the varint class index of the Node
+followed by its field values, encoded like in pyast.dump.binary except for
+Nodes: a Node held by a field is written as the NODE tag, its class index and
+its number, not its fields.
+
+load() maps the file and returns a MappedTree whose root is read, and no
+other Node. Reading a Node gives the Nodes it holds as unread Nodes of a
+subclass of their class, whose __class__ is their class; their record is
+decoded the first time one of their fields is read or written, and they are
+switched back to their class. Parts
+of the tree which aren't visited are never decoded and their pages are never
+read from the file. FrozenNodes, which are canonical, and Nodes without
+fields are read along with the Node holding them.
+
+Nodes reachable through more than one parent are written once per parent.
+"""
+import mmap
+import struct
+import sys
+
+import pyast
+from pyast.node import _classes, classpath
+from pyast.parents import adopt
+from pyast.dump.binary import NONE, FALSE, TRUE, INT, FLOAT, STR, NODE, \
+    LIST, TUPLE, DICT, _tags, _tag, _varint, _read_varint, _containers
+
+if sys.version >= '3':
+    basestring = str
+else:
+    pass
+
+MAGIC = b'PYASTM\x01'
+
+_header = struct.Struct('<5Q')
+_offset = struct.Struct('<Q')
+_span = struct.Struct('<2Q')
+_double = struct.Struct('<d')
+
+
+def dump(ast, fp=None):
+    """Writes the tree rooted at the Node ast in the mapped layout
+
+    Returns the file contents as bytes, or writes them to fp, a path or a
+    binary file object.
+    """
+    if not isinstance(ast, pyast.Node):
+        raise TypeError('Cannot dump %r, not a Node' % (ast,))
+    strings = {}
+    classes = {}
+    tags = _tags
+    out = bytearray()
+    append = out.append
+    offsets = []
+    # Nodes by number, whose records are written in order
+    nodes = [ast]
+    for node in nodes:
+        t = node.__class__
+        index = classes.get(t)
+        if index is None:
+            index = classes[t] = len(classes)
+            for name in (classpath(t),) + tuple(t._fields):
+                if not name in strings:
+                    strings[name] = len(strings)
+        offsets.append(len(out))
+        _varint(out, index)
+        stack = [getattr(node, name) for name in reversed(t._fields)]
+        pop = stack.pop
+        while stack:
+            value = pop()
+            t = value.__class__
+            tag = tags.get(t, -1)
+            if tag == -1:
+                tag = _tag(t)
+            if tag == STR:
+                index = strings.get(value)
+                if index is None:
+                    index = strings[value] = len(strings)
+                append(STR)
+                _varint(out, index)
+            elif tag == NODE:
+                index = classes.get(t)
+                if index is None:
+                    index = classes[t] = len(classes)
+                    for name in (classpath(t),) + tuple(t._fields):
+                        if not name in strings:
+                            strings[name] = len(strings)
+                append(NODE)
+                _varint(out, index)
+                _varint(out, len(nodes))
+                nodes.append(value)
+            elif tag == LIST or tag == TUPLE:
+                append(tag)
+                _varint(out, len(value))
+                stack.extend(reversed(value))
+            elif tag == DICT:
+                append(DICT)
+                _varint(out, len(value))
+                for key, item in reversed(list(value.items())):
+                    stack.append(item)
+                    stack.append(key)
+            elif tag is None:
+                append(TRUE if value else FALSE)
+            elif tag == INT:
+                append(INT)
+                _varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+            elif tag == FLOAT:
+                append(FLOAT)
+                out += _double.pack(value)
+            else:
+                append(NONE)
+
+    start = len(MAGIC) + _header.size
+    index = bytearray()
+    for string in sorted(strings, key=strings.get):
+        index += _offset.pack(start + len(out))
+        out += string.encode('utf-8')
+    index += _offset.pack(start + len(out))
+    string_index = start + len(out)
+    out += index
+    classes_offset = start + len(out)
+    _varint(out, len(classes))
+    for cls in sorted(classes, key=classes.get):
+        _varint(out, strings[classpath(cls)])
+        _varint(out, len(cls._fields))
+        for name in cls._fields:
+            _varint(out, strings[name])
+    node_index = start + len(out)
+    out += struct.pack('<%dQ' % len(offsets), *[start + offset
+                                                for offset in offsets])
+    header = MAGIC + _header.pack(len(offsets), node_index, len(strings),
+                                  string_index, classes_offset)
+    if fp is None:
+        return bytes(header + out)
+    if isinstance(fp, basestring):
+        with open(fp, 'wb') as f:
+            f.write(header)
+            f.write(out)
+    else:
+        fp.write(header)
+        fp.write(out)
+    return None
+
+
+# Node class -> the class of its unread Nodes
+_shells = {}
+
+
+def _shell(cls):
+    shell = _shells.get(cls)
+    if shell is None:
+        # type.__new__ doesn't register the class like NodeBase does, its
+        # Nodes dump and load as Nodes of cls
+        shell = _shells[cls] = type.__new__(type(cls), cls.__name__, (cls,), {
+            '__slots__': (),
+            '__module__': cls.__module__,
+            '__qualname__': getattr(cls, '__qualname__', cls.__name__),
+            '__doc__': cls.__doc__,
+            '__getattribute__': _getattribute,
+            '__setattr__': _setattr,
+            '__delattr__': _delattr,
+            '__reduce_ex__': _reduce_ex,
+        })
+    return shell
+
+
+def _read(node):
+    """Decodes the record of the unread Node node, whose first field holds
+    (MappedTree, number), and switches it to its class"""
+    cls = type(node).__base__
+    fields = cls._fields
+    tree, number = object.__getattribute__(node, fields[0])
+    values = tree._record(number)
+    for name, value in zip(fields, values):
+        object.__setattr__(node, name, value)
+    if cls._parents:
+        for name in cls._child_fields:
+            value = object.__getattribute__(node, name)
+            if value is not None:
+                object.__setattr__(node, name, adopt(node, name, value, None))
+    object.__setattr__(node, '__class__', cls)
+
+
+def _getattribute(node, name):
+    cls = type(node).__base__
+    if name in cls._guards:
+        _read(node)
+    elif name == '__class__':
+        # the tables keyed by the class of Nodes see cls before and after
+        # the Node is read
+        return cls
+    return object.__getattribute__(node, name)
+
+
+def _setattr(node, name, value):
+    _read(node)
+    setattr(node, name, value)
+
+
+def _delattr(node, name):
+    _read(node)
+    delattr(node, name)
+
+
+def _reduce_ex(node, protocol):
+    _read(node)
+    return node.__reduce_ex__(protocol)
+
+
+class MappedTree(object):
+    """A tree file mapped in memory, see load()
+
+    root is the root Node of the tree and decoded the number of records read
+    so far. len() is the number of Nodes in the file.
+    """
+
+    def __init__(self, data, classes=None, mapped=None):
+        self._data = data
+        self._mapped = mapped
+        if bytes(data[:len(MAGIC)]) != MAGIC:
+            raise ValueError('Not a pyast mapped tree file')
+        (self._count, self._index, _, self._string_index,
+         pos) = _header.unpack_from(data, len(MAGIC))
+        self._strings = {}
+        self.decoded = 0
+
+        if classes is None:
+            known = _classes
+        else:
+            known = dict((classpath(cls), cls) for cls in classes)
+        count, pos = _read_varint(data, pos)
+        # class index -> (class, class of its unread Nodes or None if they
+        # are read at once, seq and dict fields)
+        self._schema = []
+        for i in range(count):
+            index, pos = _read_varint(data, pos)
+            path = self._string(index)
+            try:
+                cls = known[path]
+            except KeyError:
+                raise ValueError('Unknown Node class %s' % path)
+            size, pos = _read_varint(data, pos)
+            fields = []
+            for j in range(size):
+                index, pos = _read_varint(data, pos)
+                fields.append(self._string(index))
+            if fields != list(cls._fields):
+                raise ValueError('%s was dumped with the fields %s' % (
+                    cls.__name__, ', '.join(fields)))
+            shell = None if cls._frozen or not fields else _shell(cls)
+            self._schema.append((cls, shell, _containers(cls)))
+        pos = _offset.unpack_from(data, self._index)[0]
+        self.root = self._node(_read_varint(data, pos)[0], 0)
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmaps the file; unread Nodes can't be read any more"""
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+        self._data = None
+
+    def _string(self, index):
+        string = self._strings.get(index)
+        if string is None:
+            start, end = _span.unpack_from(self._data,
+                                           self._string_index + 8 * index)
+            string = self._strings[index] = str(self._data[start:end],
+                                                'utf-8')
+        return string
+
+    def _node(self, index, number):
+        """Returns Node number, of class index, unread unless it is read at
+        once"""
+        cls, shell = self._schema[index][:2]
+        if shell is None:
+            values = self._record(number)
+            return cls(*values) if cls._frozen else cls._restore(*values)
+        node = object.__new__(shell)
+        object.__setattr__(node, cls._fields[0], (self, number))
+        return node
+
+    def _record(self, number):
+        """Decodes the record of Node number, returning its field values"""
+        data = self._data
+        if data is None:
+            raise ValueError('The mapped tree file is closed')
+        pos = _offset.unpack_from(data, self._index + 8 * number)[0]
+        index, pos = _read_varint(data, pos)
+        cls, shell, containers = self._schema[index]
+        values = []
+        # frames of the containers being read: [build, values still to
+        # read, values]
+        stack = []
+        size = len(cls._fields)
+        while len(values) < size:
+            tag = data[pos]
+            pos += 1
+            if tag == STR:
+                index, pos = _read_varint(data, pos)
+                value = self._string(index)
+            elif tag == NODE:
+                index, pos = _read_varint(data, pos)
+                number, pos = _read_varint(data, pos)
+                value = self._node(index, number)
+            elif tag == NONE:
+                value = None
+            elif tag == INT:
+                n, pos = _read_varint(data, pos)
+                value = -((n + 1) >> 1) if n & 1 else n >> 1
+            elif tag == LIST or tag == TUPLE or tag == DICT:
+                count, pos = _read_varint(data, pos)
+                if tag == LIST:
+                    build = list
+                elif tag == TUPLE:
+                    build = tuple
+                else:
+                    build = _pairs
+                    count *= 2
+                if count:
+                    stack.append([build, count, []])
+                    continue
+                value = build([])
+            elif tag == TRUE:
+                value = True
+            elif tag == FALSE:
+                value = False
+            elif tag == FLOAT:
+                value = _double.unpack_from(data, pos)[0]
+                pos += 8
+            else:
+                raise ValueError('Invalid tag %d at offset %d' % (tag,
+                                                                  pos - 1))
+            while stack:
+                frame = stack[-1]
+                frame[2].append(value)
+                frame[1] -= 1
+                if frame[1]:
+                    break
+                stack.pop()
+                value = frame[0](frame[2])
+            else:
+                values.append(value)
+        if not cls._frozen:
+            for i, make, typed, plain, types, null in containers:
+                value = values[i]
+                if value.__class__ is plain:
+                    values[i] = make(typed, types, null, value)
+        self.decoded += 1
+        return values
+
+
+def _pairs(values):
+    return dict(zip(values[::2], values[1::2]))
+
+
+def load(source, classes=None):
+    """Opens a tree written by dump() and returns it as a MappedTree
+
+    source is a path or a binary file object, which is mapped in memory, or
+    a bytes-like object. Node classes are looked up by module and qualified
+    name among the classes defined so far, or in classes (an iterable of
+    Node classes) when given. Nodes are not validated again.
+    """
+    if isinstance(source, basestring) or hasattr(source, 'fileno'):
+        if isinstance(source, basestring):
+            with open(source, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return MappedTree(mapped, classes, mapped)
+        except Exception:
+            mapped.close()
+            raise
+    return MappedTree(source, classes)
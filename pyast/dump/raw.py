@@ -1,3 +1,4 @@
+import pyast
 import sys
 
 if sys.version >= '3':
@@ -5,55 +6,109 @@ if sys.version >= '3':
 else:
     pass 
 
-def _dump_node(node, name=None, indent=0):
-    tree = []
-    if isinstance(node, str):
-        cl = "%s=\"%s\"" % (node.__class__.__name__, node)
-    elif isinstance(node, bool):
-        cl = "%s=%s" % (node.__class__.__name__, node)
-    elif isinstance(node, int):
-        cl = "%s=%s" % (node.__class__.__name__, node)
-    else:
-        cl = node.__class__.__name__
-    tree.append((indent, "%s[%s]" % (".%s" % name if name else "", cl)))
-    indent += 2
-    if isinstance(node, basestring):
-        #tree.append((indent, '"%s"' % node))
-        return tree
-    if isinstance(node, int):
-        return tree
-    if isinstance(node, bool):
-        return tree
-    elif node is None:
-        return []
-    for i in node._fields:
-        field = getattr(node, i)
-        if isinstance(field, list):
-            tree.append((indent, ".%s" % i))
-            tree.extend(_dump_list(field, indent=indent+2))
-        elif isinstance(field, dict):
-            tree.append((indent, ".%s" % i))
-            tree.extend(_dump_dict(field, indent=indent+2))
+def _kind(t):
+    """Returns (class label or None for scalars, is a Node) of values of t"""
+    if issubclass(t, (str, int)):
+        return None, False
+    return "[%s]" % t.__name__, issubclass(t, pyast.Node)
+
+# number of lines joined into each chunk yielded by iterdump()
+CHUNK_SIZE = 4096
+
+def iterdump(ast, max_depth=None, max_nodes=None):
+    """Yields the raw dump of the tree rooted at ast in chunks
+
+    The output is the same as dump(). The tree is walked with a stack of
+    iterators over Node fields and list items, so memory is bounded by the
+    depth of the tree.
+
+    Nodes deeper than max_depth (the root is at depth 0) are written
+    without their fields, and the dump stops after max_nodes Nodes and
+    values; the parts left out are marked by a "..." line.
+    """
+    return _iterdump(ast, max_depth, max_nodes)
+
+def _iterdump(ast, max_depth, max_nodes, indent=0, depth=0, done=None):
+    """Yields the dump of ast written as a list item at indent and depth
+
+    done maps (id, indent) of the list and dict items already dumped to
+    their lines, written as is, see pyast.parallel.
+    """
+    parts = []
+    append = parts.append
+    count = 0
+    kinds = {}
+    # (iterator, node or None, indent, depth): iterators over the fields of
+    # node, or over the items of a list or dict field when node is None
+    stack = [(iter((ast,)), None, indent, depth)]
+    while stack:
+        it, node, indent, depth = stack[-1]
+        for item in it:
+            break
+        else:
+            stack.pop()
+            continue
+        name = None
+        if node is None:
+            value = item
+            if done is not None:
+                text = done.get((id(value), indent))
+                if text is not None:
+                    append(text)
+                    continue
         else:
-            tree.extend(_dump_node(field, name=i, indent=indent))
-    return tree
-
-def _dump_list(tList, indent=0):
-    tree = []
-    for item in tList:
-        tree.extend(_dump_node(item, indent=indent))
-    return tree
-
-def _dump_dict(tDict, indent=0):
-    tree = []
-    for k,item in tDict.items():
-        tree.extend(_dump_node(item, indent=indent))
-    return tree
-
-def dump(ast):
-    tree = _dump_node(ast)
-    string = ""
-    for (indent, i) in tree:
-        string += "%s%s\n" % (indent*" ", i)
-    return string
+            name = item
+            value = getattr(node, name)
+            if isinstance(value, (list, tuple)):
+                # FrozenLists are tuples
+                append("%s.%s\n" % (indent * " ", name))
+                stack.append((iter(value), None, indent + 2, depth))
+                continue
+            if isinstance(value, dict):
+                append("%s.%s\n" % (indent * " ", name))
+                stack.append((iter(value.values()), None, indent + 2, depth))
+                continue
+        if value is None:
+            continue
+        count += 1
+        if max_nodes is not None and count > max_nodes:
+            append("%s...\n" % (indent * " "))
+            break
+        t = value.__class__
+        kind = kinds.get(t)
+        if kind is None:
+            kind = kinds[t] = _kind(t)
+        label, expand = kind
+        if label is None:
+            if isinstance(value, str):
+                label = "[%s=\"%s\"]" % (t.__name__, value)
+            else:
+                label = "[%s=%s]" % (t.__name__, value)
+        if name:
+            append("%s.%s%s\n" % (indent * " ", name, label))
+        else:
+            append("%s%s\n" % (indent * " ", label))
+        if expand and value._fields:
+            if max_depth is not None and depth >= max_depth:
+                append("%s...\n" % ((indent + 2) * " "))
+            else:
+                stack.append((iter(value._fields), value, indent + 2,
+                              depth + 1))
+        if len(parts) >= CHUNK_SIZE:
+            yield "".join(parts)
+            del parts[:]
+    if parts:
+        yield "".join(parts)
+
+def dump(ast, fp=None, max_depth=None, max_nodes=None):
+    """Dumps the tree rooted at ast, one line per Node and value
 
+    Returns the dump, or writes it to the text file object fp in chunks.
+    See iterdump() for max_depth and max_nodes.
+    """
+    chunks = iterdump(ast, max_depth, max_nodes)
+    if fp is None:
+        return "".join(chunks)
+    write = fp.write
+    for chunk in chunks:
+        write(chunk)
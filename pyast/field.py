@@ -1,12 +1,16 @@
 import sys
 import re as regexp
-from .typedlist import TypedList
-from .typeddict import TypedDict
+from .typedlist import TypedList, FrozenList
+from .typeddict import TypedDict, FrozenDict
+from .typecheck import pattern_matcher
 
 # Temporary solution for string/unicode in py2 vs py3
 if sys.version >= '3':
     basestring = str
 
+# re._pattern_type is gone since Python 3.7
+_pattern_type = type(regexp.compile(''))
+
 # we redefine to make pyast.re() a proper field
 def re(s):
     return regexp.compile(s)
@@ -42,14 +46,14 @@ class basefield(object):
     _guard_types = {
         'str': lambda x: isinstance(x, basestring),
         'class': lambda x: isinstance(x, type),
-        'pattern': lambda x: isinstance(x, regexp._pattern_type),
+        'pattern': lambda x: isinstance(x, _pattern_type),
     }
 
     def __new__(cls, types, null=False, default=None):
         if default is None:
             default = cls.get_default()
         basefield._counter += 1
-        if isinstance(types, (type, basestring, regexp._pattern_type)):
+        if isinstance(types, (type, basestring, _pattern_type)):
             types = (types,)
         guard_type = None
         for k,v in cls._guard_types.items():
@@ -63,6 +67,54 @@ class basefield(object):
                 'default': default,
                 '_counter': basefield._counter}
 
+    @classmethod
+    def validator(cls, name, guard):
+        """Returns the compiled init function of the guard for field name
+
+        The function takes the value being assigned and returns the value to
+        store, raising TypeError if the value is not allowed. It is compiled
+        once per field and cached on the guard.
+        """
+        validators = guard.setdefault('validators', {})
+        if name not in validators:
+            validators[name] = cls.compile(name, guard)
+        return validators[name]
+
+    @classmethod
+    def init(cls, name, val, guard):
+        return cls.validator(name, guard)(val)
+
+    @classmethod
+    def freezer(cls, name, guard, debug):
+        """Returns the function storing a value in a frozen Node's field
+
+        It converts the value to its immutable form (and validates it in
+        debug mode), or is None when values are stored as they are.
+        """
+        if debug:
+            return cls.validator(name, guard)
+        return None
+
+def _error(name, guard):
+    allowed = []
+    for i in guard['types']:
+        if isinstance(i, _pattern_type):
+            allowed.append(i.pattern)
+        else:
+            allowed.append(str(i))
+    return TypeError('Element %s must be one of %r' %
+                     (name, ','.join(allowed)))
+
+def _subclasses(types):
+    accepted = set()
+    stack = list(types)
+    while stack:
+        t = stack.pop()
+        if t not in accepted:
+            accepted.add(t)
+            stack.extend(type.__subclasses__(t))
+    return accepted
+
 class field(basefield):
     """Single Node field
 
@@ -80,35 +132,66 @@ class field(basefield):
         return None
 
     @classmethod
-    def init(cls, name, val, guard):
-        cls._validate_set(name, val, guard)
-        return val
+    def compile(cls, name, guard):
+        null = guard['null']
+        types = guard['types']
+        guard_type = guard['guard_type']
+
+        if guard_type == 'str':
+            accepted = frozenset(types)
+
+            def check(val):
+                try:
+                    return val in accepted
+                except TypeError:
+                    return val in types
+        elif guard_type == 'pattern' and \
+             all(isinstance(t, _pattern_type) for t in types):
+            matches = pattern_matcher(types)
+
+            def check(val):
+                try:
+                    return matches(val)
+                except TypeError:
+                    return False
+        elif all(isinstance(t, type) for t in types):
+            accepted = _subclasses(types)
+
+            def check(val):
+                if val.__class__ in accepted:
+                    return True
+                if isinstance(val, types):
+                    accepted.add(val.__class__)
+                    return True
+                return False
+        else:
+            def check(val):
+                return cls._check(val, guard)
+
+        def validate(val):
+            if val is None:
+                if null is False:
+                    raise TypeError('Element %s must not be empty' % name)
+                return val
+            if check(val):
+                return val
+            raise _error(name, guard)
+        return validate
+
+    @staticmethod
+    def _check(val, guard):
+        if guard['guard_type'] == 'str':
+            return val in guard['types']
+        elif guard['guard_type'] == 'pattern':
+            for guardt in guard['types']:
+                if guardt.match(val):
+                    return True
+            return False
+        return isinstance(val, guard['types'])
 
     @classmethod
-    def _validate_set(self, name, val, guard):
-        if val is None:
-            if guard['null'] is False:
-                raise TypeError('Element %s must not be empty' % name)
-            return
-        else:
-            if guard['guard_type'] == 'str':
-                if val in guard['types']:
-                    return
-            elif guard['guard_type'] == 'pattern':
-                for guardt in guard['types']:
-                    if guardt.match(val):
-                        return
-            else:
-                if isinstance(val, guard['types']):
-                    return
-        allowed = []
-        for i in guard['types']:
-            if isinstance(i, regexp._pattern_type):
-                allowed.append(i.pattern)
-            else:
-                allowed.append(str(i))
-        raise TypeError('Element %s must be one of %r' %
-                        (name, ','.join(allowed)))
+    def _validate_set(cls, name, val, guard):
+        cls.validator(name, guard)(val)
 
 
 class seq(basefield):
@@ -129,15 +212,25 @@ class seq(basefield):
         return []
 
     @classmethod
-    def init(cls, name, val, guard):
-        try:
-            return TypedList(guard['types'],
-                             val,
-                             null=guard['null'])
-        except TypeError as e:
-            raise TypeError('Error in field "%s":\n %s' % (
-                name,
-                str(e)))
+    def freezer(cls, name, guard, debug):
+        if debug:
+            init = cls.validator(name, guard)
+            return lambda val: FrozenList(init(val))
+        return lambda val: FrozenList(val or ())
+
+    @classmethod
+    def compile(cls, name, guard):
+        types = guard['types']
+        null = guard['null']
+
+        def init(val):
+            try:
+                return TypedList(types, val, null=null)
+            except TypeError as e:
+                raise TypeError('Error in field "%s":\n %s' % (
+                    name,
+                    str(e)))
+        return init
 
     @classmethod
     def _validate_set(cls, name, val, guard):
@@ -167,15 +260,25 @@ class dict(basefield):
         return {}
     
     @classmethod
-    def init(cls, name, val, guard):
-        try:
-            return TypedDict(guard['types'],
-                             init=val,
-                             null=guard['null'])
-        except TypeError as e:
-            raise TypeError('Error in field "%s":\n %s' % (
-                name,
-                str(e)))
+    def freezer(cls, name, guard, debug):
+        if debug:
+            init = cls.validator(name, guard)
+            return lambda val: FrozenDict(init(val))
+        return lambda val: FrozenDict(val or ())
+
+    @classmethod
+    def compile(cls, name, guard):
+        types = guard['types']
+        null = guard['null']
+
+        def init(val):
+            try:
+                return TypedDict(types, init=val, null=null)
+            except TypeError as e:
+                raise TypeError('Error in field "%s":\n %s' % (
+                    name,
+                    str(e)))
+        return init
 
     @classmethod
     def _validate_set(cls, name, val, guard):
@@ -0,0 +1,362 @@
+"""Indexes of the Nodes of a tree by class and by field value
+
+An Index is attached to the root of a tree and finds its Nodes by class,
+subclasses included, and by the values of chosen scalar fields without
+walking the tree:
+
+    index = Index(program, fields=[(Identifier, 'name')])
+    index.find(AssignmentExpression)
+    index.find(Identifier, name='x')
+
+It observes writes like pyast.template.RenderCache does: a write to a Node,
+TypedList or TypedDict of the tree marks it, and the next lookup compares
+what it holds with what it held before and indexes or drops the Nodes
+added or removed below it. Lookups cost the size of their result plus the
+containers written to since the previous one.
+
+Writes to plain lists and dicts (held by unchecked classes) and to Nodes
+with their own __setattr__ are not observed; they are compared on every
+lookup instead.
+"""
+import weakref
+from operator import attrgetter, is_not
+
+from . import mutation
+from .node import Node, _observe
+from .typedlist import TypedList, FrozenList
+from .typeddict import TypedDict, FrozenDict
+
+_SCALAR, _NODE, _CONTAINER, _FIXED, _VOLATILE_NODE, _VOLATILE = range(6)
+
+# what an Index sees in field values, by concrete type
+_kinds = {}
+
+
+def _kind(t):
+    if issubclass(t, Node):
+        kind = _NODE if _observe(t) else _VOLATILE_NODE
+    elif issubclass(t, (TypedList, TypedDict)):
+        kind = _CONTAINER
+    elif issubclass(t, (tuple, FrozenDict)):
+        # FrozenList included
+        kind = _FIXED
+    elif issubclass(t, (list, dict)):
+        kind = _VOLATILE
+    else:
+        kind = _SCALAR
+    _kinds[t] = kind
+    return kind
+
+
+def _held(obj):
+    """Returns the values held by a container"""
+    if isinstance(obj, dict):
+        return tuple(obj.values())
+    return tuple(obj)
+
+
+def _reader(name):
+    """Returns a function reading field name into a 1-tuple"""
+    get = attrgetter(name)
+    return lambda obj: (get(obj),)
+
+
+def _diff(old, new):
+    """Returns the items of new missing from old and of old missing from
+    new, compared by identity"""
+    if not any(map(is_not, old, new)):
+        # appended to or truncated
+        if len(new) >= len(old):
+            return new[len(old):], ()
+        return (), old[len(new):]
+    before = list(map(id, old))
+    after = list(map(id, new))
+    counts = {}
+    for key in before:
+        counts[key] = counts.get(key, 0) + 1
+    added = []
+    for item, key in zip(new, after):
+        count = counts.get(key)
+        if count:
+            counts[key] = count - 1
+        else:
+            added.append(item)
+    removed = []
+    for item, key in zip(old, before):
+        count = counts.get(key)
+        if count:
+            counts[key] = count - 1
+            removed.append(item)
+    return added, removed
+
+
+class Index(object):
+    """Nodes of the tree rooted at root by class and by field value
+
+    fields lists the (class, field name) pairs to index by value; the field
+    values of the Nodes of class (or of its subclasses) must be hashable.
+    Nodes reachable through several paths are indexed once.
+    """
+
+    def __init__(self, root, fields=()):
+        self.root = root
+        # the Nodes and containers of the tree by id
+        self._objects = {}
+        # id -> the values held by a Node or container, when it holds any
+        self._held = {}
+        # id -> number of holders of the objects held more than once
+        self._shared = {}
+        # id -> (table, value) pairs of a Node indexed by value
+        self._values = {}
+        # class -> {id(node): node}
+        self._classes = {}
+        # class -> the indexed classes which are subclasses of it
+        self._subclasses = {}
+        # (class, field name) -> {value: {id(node): node}}
+        self._tables = {}
+        # class -> (__setattr__, function reading the fields which may
+        #          hold Nodes, {id(node): node}, [(field name, table)])
+        self._layouts = {}
+        for cls, name in fields:
+            if name not in cls._fields:
+                raise ValueError('%s has no field %s' % (cls.__name__, name))
+            if name in cls._child_fields:
+                raise ValueError('%s.%s may hold Nodes; only scalar fields '
+                                 'are indexed by value' % (cls.__name__,
+                                                           name))
+            self._tables[(cls, name)] = {}
+        # written to since the last lookup, id -> object
+        self._dirty = {}
+        # objects whose writes are not observed, id -> object
+        self._volatile = {}
+        self._ref = weakref.ref(self, mutation.forget)
+        mutation.observers.append(self._ref)
+        self._add([root])
+
+    def __len__(self):
+        """Number of Nodes in the tree"""
+        self._update()
+        return sum(len(nodes) for nodes in self._classes.values())
+
+    def __contains__(self, node):
+        self._update()
+        return id(node) in self._objects and isinstance(node, Node)
+
+    def close(self):
+        """Stops observing writes and drops the indexes"""
+        mutation.forget(self._ref)
+        for attr in (self._objects, self._held, self._shared, self._values,
+                     self._classes, self._subclasses, self._layouts,
+                     self._dirty, self._volatile):
+            attr.clear()
+        for table in self._tables.values():
+            table.clear()
+
+    def touched(self, obj):
+        """Called with every Node, TypedList or TypedDict written to"""
+        key = id(obj)
+        # the objects of the tree are alive, so their ids are theirs
+        if key in self._objects:
+            self._dirty[key] = obj
+
+    def find(self, cls, **values):
+        """Returns the Nodes of cls or of its subclasses, in no particular
+        order, whose fields have the given values"""
+        self._update()
+        if values:
+            for (klass, name), table in self._tables.items():
+                if name in values and issubclass(cls, klass):
+                    nodes = table.get(values[name])
+                    if not nodes:
+                        return []
+                    return [node for node in nodes.values()
+                            if isinstance(node, cls) and
+                            _matches(node, values)]
+        found = []
+        for klass in self._classes_of(cls):
+            nodes = self._classes[klass].values()
+            if values:
+                found.extend([node for node in nodes
+                              if _matches(node, values)])
+            else:
+                found.extend(nodes)
+        return found
+
+    def count(self, cls, **values):
+        """Returns the number of Nodes find() returns"""
+        if values:
+            return len(self.find(cls, **values))
+        self._update()
+        return sum(len(self._classes[klass])
+                   for klass in self._classes_of(cls))
+
+    def _classes_of(self, cls):
+        classes = self._subclasses.get(cls)
+        if classes is None:
+            classes = self._subclasses[cls] = [
+                klass for klass in self._classes if issubclass(klass, cls)]
+        return classes
+
+    def _layout(self, cls):
+        setattr = cls.__setattr__
+        if setattr is Node.__debug__setattr__ or \
+           setattr is Node.__debug_parents__setattr__:
+            # the other fields were validated
+            fields = cls._child_fields
+        else:
+            fields = cls._fields
+        if not fields:
+            read = None
+        elif len(fields) == 1:
+            read = _reader(fields[0])
+        else:
+            read = attrgetter(*fields)
+        nodes = self._classes.get(cls)
+        if nodes is None:
+            nodes = self._classes[cls] = {}
+            self._subclasses.clear()
+        specs = [(name, table) for (klass, name), table in self._tables.items()
+                 if issubclass(cls, klass)]
+        layout = self._layouts[cls] = (setattr, read, nodes, specs)
+        return layout
+
+    def _index_values(self, node, specs):
+        pairs = []
+        key = id(node)
+        for name, table in specs:
+            value = getattr(node, name)
+            nodes = table.get(value)
+            if nodes is None:
+                nodes = table[value] = {}
+            nodes[key] = node
+            pairs.append((table, value))
+        self._values[key] = pairs
+
+    def _drop_values(self, key):
+        for table, value in self._values.pop(key):
+            nodes = table[value]
+            del nodes[key]
+            if not nodes:
+                del table[value]
+
+    def _add(self, items):
+        """Indexes the Nodes in items and below them"""
+        objects = self._objects
+        helds = self._held
+        shared = self._shared
+        kinds = _kinds
+        layouts = self._layouts
+        stack = list(items)
+        pop = stack.pop
+        extend = stack.extend
+        while stack:
+            obj = pop()
+            cls = obj.__class__
+            kind = kinds.get(cls)
+            if kind is None:
+                kind = _kind(cls)
+            if kind == _SCALAR:
+                continue
+            key = id(obj)
+            if key in objects:
+                shared[key] = shared.get(key, 1) + 1
+                continue
+            objects[key] = obj
+            if kind == _NODE or kind == _VOLATILE_NODE:
+                layout = layouts.get(cls)
+                if layout is None or layout[0] is not cls.__setattr__:
+                    layout = self._layout(cls)
+                layout[2][key] = obj
+                if layout[3]:
+                    self._index_values(obj, layout[3])
+                if kind == _VOLATILE_NODE:
+                    self._volatile[key] = obj
+                read = layout[1]
+                if read is None:
+                    continue
+                held = read(obj)
+            else:
+                if kind == _VOLATILE:
+                    self._volatile[key] = obj
+                held = _held(obj)
+                if not held:
+                    continue
+            helds[key] = held
+            extend(held)
+
+    def _remove(self, items):
+        """Drops the Nodes in items and below them no longer held by the
+        tree"""
+        objects = self._objects
+        shared = self._shared
+        stack = list(items)
+        pop = stack.pop
+        while stack:
+            obj = pop()
+            key = id(obj)
+            if key not in objects:
+                continue
+            count = shared.get(key)
+            if count is not None:
+                if count == 2:
+                    del shared[key]
+                else:
+                    shared[key] = count - 1
+                continue
+            del objects[key]
+            if isinstance(obj, Node):
+                del self._classes[obj.__class__][key]
+                if key in self._values:
+                    self._drop_values(key)
+            self._volatile.pop(key, None)
+            self._dirty.pop(key, None)
+            held = self._held.pop(key, None)
+            if held:
+                stack.extend(held)
+
+    def _refresh(self, obj):
+        cls = obj.__class__
+        key = id(obj)
+        if isinstance(obj, Node):
+            layout = self._layouts.get(cls)
+            if layout is None or layout[0] is not cls.__setattr__:
+                layout = self._layout(cls)
+            held = () if layout[1] is None else layout[1](obj)
+            if key in self._values:
+                self._drop_values(key)
+                self._index_values(obj, layout[3])
+        else:
+            held = _held(obj)
+        added, removed = _diff(self._held.get(key, ()), held)
+        if held:
+            self._held[key] = held
+        else:
+            self._held.pop(key, None)
+        if added:
+            self._add(added)
+        if removed:
+            self._remove(removed)
+
+    def _update(self):
+        """Indexes the changes made since the last lookup"""
+        objects = self._objects
+        if self._dirty:
+            dirty = self._dirty
+            self._dirty = {}
+            for key, obj in dirty.items():
+                if key in objects:
+                    self._refresh(obj)
+        if self._volatile:
+            for key, obj in list(self._volatile.items()):
+                if key in objects:
+                    self._refresh(obj)
+
+
+def _matches(node, values):
+    for name, value in values.items():
+        if getattr(node, name, _missing) != value:
+            return False
+    return True
+
+
+_missing = object()
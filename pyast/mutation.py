@@ -0,0 +1,61 @@
+"""Write tracking shared by Nodes, TypedLists and TypedDicts
+
+Structural hashes are cached on the Nodes (see pyast.node.structural_hash).
+A Node whose hash is cached is recorded, by a weak reference, in the
+_holders of the Nodes, TypedLists and TypedDicts it holds. A write to one
+of them drops the cached hash of the Node written to and of the Nodes above
+it, following _holders up to the roots; the hashes of other Nodes are kept.
+
+Observers are told which Node, TypedList or TypedDict was written to, to
+invalidate what they cached about it (see pyast.template.RenderCache).
+"""
+
+# number of open deferred() blocks; writes inside them are not observed one
+# by one, so no hashes are cached until they exit
+deferred = 0
+
+# weak references to the observers; writers only call notify() when the
+# list is not empty
+observers = []
+
+
+def invalidate(obj):
+    """Drops the cached hash of obj, a Node, TypedList or TypedDict written
+    to, and of the Nodes holding it, up to the roots
+
+    Writers only call it when obj has a cached hash or holders.
+    """
+    setattr = object.__setattr__
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if getattr(obj, '_hash', None) is not None:
+            setattr(obj, '_hash', None)
+        holders = getattr(obj, '_holders', None)
+        if holders is None:
+            continue
+        setattr(obj, '_holders', None)
+        if holders.__class__ is dict:
+            holders = holders.values()
+        else:
+            holders = (holders,)
+        for ref in holders:
+            node = ref()
+            if node is not None and \
+                    getattr(node, '_hash', None) is not None:
+                stack.append(node)
+
+
+def notify(obj):
+    """Calls touched(obj) on every live observer"""
+    for ref in observers:
+        observer = ref()
+        if observer is not None:
+            observer.touched(obj)
+
+
+def forget(ref):
+    """Removes the weak reference to an observer, also used as its
+    callback"""
+    if ref in observers:
+        observers.remove(ref)
@@ -1,6 +1,11 @@
 import sys
 import re
 import copy
+import math
+import weakref
+
+# re._pattern_type is gone since Python 3.7
+_pattern_type = type(re.compile(''))
 
 if sys.version >= '3':
     from itertools import zip_longest
@@ -11,16 +16,23 @@ else:
     string = unicode
 
 
+import pyast
+from contextlib import ExitStack, contextmanager
+from . import mutation
 from .field import basefield
+from .typedlist import TypedList, FrozenList
+from .typeddict import TypedDict, FrozenDict
 
 class NodeBase(type):
     """ Metaclass for AST Nodes
     Verifies the syntax of the declarative field syntax
     """
     def __new__(cls, name, bases, attrs):
+        global class_generation
         parents = [b for b in bases if isinstance(b, NodeBase)]
         if not parents:
             return type.__new__(cls, name, bases, attrs)
+        declared = []
         guards = {}
         for base in bases:
             if isinstance(base, NodeBase) and hasattr(base, '_guards'):
@@ -30,26 +42,370 @@ class NodeBase(type):
                 if not isinstance(v, (basestring, property)) and not hasattr(v, '__call__'):
                     raise TypeError("_template must be a string")
                 continue
-            if k.startswith('_') or hasattr(v, '__call__'):
+            if k.startswith('_') or hasattr(v, '__call__') or \
+               isinstance(v, property):
                 continue
             if not isinstance(v, dict) or not issubclass(v['field_cls'], basefield):
                 raise TypeError('Field type must be a subclass of basefield')
             if not all(isinstance(i, (type,
                                       str,
-                                      re._pattern_type)) for i in v['types']):
+                                      _pattern_type)) for i in v['types']):
                 raise TypeError('Field types must be python types or strings')
             guards[k] = v
+            declared.append(k)
         fields = [i[0] for i in sorted(guards.items(),
                                        key=lambda x: x[1]['_counter'])]
         attrs['_guards'] = guards
         attrs['_fields'] = fields
+        attrs['_child_fields'] = tuple(
+            k for k in fields if _holds_nodes(guards[k]))
+        attrs['_validators'] = dict(
+            (k, v['field_cls'].validator(k, v)) for k, v in guards.items())
         if not '_abstract' in attrs.keys():
             attrs['_abstract'] = False
-        return type.__new__(cls, name, bases, attrs)
+        frozen = attrs.get('_frozen', any(getattr(b, '_frozen', False)
+                                          for b in bases))
+        parented = attrs.get('_parents', any(getattr(b, '_parents', False)
+                                             for b in bases))
+        if frozen and parented:
+            raise TypeError('FrozenNodes are shared and have no parent')
+        if attrs.get('_slots', any(getattr(b, '_slots', False) for b in bases)) \
+           and not '__slots__' in attrs.keys():
+            slotted = set()
+            for base in bases:
+                for klass in base.__mro__:
+                    slotted.update(klass.__dict__.get('__slots__', ()))
+            for k in declared:
+                del attrs[k]
+            attrs['__slots__'] = tuple(k for k in fields if k not in slotted)
+            if not '_hash' in slotted:
+                attrs['__slots__'] += ('_hash', '_holders')
+            if parented and not '_parent' in slotted:
+                attrs['__slots__'] += ('_parent',)
+            if not any(hasattr(b, '__weakref__') for b in bases):
+                # canonical frozen Nodes are held in a weak-value table,
+                # parents and Nodes with a cached hash are referenced weakly
+                # by their children
+                attrs['__slots__'] += ('__weakref__',)
+        new_cls = type.__new__(cls, name, bases, attrs)
+        _install(new_cls)
+        _classes[classpath(new_cls)] = new_cls
+        class_generation += 1
+        return new_cls
+
+# types whose values are never Nodes, see _holds_nodes()
+_value_types = (basestring, bytes, int, float, complex, list, tuple, dict,
+                set, frozenset)
+
+def _holds_nodes(guard):
+    """Tells if the guard of a field lets it hold Nodes, or lists or dicts
+    of Nodes for seq and dict fields
+
+    Fields guarded by strings, patterns and builtin value types only are left
+    out of the _child_fields of their class, so traversals skip them.
+    """
+    return any(isinstance(t, type) and not issubclass(t, _value_types)
+               for t in guard['types'])
+
+# every Node class by its classpath(), for the loaders in pyast.dump
+_classes = weakref.WeakValueDictionary()
+
+# bumped whenever a Node class is created, including classes replacing one
+# of the same classpath, for the caches of classes by name (see pyast.query)
+class_generation = 0
+
+def classpath(cls):
+    """Returns '<module>.<qualified name>' identifying a Node class"""
+    return '%s.%s' % (cls.__module__,
+                      getattr(cls, '__qualname__', cls.__name__))
+
+def debug_enabled(cls):
+    """Tells if Nodes of cls are type checked
+
+    Classes which don't set _debug (or set it to None) follow pyast.DEBUG.
+    """
+    if cls._debug is None:
+        return pyast.DEBUG
+    return cls._debug
+
+def _install(cls):
+    """Installs the debug or non-debug __init__/__setattr__/__delattr__
+
+    Called once when the class is created and again by set_debug().
+    Hand-written __init__ and __setattr__ methods are left in place.
+    Unchecked classes get a __setattr__ reporting writes (see
+    pyast.mutation) once they are _observed: by an Index or a RenderCache,
+    or after the hash of one of their Nodes was kept in debug mode. Classes
+    with _parents get a __setattr__ recording the parent of their children,
+    see pyast.parents.
+    """
+    debug = debug_enabled(cls)
+    if cls._frozen:
+        cls.__setattr__ = cls.__frozen__setattr__
+        cls.__delattr__ = cls.__frozen__delattr__
+        if not '_interned' in cls.__dict__:
+            cls._interned = weakref.WeakValueDictionary()
+        cls._new = staticmethod(_make_new(cls, debug))
+        own = cls.__dict__.get('__new__')
+        if own is None or hasattr(own, '__source__'):
+            cls.__new__ = cls._new
+        cls.__init__ = object.__init__
+        return
+    own = cls.__dict__.get('__setattr__')
+    if own is None or own is object.__setattr__ or \
+       own is cls.__debug__setattr__ or own is cls.__observed__setattr__ or \
+       own is cls.__parents__setattr__ or \
+       own is cls.__debug_parents__setattr__:
+        if cls._parents:
+            if debug:
+                cls.__setattr__ = cls.__debug_parents__setattr__
+                cls.__delattr__ = cls.__debug__delattr__
+            else:
+                cls.__setattr__ = cls.__parents__setattr__
+                cls.__delattr__ = object.__delattr__
+        elif debug:
+            cls.__setattr__ = cls.__debug__setattr__
+            cls.__delattr__ = cls.__debug__delattr__
+        else:
+            if cls._observed:
+                cls.__setattr__ = cls.__observed__setattr__
+            else:
+                cls.__setattr__ = object.__setattr__
+            cls.__delattr__ = object.__delattr__
+    cls._restore = staticmethod(_make_restore(cls))
+    own = cls.__dict__.get('__reduce_ex__')
+    if own is None or hasattr(own, '__source__'):
+        cls.__reduce_ex__ = _make_reduce(cls)
+    cls._init = _make_init(cls, debug)
+    own = cls.__dict__.get('__init__')
+    if own is None and getattr(cls.__init__, '_replaceable', False) or \
+       own is not None and hasattr(own, '__source__'):
+        cls.__init__ = cls._init
+
+def _subclasses(cls):
+    seen = set()
+    stack = [cls]
+    while stack:
+        klass = stack.pop()
+        if klass in seen:
+            continue
+        seen.add(klass)
+        yield klass
+        stack.extend(klass.__subclasses__())
+
+def set_debug(debug, cls=None):
+    """Switches Nodes between the debug and the optimized mode at runtime
+
+    Without cls, sets pyast.DEBUG, which applies to every class that doesn't
+    set _debug itself. With cls (for example the root class of a grammar),
+    sets cls._debug, which its subclasses inherit unless they set their own.
+    Already created Nodes are not re-validated.
+    """
+    if cls is None:
+        pyast.DEBUG = debug
+        cls = Node
+    else:
+        cls._debug = debug
+    for klass in _subclasses(cls):
+        _install(klass)
+
+_missing = object()
+
+def _compile(cls, name, params, body, ns):
+    source = 'def %s(%s):\n    %s\n' % (name,
+                                          ', '.join(params),
+                                          '\n    '.join(body))
+    exec(compile(source, '<pyast:%s.%s>' % (cls.__name__, name), 'exec'), ns)
+    func = ns[name]
+    func.__module__ = cls.__module__
+    func.__qualname__ = '%s.%s' % (getattr(cls, '__qualname__', cls.__name__),
+                                   name)
+    func.__source__ = source
+    func._replaceable = True
+    return func
+
+def _defaults(cls, ns):
+    """Returns the parameters and default-filling code for cls fields"""
+    params = []
+    body = []
+    for i, name in enumerate(cls._fields):
+        default = cls._guards[name]['default']
+        ns['_default_%d' % i] = default
+        if hasattr(default, '__iter__') and \
+           not isinstance(default, (basestring, tuple, frozenset)):
+            params.append('%s=_missing' % name)
+            if type(default) is list and not default:
+                factory = '[]'
+            elif type(default) is dict and not default:
+                factory = '{}'
+            else:
+                factory = '_copy(_default_%d)' % i
+            body.append('if %s is _missing: %s = %s' % (name, name, factory))
+        else:
+            params.append('%s=_default_%d' % (name, i))
+    return params, body
+
+def _selfname(cls, name='self'):
+    while name in cls._fields:
+        name = '_%s' % name
+    return name
+
+def _adopt_lines(cls, selfname, ns):
+    """Returns the code recording the Node as the parent of its children,
+    for classes with _parents; Node values are handled inline"""
+    if not cls._parents:
+        return []
+    ns.update(_adopt=_adopt, _kinds=_parents._kinds, _ref=weakref.ref)
+    body = []
+    for name in cls._child_fields:
+        body.extend([
+            '_kind = _kinds.get(%s.__class__)' % name,
+            'if _kind == %d:' % _parents._NODE,
+            '    _setattr(%s, \'_parent\', (_ref(%s), %r))' % (
+                name, selfname, name),
+            'elif _kind != 0:',
+            '    %s = _adopt(%s, %r, %s, None)' % (name, selfname, name,
+                                                  name),
+        ])
+    return body
+
+def _make_init(cls, debug):
+    """Builds a straight-line __init__ for cls
+
+    The generated function takes one positional/keyword parameter per field
+    in _fields order, with the field defaults inlined (mutable defaults are
+    copied on every call). Extra positional and unknown keyword arguments
+    are ignored, as by Node.__init__. In debug mode each value is passed
+    through its field's compiled validator before being stored. Classes with
+    _parents record the Node as the parent of its children.
+    """
+    selfname = _selfname(cls)
+    ns = {
+        '_cls': cls,
+        '_missing': _missing,
+        '_copy': copy.copy,
+        '_setattr': object.__setattr__,
+    }
+    plain = not debug and cls.__setattr__ is object.__setattr__
+    params, defaults = _defaults(cls, ns)
+    params += ['*_args', '**_kwargs']
+    # called by subclasses, from a hand-written __init__ taking the fields of
+    # cls, or directly: the fields of the subclass come after those of cls
+    body = ['if %s.__class__ is not _cls:' % selfname,
+            '    return %s._init(%s)' % (selfname, ', '.join(
+                cls._fields + ['*_args', '**_kwargs']))]
+    if debug and cls._abstract:
+        body.append('raise TypeError(\'Class %s is abstract\' % _cls.__name__)')
+    body.extend(defaults)
+    for i, name in enumerate(cls._fields):
+        if debug:
+            ns['_validate_%d' % i] = cls._validators[name]
+            body.append('%s = _validate_%d(%s)' % (name, i, name))
+    body.extend(_adopt_lines(cls, selfname, ns))
+    for name in cls._fields:
+        if plain:
+            body.append('%s.%s = %s' % (selfname, name, name))
+        else:
+            body.append('_setattr(%s, %r, %s)' % (selfname, name, name))
+    return _compile(cls, '__init__', [selfname] + params, body, ns)
+
+def _make_reduce(cls):
+    """Builds the __reduce_ex__ of cls, used by pickle and copy.copy()
+
+    A Node is pickled as its field values in _fields order, with cls._restore
+    to rebuild it; pickle stores a reference to cls._restore once and no
+    field names.
+    """
+    selfname = _selfname(cls)
+    ns = {'_restore': cls._restore}
+    body = ['return (_restore, (%s))' % ''.join(
+        '%s.%s, ' % (selfname, name) for name in cls._fields)]
+    return _compile(cls, '__reduce_ex__', [selfname, '_protocol'], body, ns)
+
+def _make_restore(cls):
+    """Builds cls._restore, unpickling a Node without validating it again"""
+    ns = {
+        '_cls': cls,
+        '_new': object.__new__,
+        '_setattr': object.__setattr__,
+    }
+    node = _selfname(cls, 'node')
+    body = ['%s = _new(_cls)' % node]
+    body.extend(_adopt_lines(cls, node, ns))
+    for name in cls._fields:
+        body.append('_setattr(%s, %r, %s)' % (node, name, name))
+    body.append('return %s' % node)
+    return _compile(cls, '_restore', list(cls._fields), body, ns)
+
+def _intern_key(value):
+    """Returns a hashable key identifying a frozen Node's field value"""
+    t = value.__class__
+    if t is str or value is None:
+        return value
+    if t is FrozenList:
+        return (t, tuple(map(_intern_key, value)))
+    if t is FrozenDict:
+        return (t, tuple((k, _intern_key(v)) for k, v in value.items()))
+    if t is float:
+        # 0.0 == -0.0, the sign keeps them apart
+        return (t, value, math.copysign(1, value))
+    if isinstance(value, FrozenNode):
+        return value
+    if isinstance(value, Node):
+        # compared by value, a Node could change once interned
+        return (t, id(value))
+    try:
+        hash(value)
+    except TypeError:
+        # mutable values are only shared when they are the same object
+        return (t, id(value))
+    return (t, value)
+
+def _make_new(cls, debug):
+    """Builds the __new__ of a FrozenNode class
+
+    It converts (and in debug mode validates) the field values like the
+    generated __init__ does, then returns the canonical instance for them
+    from the class' intern table.
+    """
+    clsname = _selfname(cls, 'cls')
+    ns = {
+        '_cls': cls,
+        '_missing': _missing,
+        '_copy': copy.copy,
+        '_setattr': object.__setattr__,
+        '_new': object.__new__,
+        '_key': _intern_key,
+        '_interned': cls._interned,
+    }
+    params, defaults = _defaults(cls, ns)
+    params += ['*_args', '**_kwargs']
+    body = ['if %s is not _cls:' % clsname,
+            '    return %s._new(%s, %s)' % (clsname, clsname, ', '.join(
+                cls._fields + ['*_args', '**_kwargs']))]
+    if debug and cls._abstract:
+        body.append('raise TypeError(\'Class %s is abstract\' % _cls.__name__)')
+    body.extend(defaults)
+    for i, name in enumerate(cls._fields):
+        guard = cls._guards[name]
+        freeze = guard['field_cls'].freezer(name, guard, debug)
+        if freeze is not None:
+            ns['_freeze_%d' % i] = freeze
+            body.append('%s = _freeze_%d(%s)' % (name, i, name))
+    body.append('key = (%s)' % ''.join('_key(%s), ' % name
+                                       for name in cls._fields))
+    body.append('node = _interned.get(key)')
+    body.append('if node is None:')
+    body.append('    node = _new(%s)' % clsname)
+    for name in cls._fields:
+        body.append('    _setattr(node, %r, %s)' % (name, name))
+    body.append('    _interned[key] = node')
+    body.append('return node')
+    return _compile(cls, '__new__', [clsname] + params, body, ns)
 
 # Temporary solution for metaclass in py2 vs py3
 if sys.version >= '3':
-    TempNode = NodeBase("NodeBase", (object,), {})
+    TempNode = NodeBase("NodeBase", (object,), {'__slots__': ()})
 else:
     TempNode = object
 
@@ -81,12 +437,373 @@ def getfillvalue(node, name=None, default=False):
         fv = getattr(obj, name)
     return fv
 
+def _observe(cls):
+    """Tells if writes to Nodes of cls are observed, so what is cached about
+    them can be kept
+
+    Unchecked classes with the default __setattr__ are switched to
+    __observed__setattr__ the first time this is asked; debug classes get
+    it if set_debug() turns them to unchecked later, since callers cache
+    the answer.
+    """
+    setattr = cls.__setattr__
+    if setattr is object.__setattr__:
+        cls._observed = True
+        _install(cls)
+        return True
+    if setattr is Node.__debug__setattr__:
+        cls._observed = True
+        return True
+    return setattr is Node.__observed__setattr__ or \
+        setattr is Node.__parents__setattr__ or \
+        setattr is Node.__debug_parents__setattr__ or \
+        setattr is FrozenNode.__frozen__setattr__
+
+def _keeps_hash(cls):
+    """Tells if the structural hash of Nodes of cls can be kept on them
+
+    Writes to them must be observed already, and they must have room for
+    the hash and the weak references to the Nodes holding them. Unlike
+    _observe(), unchecked classes are left as they are; debug classes are
+    marked _observed, so that their writes stay observed if set_debug()
+    turns them to unchecked.
+    """
+    setattr = cls.__setattr__
+    if setattr is Node.__debug__setattr__ or \
+       setattr is Node.__debug_parents__setattr__:
+        cls._observed = True
+    elif not (setattr is Node.__observed__setattr__ or
+              setattr is Node.__parents__setattr__ or
+              setattr is FrozenNode.__frozen__setattr__):
+        return False
+    if not cls.__weakrefoffset__:
+        return False
+    if not cls.__dictoffset__:
+        # __slots__ declared by hand
+        slots = set()
+        for klass in cls.__mro__:
+            slots.update(klass.__dict__.get('__slots__', ()))
+        return '_hash' in slots and '_holders' in slots
+    return True
+
+# What structural_hash() and _equal() see in field values, by concrete type;
+# isinstance() checks against NodeBase classes go through __instancecheck__.
+# Nodes with their own __eq__ are hashed and compared as opaque values.
+_NODE, _SEQ, _DICT = 1, 2, 3
+_kinds = {}
+
+def _kind(t):
+    if issubclass(t, Node):
+        kind = _NODE if t.__eq__ in (Node.__eq__, FrozenNode.__eq__) else 0
+    elif issubclass(t, (list, tuple)):
+        kind = _SEQ
+    elif issubclass(t, dict):
+        kind = _DICT
+    else:
+        kind = 0
+    _kinds[t] = kind
+    return kind
+
+# how many holders a Node, TypedList or TypedDict records before the dead
+# ones are dropped, doubled each time, see _hold()
+HOLDERS_PRUNED = 8
+
+def _hold(node, held=None, stack=None):
+    """Records node, whose hash is about to be kept, in the _holders of the
+    Nodes, TypedLists and TypedDicts it holds, so that writes to them drop
+    it (see pyast.mutation)
+
+    held and stack are the Nodes and the lists and dicts held by the fields
+    of node, when the caller has them. Returns False if node holds a plain
+    list or dict, or a Node in a list or dict whose hash isn't kept: the
+    hash of node can't be kept then.
+    """
+    kinds = _kinds
+    if held is None:
+        held = []
+        stack = []
+        for name in node._fields:
+            value = getattr(node, name, None)
+            kind = kinds.get(value.__class__)
+            if kind == _NODE:
+                held.append(value)
+            elif kind:
+                stack.append(value)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (TypedList, TypedDict)):
+            held.append(value)
+        elif not isinstance(value, (tuple, FrozenDict)):
+            # writes to plain lists and dicts aren't observed
+            return False
+        for item in value.values() if isinstance(value, dict) else value:
+            kind = kinds.get(item.__class__)
+            if kind is None:
+                kind = _kind(item.__class__)
+            if kind == _NODE:
+                if getattr(item, '_hash', None) is None:
+                    return False
+                held.append(item)
+            elif kind:
+                stack.append(item)
+    ref = weakref.ref(node)
+    key = id(node)
+    setattr = object.__setattr__
+    for value in held:
+        holders = getattr(value, '_holders', None)
+        if holders is None or holders is ref:
+            setattr(value, '_holders', ref)
+        elif holders.__class__ is dict:
+            size = len(holders)
+            if size >= HOLDERS_PRUNED and not size & (size - 1):
+                # the holders which died since they were recorded
+                for k in [k for k, r in holders.items() if r() is None]:
+                    del holders[k]
+            holders[key] = ref
+        else:
+            other = holders()
+            if other is None:
+                setattr(value, '_holders', ref)
+            else:
+                setattr(value, '_holders', {id(other): holders, key: ref})
+    return True
+
+def _value_hash(value, known):
+    kind = _kinds.get(value.__class__)
+    if kind is None:
+        kind = _kind(value.__class__)
+    if kind == _NODE:
+        h = getattr(value, '_hash', None)
+        if h is None:
+            h = known.get(id(value))
+            if h is None:
+                h = structural_hash(value)
+        return h
+    if kind == _SEQ:
+        return hash((isinstance(value, list),
+                     tuple([_value_hash(i, known) for i in value])))
+    if kind == _DICT:
+        return hash((dict, frozenset([(k, _value_hash(v, known))
+                                      for k, v in value.items()])))
+    return hash(value)
+
+def structural_hash(node):
+    """Returns the Merkle-style hash of the tree rooted at node
+
+    The hash of a Node combines its _fields with the hashes of its field
+    values; sequences and dicts are hashed by content, so structurally equal
+    trees get the same hash. It is cached on each Node, which is recorded in
+    the _holders of what it holds: a write drops the hashes of the Node
+    written to and of the Nodes above it only (see pyast.mutation).
+    Nodes whose writes aren't observed, such as Nodes of unchecked classes
+    which no Index or RenderCache observes, and Nodes whose subtree holds
+    one of them or a plain list or dict, are hashed again on each call.
+    The tree is walked with an explicit stack.
+
+    Raises TypeError when a field holds an unhashable value.
+    """
+    h = getattr(node, '_hash', None)
+    if h is not None:
+        return h
+    kinds = _kinds
+    # Nodes without a cached hash, parents first
+    order = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        order.append(current)
+        for name in current._fields:
+            value = getattr(current, name, None)
+            kind = kinds.get(value.__class__)
+            if kind is None:
+                kind = _kind(value.__class__)
+            if kind == _NODE:
+                if getattr(value, '_hash', None) is None:
+                    stack.append(value)
+            elif kind:
+                if kind == _DICT:
+                    value = value.values()
+                for item in value:
+                    kind = kinds.get(item.__class__)
+                    if kind is None:
+                        kind = _kind(item.__class__)
+                    if kind == _NODE and getattr(item, '_hash', None) is None:
+                        stack.append(item)
+    cache = not mutation.deferred
+    keeps = {}
+    # id(Node) -> hash of the Nodes whose hash can't be kept on them,
+    # because some write to their subtree is not observed
+    known = {}
+    setattr = object.__setattr__
+    for current in reversed(order):
+        if getattr(current, '_hash', None) is not None or id(current) in known:
+            # reached through more than one parent
+            continue
+        fields = current._fields
+        values = [tuple(fields)]
+        keep = cache
+        held = []
+        containers = []
+        for name in fields:
+            value = getattr(current, name, None)
+            kind = kinds.get(value.__class__)
+            if kind == _NODE:
+                h = getattr(value, '_hash', None)
+                if h is None:
+                    h = known[id(value)]
+                    keep = False
+                values.append(h)
+                held.append(value)
+            elif kind:
+                values.append(_value_hash(value, known))
+                containers.append(value)
+            else:
+                values.append(value)
+        h = hash(tuple(values))
+        if keep:
+            cls = current.__class__
+            keep = keeps.get(cls)
+            if keep is None:
+                keep = keeps[cls] = _keeps_hash(cls)
+        if keep and _hold(current, held, containers):
+            setattr(current, '_hash', h)
+        else:
+            known[id(current)] = h
+    h = getattr(node, '_hash', None)
+    if h is None:
+        return known[id(node)]
+    return h
+
+def _equal(a, b):
+    """Compares two trees field by field, with an explicit stack
+
+    Nodes with different cached hashes (see structural_hash) are told apart
+    without descending into them; hashes are not computed here, as that
+    costs more than a single comparison.
+    """
+    kinds = _kinds
+    stack = [(a, b)]
+    while stack:
+        a, b = stack.pop()
+        kind = kinds.get(a.__class__)
+        if kind is None:
+            kind = _kind(a.__class__)
+        other = kinds.get(b.__class__)
+        if other is None:
+            other = _kind(b.__class__)
+        if kind == _NODE and other == _NODE:
+            if a is b:
+                continue
+            if a._frozen or b._frozen:
+                # FrozenNodes are only equal to themselves
+                return False
+            fields = a._fields
+            if fields is not b._fields and fields != b._fields:
+                return False
+            ha = getattr(a, '_hash', None)
+            if ha is not None:
+                hb = getattr(b, '_hash', None)
+                if hb is not None and ha != hb:
+                    return False
+            for name in fields:
+                x = getattr(a, name)
+                y = getattr(b, name)
+                if x is y:
+                    continue
+                if kinds.get(x.__class__) == 0:
+                    if x != y:
+                        return False
+                else:
+                    stack.append((x, y))
+        elif kind == _SEQ and other == _SEQ and \
+             isinstance(a, list) == isinstance(b, list):
+            if len(a) != len(b):
+                return False
+            stack.extend(zip(a, b))
+        elif kind == _DICT and other == _DICT:
+            if a.keys() != b.keys():
+                return False
+            for k in a:
+                stack.append((a[k], b[k]))
+        elif a != b:
+            return False
+    return True
+
+# field values shared by a Node and its clones
+_atomic = frozenset((str, bytes, int, float, complex, bool, type(None)))
+
+def _clone_value(value, memo, stack):
+    t = value.__class__
+    if t in _atomic:
+        return value
+    copied = memo.get(id(value))
+    if copied is not None:
+        return copied
+    kind = _kinds.get(t)
+    if kind is None:
+        kind = _kind(t)
+    if kind == _NODE or kind == 0 and isinstance(value, Node):
+        if value._frozen:
+            return value
+        copied = memo[id(value)] = object.__new__(t)
+        stack.append((value, copied))
+    elif isinstance(value, (TypedList, TypedDict)):
+        if kind == _DICT:
+            items = [(k, v if v.__class__ in _atomic else
+                      _clone_value(v, memo, stack))
+                     for k, v in value.items()]
+        else:
+            items = [i if i.__class__ in _atomic else
+                     _clone_value(i, memo, stack) for i in value]
+        copied = memo[id(value)] = value._clone(items)
+    else:
+        copied = copy.deepcopy(value, memo)
+    return copied
+
+def clone(node, memo=None):
+    """Returns a deep copy of the tree rooted at node
+
+    Field values are copied as they are, without running the validators or
+    __init__: the Nodes, TypedLists and TypedDicts being copied were already
+    checked. FrozenNodes are immutable and shared with the copy, as are
+    strings and numbers. The tree is walked with an explicit stack.
+    """
+    if memo is None:
+        memo = {}
+    stack = []
+    root = _clone_value(node, memo, stack)
+    setattr = object.__setattr__
+    atomic = _atomic
+    # the copies given the cached hash of their source
+    hashed = []
+    while stack:
+        source, copied = stack.pop()
+        children = source._child_fields if source._parents else ()
+        for name in source._fields:
+            value = getattr(source, name)
+            if not value.__class__ in atomic:
+                value = _clone_value(value, memo, stack)
+            if name in children:
+                value = _adopt(copied, name, value, None)
+            setattr(copied, name, value)
+        # the copy has the same structure
+        cached = getattr(source, '_hash', None)
+        if cached is not None:
+            setattr(copied, '_hash', cached)
+            hashed.append(copied)
+    # once all the copies hold their values
+    for copied in hashed:
+        if not _hold(copied):
+            setattr(copied, '_hash', None)
+    return root
+
 class Node(TempNode):
     """Basic AST Node
 
     Any Node should subclass from this one
     """
     __metaclass__ = NodeBase
+    __slots__ = ()
 
     ####
     #
@@ -94,12 +811,56 @@ class Node(TempNode):
     #
     # The cost is ~2x slower performance on operations around AST classes.
     #
+    # None means that the class follows the global pyast.DEBUG switch.
+    # See set_debug() for changing the mode of existing classes.
+    #
+    ####
+    _debug = None
+
+    ####
+    #
+    # Slotted Nodes store their fields in __slots__ generated from the field
+    # declarations instead of a per-instance __dict__.
+    #
+    # Set _slots = True on a class (usually the root of a grammar, so that
+    # every subclass inherits it) to save memory on large trees. Slotted
+    # Nodes do not accept arbitrary attributes.
+    #
+    ####
+    _slots = False
+
+    # set by FrozenNode
+    _frozen = False
+
+    # set on unchecked classes once a hash of one of their Nodes is cached,
+    # see _observe()
+    _observed = False
+
+    ####
+    #
+    # Nodes of classes with _parents record the Node holding them, read
+    # through parent, path() and root(). Like _slots, it is read when the
+    # class is created and usually set on the root class of a grammar.
+    # See pyast.parents.
+    #
     ####
-    _debug = True
+    _parents = False
+
+    # cached structural hash, see structural_hash()
+    _hash = None
+
+    # weak reference to the Node whose cached hash covers this one, or a
+    # dict of them by id, see pyast.mutation
+    _holders = None
+
+    # (weak reference to the parent, field name[, index or key]), see
+    # pyast.parents
+    _parent = None
 
     def __init__(self, *args, **kwargs):
         key = 0
-        if self._debug and self._abstract:
+        debug = debug_enabled(self.__class__)
+        if debug and self._abstract:
             raise TypeError('Class %s is abstract' % self.__class__.__name__)
         for name in self._fields:
             if name in kwargs:
@@ -112,23 +873,79 @@ class Node(TempNode):
                     val = self._guards[name]['default']
                     if hasattr(val, '__iter__'):
                         val = copy.copy(val)
-            if self._debug:
+            if debug:
                 guards = self._guards
                 val = guards[name]['field_cls'].init(name,
                                                      val,
                                                      guards[name])
-                setattr(self.__class__, '__delattr__', self.__debug__delattr__)
-                setattr(self.__class__, '__setattr__', self.__debug__setattr__)
-                self.__debug__setattr__(name, val)
-            else:
-                object.__setattr__(self, name, val)
+            object.__setattr__(self, name, val)
+    __init__._replaceable = True
 
     def __setstate__(self, state):
         """
-        This make deepcopy() work on Nodes as __setstate__ is called on
-        copied objects
+        Restores Nodes pickled before Node.__reduce_ex__, which stored
+        their __dict__ (or slots) and re-run __init__ when loaded
         """
-        self.__init__(**state)
+        if isinstance(state, tuple):
+            # slotted Nodes are pickled as (__dict__, slots) pair
+            state = dict(state[0] or {}, **(state[1] or {}))
+        self.__init__(**dict((k, v) for k, v in state.items()
+                             if k in self._fields))
+
+    def clone(self):
+        """Returns a deep copy of the Node without re-validating it
+
+        See pyast.node.clone; copy.deepcopy() uses the same path.
+        """
+        return clone(self)
+
+    def __deepcopy__(self, memo):
+        return clone(self, memo)
+
+    @contextmanager
+    def deferred(self):
+        """Defers type checks of the Node's sequences and dicts
+
+        Returns a context manager; see TypedList.deferred. Fields assigned
+        inside the block are still checked as usual. If the block raises,
+        or leaves an invalid element in any of them, all the sequences and
+        dicts are put back as they were when the block was entered.
+
+            with prog.deferred():
+                for stmt in statements:
+                    prog.body.append(stmt)
+        """
+        containers = []
+        for name in self._fields:
+            value = getattr(self, name, None)
+            if isinstance(value, (TypedList, TypedDict)):
+                containers.append((value, value.copy()))
+        try:
+            with ExitStack() as stack:
+                for value, _ in containers:
+                    stack.enter_context(value.deferred())
+                yield self
+        except BaseException:
+            # the containers validated before the failing one kept their
+            # items
+            for value, items in containers:
+                value._reset(items)
+            raise
+
+    @property
+    def parent(self):
+        """The Node holding this one, for classes with _parents"""
+        return _parents.parent(self)
+
+    def path(self):
+        """Returns the field names, indexes and keys leading from root() to
+        the Node, for classes with _parents"""
+        return _parents.path(self)
+
+    def root(self):
+        """Returns the topmost Node above this one, for classes with
+        _parents"""
+        return _parents.root(self)
 
     def __getitem__(self, key):
         if hasattr(self, key):
@@ -136,21 +953,14 @@ class Node(TempNode):
         raise KeyError(key)
 
     def __repr__(self, fields=None, serializer=None):
+        """Renders the _template of the Node, see pyast.template
+
+        Given fields, the template is formatted with them instead of the
+        field values.
+        """
+        if fields is None:
+            return render(self)
         if hasattr(self, '_template'):
-            if fields is None:
-                fields = {}
-                for leaf in self._fields:
-                    field = getattr(self, leaf)
-                    if isinstance(field, (int, basestring)):
-                        fields[leaf] = field
-                    elif isinstance(field, list):
-                        if hasattr(self, '_template_%s' % leaf):
-                            template = getattr(self, '_template_%s' % leaf)
-                        else:
-                            template = None
-                        fields[leaf] = field.__repr__(template)
-                    else:
-                        fields[leaf] = field.__repr__()
             return self._template % fields
         return '<Node:%s (%s)>' % (self.__class__.__name__,
                                    ', '.join(self._fields))
@@ -201,26 +1011,122 @@ class Node(TempNode):
         """
 
     def __eq__(self, other):
-        if not isinstance(other, Node):
+        if self is other:
+            return True
+        if not isinstance(other, Node) or other._frozen:
             return False
         if self._fields != other._fields:
             return False
-        for field in self._fields:
-            if getattr(self, field) != getattr(other, field):
-                return False
-        return True
+        return _equal(self, other)
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __hash__(self):
+        return structural_hash(self)
+
     def __debug__setattr__(self, name, val):
-        if name in self._fields:
-            val = self._guards[name]['field_cls'].init(name,
-                                                      val,
-                                                      self._guards[name])
+        validate = self._validators.get(name)
+        if validate is not None:
+            val = validate(val)
+        object.__setattr__(self, name, val)
+        if getattr(self, '_hash', None) is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+
+    def __observed__setattr__(self, name, val):
         object.__setattr__(self, name, val)
+        if getattr(self, '_hash', None) is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+
+    def __parents__setattr__(self, name, val):
+        if name in self._child_fields:
+            val = _adopt(self, name, val, getattr(self, name, None))
+        object.__setattr__(self, name, val)
+        if getattr(self, '_hash', None) is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+
+    def __debug_parents__setattr__(self, name, val):
+        validate = self._validators.get(name)
+        if validate is not None:
+            val = validate(val)
+        if name in self._child_fields:
+            val = _adopt(self, name, val, getattr(self, name, None))
+        object.__setattr__(self, name, val)
+        if getattr(self, '_hash', None) is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
 
     def __debug__delattr__(self, name):
         if name in self._fields:
             raise Exception("Cannot remove Node's fields")
         object.__delattr__(self, name)
+
+
+class FrozenNode(Node):
+    """Immutable AST Node with hash-consing
+
+    Constructing a FrozenNode returns the canonical instance for the given
+    field values, so structurally equal frozen trees are the same objects:
+    they share memory and compare by identity. Sequence and dict fields hold
+    FrozenList/FrozenDict. Canonical instances live in a weak-value table per
+    class and are garbage collected when no longer used.
+
+    Children which are not frozen are only shared when they are the same
+    object.
+
+    FrozenNodes compare and hash by identity: two frozen trees built from
+    equal values are the same object, and a FrozenNode is never equal to a
+    Node which is not frozen, however equal their fields. Frozen trees
+    holding distinct Nodes which are not frozen are distinct, and unequal,
+    even when those Nodes are equal.
+
+    example:
+
+    class Expression(ast.FrozenNode):
+        _abstract = True
+
+    class Identifier(Expression):
+        name = ast.field(str)
+
+    Identifier('x') is Identifier('x')  # True
+    """
+    __slots__ = ()
+
+    _frozen = True
+
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    __hash__ = object.__hash__
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce_ex__(self, protocol):
+        # canonical instances are looked up again when unpickled
+        return (self.__class__,
+                tuple([getattr(self, name) for name in self._fields]))
+
+    def __frozen__setattr__(self, name, val):
+        raise AttributeError('%s is frozen' % self.__class__.__name__)
+
+    def __frozen__delattr__(self, name):
+        raise AttributeError('%s is frozen' % self.__class__.__name__)
+
+# imports Node
+from .template import render
+from . import parents as _parents
+from .parents import adopt as _adopt
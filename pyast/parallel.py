@@ -0,0 +1,225 @@
+"""Rendering and dumping large trees in a process pool
+
+render(), dump_js() and dump_raw() give the same text as
+pyast.template.render(), pyast.dump.js.dump() and pyast.dump.raw.dump(),
+byte for byte, for trees whose root holds a long list of Nodes, such as
+Program.body:
+
+    text = pyast.parallel.render(program, workers=8)
+
+The items of the list are split into chunks which the processes of a
+concurrent.futures.ProcessPoolExecutor write, each item on its own; the
+root is then written in the calling process with the text of each item put
+in its place.
+
+The transport picks how the items reach the processes. With 'fork', the
+default where the platform has it, the processes are forked once the tree
+is built and read the items they inherited, and only the text is sent back.
+With 'binary', the chunks are sent as pyast.dump.binary dumps; the
+processes import the modules of the Node classes of the items, which must
+be importable by their module and qualified name, as for binary.load(), or
+the call raises the ImportError met by the processes; when they are
+spawned rather than forked, they see the classes (and their _template) as
+their modules define them. Nodes given a _template or _template_<field>
+of their own aren't sent whole by a dump, so render() writes them in forked
+processes when it can, and serially otherwise.
+
+A chunk is a few times smaller than len(items) / workers, so that the
+processes share the work evenly. Lists shorter than two items, a single
+worker, or raw dumps with max_nodes are written serially.
+"""
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .node import Node
+from .template import _chunks, _repr
+from .visit import walk
+from .dump import binary, js, raw
+
+# number of chunks per worker the items are split into
+CHUNKS_PER_WORKER = 4
+
+# the items the forked processes inherit, while a call is running
+_items = None
+
+# the ImportError met by _init() in a process, raised by its first task
+_failed = None
+
+
+def _field(node, field):
+    """Returns the list of Nodes held by field of node, by default the
+    longest list held by node"""
+    if field is None:
+        lists = [getattr(node, name) for name in node._fields]
+        lists = [value for value in lists if isinstance(value, list)]
+        if not lists:
+            raise ValueError('%s holds no list' % node.__class__.__name__)
+        return max(lists, key=len)
+    if field not in node._fields:
+        raise ValueError('%s has no field %s' % (node.__class__.__name__,
+                                                 field))
+    value = getattr(node, field)
+    if not isinstance(value, list):
+        raise ValueError('%s.%s is not a list' % (node.__class__.__name__,
+                                                  field))
+    return value
+
+
+def _init(modules):
+    # raised from _work(), as errors in an initializer only break the pool
+    global _failed
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            _failed = ImportError('Cannot import %s, which defines Node '
+                                  'classes: %s' % (name, e), name=name)
+            return
+
+
+def _write(kind, options, items):
+    """Returns the text of each of items, written as a list item of the root
+    by kind"""
+    if kind == 'render':
+        return [''.join(_chunks([_repr(item)])) for item in items]
+    if kind == 'js':
+        return [''.join(js._iterdump(item, options, 2)) for item in items]
+    return [''.join(raw._iterdump(item, options, None, 4, 1))
+            for item in items]
+
+
+def _work(kind, options, chunk):
+    """Writes a chunk, (start, stop) in the inherited items or a binary
+    dump of its items"""
+    if _failed is not None:
+        raise _failed
+    if chunk.__class__ is tuple:
+        items = _items[chunk[0]:chunk[1]]
+    else:
+        items = binary.load(chunk)
+    return _write(kind, options, items)
+
+
+def _transport(transport):
+    if transport is None:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            return 'fork'
+        return 'binary'
+    if transport not in ('fork', 'binary'):
+        raise ValueError('Unknown transport %r' % (transport,))
+    return transport
+
+
+def _own_templates(items):
+    """Returns True if a Node under items has a _template or a
+    _template_<field> attribute of its own, which binary dumps don't keep"""
+    for item in items:
+        if not isinstance(item, Node):
+            continue
+        for node in walk(item):
+            attributes = getattr(node, '__dict__', None)
+            if attributes and any(name.startswith('_template')
+                                  for name in attributes):
+                return True
+    return False
+
+
+def _texts(kind, options, items, workers, transport):
+    """Writes items in a pool of workers, returning their text in order"""
+    global _items
+    size = -(-len(items) // (workers * CHUNKS_PER_WORKER))
+    bounds = [(start, min(start + size, len(items)))
+              for start in range(0, len(items), size)]
+    if transport == 'fork':
+        context = multiprocessing.get_context('fork')
+        modules = ()
+    else:
+        context = None
+        modules = set()
+        for item in items:
+            if isinstance(item, Node):
+                modules.update(node.__class__.__module__
+                               for node in walk(item))
+        modules = sorted(modules)
+    _items = items
+    try:
+        with ProcessPoolExecutor(workers, context, _init,
+                                 (modules,)) as pool:
+            futures = []
+            for start, stop in bounds:
+                if transport == 'fork':
+                    chunk = (start, stop)
+                else:
+                    chunk = binary.dump(list(items[start:stop]))
+                futures.append(pool.submit(_work, kind, options, chunk))
+            texts = []
+            for future in futures:
+                texts.extend(future.result())
+    finally:
+        _items = None
+    return texts
+
+
+def _workers(workers):
+    if workers is None:
+        return multiprocessing.cpu_count()
+    return workers
+
+
+def _output(chunks, fp):
+    if fp is None:
+        return ''.join(chunks)
+    write = fp.write
+    for chunk in chunks:
+        write(chunk)
+
+
+def render(node, fp=None, field=None, workers=None, transport=None):
+    """Renders node as pyast.template.render() does, writing the items of
+    its list field in workers processes (the number of CPUs by default)
+
+    field names the list to split, by default the longest list held by
+    node. Returns the text, or writes it to the text file object fp.
+    """
+    items = _field(node, field)
+    workers = _workers(workers)
+    transport = _transport(transport)
+    if transport == 'binary' and _own_templates(items):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            return _output(_chunks([_repr(node)]), fp)
+        transport = 'fork'
+    if workers < 2 or len(items) < 2:
+        return _output(_chunks([_repr(node)]), fp)
+    texts = _texts('render', None, items, workers, transport)
+    done = dict((id(item), text) for item, text in zip(items, texts))
+    return _output(_chunks([_repr(node)], done), fp)
+
+
+def dump_js(node, fp=None, compact=False, field=None, workers=None,
+            transport=None):
+    """Dumps node as JSON like pyast.dump.js.dump(), writing the items of
+    its list field in workers processes, see render()"""
+    items = _field(node, field)
+    workers = _workers(workers)
+    transport = _transport(transport)
+    if workers < 2 or len(items) < 2:
+        return _output(js.iterdump(node, compact), fp)
+    texts = _texts('js', compact, items, workers, transport)
+    done = dict(((id(item), 2), text) for item, text in zip(items, texts))
+    return _output(js._iterdump(node, compact, 0, done), fp)
+
+
+def dump_raw(node, fp=None, max_depth=None, max_nodes=None, field=None,
+             workers=None, transport=None):
+    """Dumps node like pyast.dump.raw.dump(), writing the items of its list
+    field in workers processes, see render()"""
+    items = _field(node, field)
+    workers = _workers(workers)
+    transport = _transport(transport)
+    if workers < 2 or len(items) < 2 or max_nodes is not None:
+        # the Nodes left out depend on the Nodes written before them
+        return _output(raw.iterdump(node, max_depth, max_nodes), fp)
+    texts = _texts('raw', max_depth, items, workers, transport)
+    done = dict(((id(item), 4), text) for item, text in zip(items, texts))
+    return _output(raw._iterdump(node, max_depth, None, 0, 0, done), fp)
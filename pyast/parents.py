@@ -0,0 +1,449 @@
+"""Parent pointers of Nodes
+
+Nodes of classes which set _parents = True record where they are held: a
+weak reference to the Node holding them, the name of its field and, for
+items of list and dict fields, their index or key. The record is kept up to
+date when Nodes are assigned to fields or added to and removed from the
+lists and dicts of these fields, and read through Node.parent, Node.path()
+and Node.root().
+
+TypedLists and TypedDicts stored in the child fields of these classes are
+switched in place to ParentedList and ParentedDict, which update the records
+of their items; the plain lists and dicts of unchecked classes are copied
+into their parented counterparts. Other list and dict subclasses are left as
+they are, their items get a record when the container is assigned.
+
+Indexes in lists are hints: inserting an item doesn't renumber the items
+after it, path() renumbers the whole list when it finds a stale one.
+
+A Node held in several places records the last one it was put in. Classes
+without _parents are not affected.
+"""
+from contextlib import contextmanager
+import weakref
+
+from .node import Node
+from .typedlist import TypedList
+from .typeddict import TypedDict
+
+_ref = weakref.ref
+_setattr = object.__setattr__
+_missing = object()
+
+_NODE, _SEQ, _DICT = 1, 2, 3
+
+# what adopt() sees in field values, by concrete type
+_kinds = {}
+
+
+def _kind(t):
+    if issubclass(t, Node):
+        kind = _NODE if t._parents else 0
+    elif issubclass(t, (list, tuple)):
+        kind = _SEQ
+    elif issubclass(t, dict):
+        kind = _DICT
+    else:
+        kind = 0
+    _kinds[t] = kind
+    return kind
+
+
+def _detach(item, ref, name, kinds=_kinds):
+    """Clears the record of item if it is held by field name of ref()"""
+    kind = kinds.get(item.__class__)
+    if kind is None:
+        kind = _kind(item.__class__)
+    if kind == _NODE:
+        record = getattr(item, '_parent', None)
+        if record is not None and record[0] is ref and record[1] == name:
+            _setattr(item, '_parent', None)
+
+
+def adopt(node, name, value, old):
+    """Records node as the parent of value, assigned to its field name in
+    place of old, and returns the value to store
+
+    Lists and dicts are returned as their parented counterparts.
+    """
+    kinds = _kinds
+    if old is not None and old is not value:
+        release(node, name, old)
+    t = value.__class__
+    kind = kinds.get(t)
+    if kind is None:
+        kind = _kind(t)
+    if kind == _NODE:
+        _setattr(value, '_parent', (_ref(node), name))
+    elif kind:
+        tracked = _tracked.get(t)
+        if tracked is not None:
+            if t is TypedList or t is TypedDict:
+                value.__class__ = tracked
+            else:
+                value = tracked(value)
+        ref = _ref(node)
+        if tracked is not None or t in _parented:
+            value._owner = (ref, name)
+        items = value.items() if kind == _DICT else enumerate(value)
+        for key, item in items:
+            kind = kinds.get(item.__class__)
+            if kind is None:
+                kind = _kind(item.__class__)
+            if kind == _NODE:
+                _setattr(item, '_parent', (ref, name, key))
+    return value
+
+
+def release(node, name, old):
+    """Clears the records of the Nodes in old, no longer held by field name
+    of node"""
+    kinds = _kinds
+    kind = kinds.get(old.__class__)
+    if kind is None:
+        kind = _kind(old.__class__)
+    ref = _ref(node)
+    if kind == _NODE:
+        _detach(old, ref, name)
+    elif kind:
+        owner = getattr(old, '_owner', None)
+        if owner is not None:
+            if owner[0] is not ref or owner[1] != name:
+                # moved to another field, its items are held there
+                return
+            old._owner = None
+        for item in (old.values() if kind == _DICT else old):
+            _detach(item, ref, name)
+
+
+def parent(node):
+    """Returns the Node holding node, or None"""
+    record = getattr(node, '_parent', None)
+    if record is None:
+        return None
+    return record[0]()
+
+
+def _renumber(items, ref, name):
+    """Records the index of the Nodes of the list held by field name of
+    ref()"""
+    kinds = _kinds
+    for i, item in enumerate(items):
+        kind = kinds.get(item.__class__)
+        if kind is None:
+            kind = _kind(item.__class__)
+        if kind == _NODE:
+            record = getattr(item, '_parent', None)
+            if record is not None and record[0] is ref and record[1] == name:
+                _setattr(item, '_parent', (ref, name, i))
+
+
+def path(node):
+    """Returns the steps leading from root(node) to node
+
+    Each step is a field name, followed by the index or key of the item for
+    list and dict fields.
+    """
+    steps = []
+    while True:
+        record = getattr(node, '_parent', None)
+        if record is None:
+            break
+        holder = record[0]()
+        if holder is None:
+            break
+        name = record[1]
+        if len(record) == 3:
+            key = record[2]
+            value = getattr(holder, name)
+            if isinstance(value, (list, tuple)):
+                if not (key < len(value) and value[key] is node):
+                    # moved by an insertion or removal before it
+                    _renumber(value, record[0], name)
+                    key = node._parent[2]
+                    if not (key < len(value) and value[key] is node):
+                        raise ValueError('%s is no longer held by %s.%s' % (
+                            node.__class__.__name__,
+                            holder.__class__.__name__, name))
+            steps.append(key)
+        steps.append(name)
+        node = holder
+    steps.reverse()
+    return steps
+
+
+def root(node):
+    """Returns the topmost Node above node, or node itself"""
+    while True:
+        record = getattr(node, '_parent', None)
+        if record is None:
+            return node
+        holder = record[0]()
+        if holder is None:
+            return node
+        node = holder
+
+
+class _ListParents(object):
+    """Updates the records of the Nodes added to and removed from a list"""
+    # (weak reference to the Node, field name), set by adopt()
+    _owner = None
+
+    def _attach(self, positions):
+        owner = self._owner
+        if owner is None:
+            return
+        ref, name = owner
+        kinds = _kinds
+        get = list.__getitem__
+        for i in positions:
+            item = get(self, i)
+            kind = kinds.get(item.__class__)
+            if kind is None:
+                kind = _kind(item.__class__)
+            if kind == _NODE:
+                _setattr(item, '_parent', (ref, name, i))
+
+    def _detach(self, items):
+        owner = self._owner
+        if owner is None:
+            return
+        ref, name = owner
+        for item in items:
+            _detach(item, ref, name)
+
+    def append(self, item):
+        super(_ListParents, self).append(item)
+        owner = self._owner
+        if owner is not None:
+            kind = _kinds.get(item.__class__)
+            if kind == _NODE:
+                _setattr(item, '_parent', (owner[0], owner[1], len(self) - 1))
+            elif kind is None:
+                size = len(self)
+                self._attach(range(size - 1, size))
+
+    def insert(self, pos, item):
+        super(_ListParents, self).insert(pos, item)
+        if self._owner is not None:
+            size = len(self)
+            if pos < 0:
+                pos = max(pos + size - 1, 0)
+            else:
+                pos = min(pos, size - 1)
+            self._attach(range(pos, pos + 1))
+
+    def extend(self, items):
+        start = len(self)
+        super(_ListParents, self).extend(items)
+        self._attach(range(start, len(self)))
+
+    def __iadd__(self, items):
+        start = len(self)
+        super(_ListParents, self).__iadd__(items)
+        self._attach(range(start, len(self)))
+        return self
+
+    def __imul__(self, n):
+        items = list(self) if n < 1 else ()
+        super(_ListParents, self).__imul__(n)
+        self._detach(items)
+        return self
+
+    def pop(self, key=-1):
+        item = super(_ListParents, self).pop(key)
+        self._detach((item,))
+        return item
+
+    def remove(self, item):
+        removed = list.__getitem__(self, list.index(self, item))
+        super(_ListParents, self).remove(item)
+        self._detach((removed,))
+
+    def clear(self):
+        items = list(self)
+        super(_ListParents, self).clear()
+        self._detach(items)
+
+    def __delitem__(self, key):
+        removed = list.__getitem__(self, key)
+        super(_ListParents, self).__delitem__(key)
+        self._detach(removed if type(key) is slice else (removed,))
+
+    def __setitem__(self, key, value):
+        if type(key) is slice:
+            if not isinstance(value, (list, tuple)):
+                value = list(value)
+            start, stop, step = key.indices(len(self))
+            removed = list.__getitem__(self, key)
+            super(_ListParents, self).__setitem__(key, value)
+            self._detach(removed)
+            if step == 1:
+                start = min(start, len(self) - len(value))
+                self._attach(range(start, start + len(value)))
+            else:
+                self._attach(range(start, stop, step))
+        else:
+            removed = list.__getitem__(self, key)
+            super(_ListParents, self).__setitem__(key, value)
+            self._detach((removed,))
+            if key < 0:
+                key += len(self)
+            self._attach(range(key, key + 1))
+
+    def _clone(self, items):
+        new = super(_ListParents, self)._clone(items)
+        # held by no Node until assigned
+        new.__dict__.pop('_owner', None)
+        return new
+
+    def _reset(self, items):
+        self._detach(list(self))
+        super(_ListParents, self)._reset(items)
+        self._attach(range(len(self)))
+
+    @contextmanager
+    def deferred(self):
+        """See TypedList.deferred; the records of the items are updated when
+        the block exits"""
+        items = list(self)
+        try:
+            with super(_ListParents, self).deferred():
+                yield self
+        finally:
+            self._detach(items)
+            self._attach(range(len(self)))
+
+
+class _DictParents(object):
+    """Updates the records of the Nodes added to and removed from a dict"""
+    # (weak reference to the Node, field name), set by adopt()
+    _owner = None
+
+    def _attach(self, items):
+        owner = self._owner
+        if owner is None:
+            return
+        ref, name = owner
+        kinds = _kinds
+        for key, item in items:
+            kind = kinds.get(item.__class__)
+            if kind is None:
+                kind = _kind(item.__class__)
+            if kind == _NODE:
+                _setattr(item, '_parent', (ref, name, key))
+
+    _detach = _ListParents._detach
+
+    def _sync(self, old):
+        """Updates the records after the values of old were replaced"""
+        added = []
+        for key, item in dict.items(self):
+            previous = old.get(key, _missing)
+            if previous is not item:
+                if previous is not _missing:
+                    self._detach((previous,))
+                added.append((key, item))
+        self._attach(added)
+
+    def __setitem__(self, key, value):
+        old = dict.get(self, key, _missing)
+        super(_DictParents, self).__setitem__(key, value)
+        if old is not _missing:
+            self._detach((old,))
+        self._attach(((key, value),))
+
+    def __delitem__(self, key):
+        old = dict.__getitem__(self, key)
+        super(_DictParents, self).__delitem__(key)
+        self._detach((old,))
+
+    def pop(self, key, *default):
+        held = key in self
+        value = super(_DictParents, self).pop(key, *default)
+        if held:
+            self._detach((value,))
+        return value
+
+    def popitem(self):
+        key, value = super(_DictParents, self).popitem()
+        self._detach((value,))
+        return key, value
+
+    def clear(self):
+        values = list(self.values())
+        super(_DictParents, self).clear()
+        self._detach(values)
+
+    def setdefault(self, key, default=None):
+        held = key in self
+        value = super(_DictParents, self).setdefault(key, default)
+        if not held:
+            self._attach(((key, value),))
+        return value
+
+    def update(self, *args, **kwargs):
+        old = dict(self)
+        super(_DictParents, self).update(*args, **kwargs)
+        self._sync(old)
+
+    def __ior__(self, other):
+        old = dict(self)
+        super(_DictParents, self).__ior__(other)
+        self._sync(old)
+        return self
+
+    def _clone(self, items):
+        new = super(_DictParents, self)._clone(items)
+        new.__dict__.pop('_owner', None)
+        return new
+
+    def _reset(self, items):
+        self._detach(list(self.values()))
+        super(_DictParents, self)._reset(items)
+        self._attach(dict.items(self))
+
+    @contextmanager
+    def deferred(self):
+        """See TypedDict.deferred; the records of the items are updated when
+        the block exits"""
+        old = dict(self)
+        try:
+            with super(_DictParents, self).deferred():
+                yield self
+        finally:
+            self._detach(old.values())
+            self._attach(dict.items(self))
+
+
+class ParentedList(_ListParents, TypedList):
+    """TypedList of a parented Node field"""
+
+
+class ParentedDict(_DictParents, TypedDict):
+    """TypedDict of a parented Node field"""
+
+
+class _PlainList(_ListParents, list):
+    """List of a parented unchecked Node field"""
+
+    def __reduce_ex__(self, protocol):
+        return (self.__class__, (list(self),))
+
+
+class _PlainDict(_DictParents, dict):
+    """Dict of a parented unchecked Node field"""
+
+    def __reduce_ex__(self, protocol):
+        return (self.__class__, (dict(self),))
+
+
+# parented counterparts of the containers adopt() switches
+_tracked = {
+    TypedList: ParentedList,
+    TypedDict: ParentedDict,
+    list: _PlainList,
+    dict: _PlainDict,
+}
+
+_parented = frozenset(_tracked.values())
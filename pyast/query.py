@@ -0,0 +1,563 @@
+"""Selectors over Node trees
+
+A selector is a list of steps separated by combinators, like CSS:
+
+    AssignmentExpression > Identifier[name="x"]
+    Program.body[*] ExpressionStatement
+
+A step names a Node class, which matches its subclasses too, or * for any
+Node, followed by filters on field values:
+
+    [name="x"]      equal to a string, an integer, true, false or null
+    [name!="x"]     not equal
+    [name]          not None
+
+and optionally by a field path, .field[*], .field[index] or .field["key"]:
+the values of the field (all the items of a list or dict field with [*]).
+"A B" selects the B Nodes below an A Node, "A > B" the B Nodes held in a
+field of an A Node. After a path, the values it reaches take the place of
+the Nodes held by the fields, so "Program.body[*] > ExpressionStatement"
+selects the statements of the body themselves. The values a selector ending
+with a path reaches are returned as they are.
+
+Selectors are parsed and checked against the fields of the classes once,
+then compiled into matchers. Trees are walked once per query, with an
+explicit stack; fields of validated Nodes whose declared types can't hold
+a Node matching the rest of the selector are not walked.
+"""
+import re
+import sys
+from functools import lru_cache
+
+from . import node as _node
+from .node import Node, _classes, debug_enabled
+from .field import seq, dict as dict_field
+
+if sys.version >= '3':
+    basestring = str
+
+# number of selectors whose compiled form is kept by select()
+SELECTOR_CACHE_SIZE = 256
+
+# combinators
+_DESCENDANT, _CHILD = 0, 1
+
+# path index matching every item
+_ALL = object()
+
+_missing = object()
+
+
+def _generation():
+    """Returns a value changing when Node classes are created or collected"""
+    return _node.class_generation, len(_classes)
+
+_name = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\*')
+_value = re.compile(r'"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'|(-?\d+)|'
+                    r'(true|false|null)\b')
+_space = re.compile(r'\s*')
+_literals = {'true': True, 'false': False, 'null': None}
+
+
+class _Step(object):
+    """A step of a selector: class, filters and path"""
+
+    def __init__(self, cls, filters, field, index):
+        self.cls = cls
+        # [(field name, '=' or '!=' or None, value)]
+        self.filters = filters
+        self.field = field
+        self.index = index
+        self.match = _matcher(cls, filters)
+        # class -> (filters, matcher) for *, see bound()
+        self._bound = {}
+
+    def bound(self, cls):
+        """Returns the filters and matcher of * for the Nodes of cls, or
+        None, None if none of them can match"""
+        bound = self._bound.get(cls)
+        if bound is None:
+            filters = []
+            for name, op, value in self.filters:
+                if name in cls._fields:
+                    filters.append((name, op, value))
+                elif op != '!=':
+                    bound = None, None
+                    break
+            else:
+                bound = filters, _matcher(cls, filters)
+            self._bound[cls] = bound
+        return bound
+
+
+def _matcher(cls, filters):
+    """Returns the function telling if a value matches cls and filters"""
+    ns = {'_cls': cls or Node, '_missing': _missing}
+    tests = ['isinstance(node, _cls)']
+    for i, (name, op, value) in enumerate(filters):
+        if cls is None:
+            read = 'getattr(node, %r, _missing)' % name
+        else:
+            read = 'node.%s' % name
+        if op is None:
+            tests.append('%s is not None' % read)
+            if cls is None:
+                tests.append('%s is not _missing' % read)
+            continue
+        ns['_value_%d' % i] = value
+        if value is None or value is True or value is False:
+            # not 1 == True
+            tests.append('%s %s _value_%d' % (
+                read, 'is' if op == '=' else 'is not', i))
+        elif isinstance(value, int):
+            # nor True == 1
+            test = '(%s == _value_%d and %s.__class__ is not bool)' % (
+                read, i, read)
+            tests.append(test if op == '=' else 'not ' + test)
+        else:
+            tests.append('%s %s _value_%d' % (
+                read, '==' if op == '=' else '!=', i))
+    source = 'def match(node):\n    return %s\n' % ' and \\\n        '.join(
+        tests)
+    exec(compile(source, '<pyast.query>', 'exec'), ns)
+    match = ns['match']
+    match.__source__ = source
+    return match
+
+
+def _names(classes):
+    """Returns the Node classes by name, None for ambiguous names"""
+    names = {}
+    for cls in classes:
+        name = cls.__name__
+        names[name] = cls if names.get(name, cls) is cls else None
+    return names
+
+
+class _Parser(object):
+    def __init__(self, text, names):
+        self.text = text
+        self.pos = 0
+        self.names = names
+
+    def error(self, message):
+        return ValueError('%s at %d in selector %r' % (message, self.pos,
+                                                        self.text))
+
+    def skip(self):
+        self.pos = _space.match(self.text, self.pos).end()
+
+    def peek(self):
+        return self.text[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self.error('Expected %r' % char)
+        self.pos += 1
+
+    def name(self):
+        found = _name.match(self.text, self.pos)
+        if found is None:
+            raise self.error('Expected a name')
+        self.pos = found.end()
+        return found.group()
+
+    def value(self):
+        found = _value.match(self.text, self.pos)
+        if found is None:
+            raise self.error('Expected a string, an integer, true, false '
+                             'or null')
+        self.pos = found.end()
+        double, single, number, literal = found.groups()
+        if number is not None:
+            return int(number)
+        if literal is not None:
+            return _literals[literal]
+        text = double if double is not None else single
+        return re.sub(r'\\(.)', r'\1', text)
+
+    def field(self, cls, name):
+        if cls is not None and name not in cls._fields:
+            raise self.error('%s has no field %s' % (cls.__name__, name))
+
+    def step(self):
+        name = self.name()
+        if name == '*':
+            cls = None
+        else:
+            cls = self.names.get(name, _missing)
+            if cls is _missing:
+                raise self.error('Unknown Node class %s' % name)
+            if cls is None:
+                raise self.error('Node class name %s is ambiguous' % name)
+        filters = []
+        while self.peek() == '[':
+            self.pos += 1
+            self.skip()
+            field = self.name()
+            self.field(cls, field)
+            self.skip()
+            if self.text.startswith('!=', self.pos):
+                op = '!='
+            elif self.peek() == '=':
+                op = '='
+            else:
+                op = None
+            if op is not None:
+                self.pos += len(op)
+                self.skip()
+                value = self.value()
+                self.skip()
+            else:
+                value = None
+            self.expect(']')
+            filters.append((field, op, value))
+        field = index = None
+        if self.peek() == '.':
+            self.pos += 1
+            field = self.name()
+            self.field(cls, field)
+            if self.peek() == '[':
+                self.pos += 1
+                self.skip()
+                if self.peek() == '*':
+                    self.pos += 1
+                    index = _ALL
+                else:
+                    index = self.value()
+                self.skip()
+                self.expect(']')
+                if cls is not None and not issubclass(
+                        cls._guards[field]['field_cls'], (seq, dict_field)):
+                    raise self.error('%s.%s is not a seq or dict field' % (
+                        cls.__name__, field))
+        return _Step(cls, filters, field, index)
+
+    def parse(self):
+        steps = []
+        combinators = []
+        self.skip()
+        steps.append(self.step())
+        while True:
+            start = self.pos
+            self.skip()
+            if self.pos == len(self.text):
+                break
+            if self.peek() == '>':
+                self.pos += 1
+                self.skip()
+                combinators.append(_CHILD)
+            elif self.pos > start:
+                combinators.append(_DESCENDANT)
+            else:
+                raise self.error('Expected a combinator')
+            steps.append(self.step())
+        return steps, combinators
+
+
+def _checked(cls):
+    """Tells if the fields of the Nodes of cls hold the declared types"""
+    if cls._frozen:
+        return debug_enabled(cls)
+    return cls.__setattr__ is Node.__debug__setattr__ or \
+        cls.__setattr__ is Node.__debug_parents__setattr__
+
+
+def _subclasses(types):
+    found = set()
+    stack = [t for t in types if isinstance(t, type) and
+             issubclass(t, Node)]
+    while stack:
+        cls = stack.pop()
+        if cls not in found:
+            found.add(cls)
+            stack.extend(cls.__subclasses__())
+    return found
+
+
+def _below(cls, name, cache):
+    """Returns the classes of the Nodes which may be found in or below
+    field name of a Node of cls, or None if it can't be told; cache maps
+    (class, field name) to the results"""
+    key = (cls, name)
+    if key in cache:
+        return cache[key]
+    found = set()
+    pending = [key]
+    seen = set(pending)
+    result = found
+    while pending:
+        klass, field = pending.pop()
+        if not _checked(klass):
+            result = None
+            break
+        for sub in _subclasses(klass._guards[field]['types']):
+            found.add(sub)
+            for child in sub._child_fields:
+                if (sub, child) not in seen:
+                    seen.add((sub, child))
+                    pending.append((sub, child))
+    cache[key] = result
+    return result
+
+
+class Selector(object):
+    """A compiled selector, see compile_selector()"""
+
+    def __init__(self, text, classes=None):
+        if classes is None:
+            classes = list(_classes.values())
+        self.text = text
+        self._steps, self._combinators = _Parser(text, _names(classes)).parse()
+        # (class, field name) -> the classes of the Nodes which may be held
+        # in or below the field, or None for any
+        self._reachable = {}
+        # (class, field name, step) -> whether to walk the field
+        self._useful = {}
+        # steps armed -> their plans by class, see _plan()
+        self._plans = {}
+        # (class, steps armed) -> see _fields()
+        self._children = {}
+        self._generation = _generation()
+
+    def __repr__(self):
+        return 'Selector(%r)' % self.text
+
+    def _plan(self, cls, states):
+        """Works out what the steps armed in states do with a Node of cls:
+        (__setattr__ of cls, [(step index, step, matcher)] to test on each
+        Node, whether the Node is selected regardless, the steps armed for
+        its fields regardless, the fields to walk, see _fields())"""
+        tests = []
+        selected = False
+        armed = []
+        if isinstance(cls, type) and issubclass(cls, Node):
+            last = len(self._steps) - 1
+            for i, combinator in states:
+                if combinator == _DESCENDANT:
+                    armed.append((i, _DESCENDANT))
+                step = self._steps[i]
+                if step.cls is None:
+                    filters, match = step.bound(cls)
+                    if match is None:
+                        continue
+                elif issubclass(cls, step.cls):
+                    filters, match = step.filters, step.match
+                else:
+                    continue
+                if filters or step.field is not None:
+                    tests.append((i, step, match))
+                elif i == last:
+                    selected = True
+                else:
+                    armed.append((i + 1, self._combinators[i]))
+            armed = _unique(armed)
+        plan = (getattr(cls, '__setattr__', None), tests, selected, armed,
+                self._fields(cls, armed))
+        self._table(states)[cls] = plan
+        return plan
+
+    def _table(self, states):
+        """Returns the plans by class of the steps armed in states"""
+        table = self._plans.get(states)
+        if table is None:
+            table = self._plans[states] = _Plans(states)
+        return table
+
+    def _fields(self, cls, armed):
+        """Returns the [(field name, plans of the steps armed)] to walk in a
+        Node of cls when the steps in armed are"""
+        key = (cls, armed)
+        fields = self._children.get(key)
+        if fields is None:
+            fields = []
+            if armed:
+                names = cls._child_fields if _checked(cls) else cls._fields
+                for name in reversed(names):
+                    walked = tuple(state for state in armed
+                                   if self._walks(cls, name, state))
+                    if walked:
+                        fields.append((name, self._table(walked)))
+            self._children[key] = fields
+        return fields
+
+    def _walks(self, cls, name, state):
+        """Tells if field name of a Node of cls may hold a match of the
+        step armed by state"""
+        i, combinator = state
+        key = (cls, name, i)
+        useful = self._useful.get(key)
+        if useful is None:
+            target = self._steps[i].cls
+            if target is None or combinator == _CHILD:
+                # a child is matched when visited
+                useful = True
+            else:
+                below = _below(cls, name, self._reachable)
+                useful = below is None or any(issubclass(k, target)
+                                              for k in below)
+            self._useful[key] = useful
+        return useful
+
+    def select(self, root):
+        """Returns the values of the tree rooted at root matching the
+        selector, in depth-first field order"""
+        generation = _generation()
+        if generation != self._generation:
+            # new classes may be held by the declared fields
+            for cache in (self._reachable, self._useful, self._plans,
+                          self._children):
+                cache.clear()
+            self._generation = generation
+        combinators = self._combinators
+        last = len(self._steps) - 1
+        results = []
+        found = set()
+        # (value, plans of the steps armed for it)
+        stack = [(root, self._table(((0, _DESCENDANT),)))]
+        pop = stack.pop
+        push = stack.append
+        extend = stack.extend
+        while stack:
+            node, plans = pop()
+            cls = node.__class__
+            plan = plans.get(cls)
+            if plan is None or plan[0] is not cls.__setattr__:
+                plan = self._plan(cls, plans.states)
+            setattr, tests, selected, armed, fields = plan
+            paths = None
+            if tests:
+                extra = []
+                for i, step, match in tests:
+                    if not match(node):
+                        continue
+                    if i == last:
+                        if step.field is None:
+                            selected = True
+                        else:
+                            results.extend(_reach(node, step.field,
+                                                  step.index))
+                    elif step.field is None:
+                        extra.append((i + 1, combinators[i]))
+                    else:
+                        if paths is None:
+                            paths = {}
+                        paths.setdefault(step.field, []).append(
+                            (step.index, (i + 1, combinators[i])))
+                if extra:
+                    armed = _unique(armed + tuple(extra))
+                    fields = self._fields(cls, armed)
+            if selected and id(node) not in found:
+                found.add(id(node))
+                results.append(node)
+            if paths is not None:
+                self._follow(node, armed, paths, stack)
+                continue
+            for name, walked in fields:
+                value = getattr(node, name)
+                if isinstance(value, Node):
+                    push((value, walked))
+                elif isinstance(value, (list, tuple)):
+                    extend([(item, walked) for item in reversed(value)])
+                elif isinstance(value, dict):
+                    extend([(item, walked)
+                            for item in reversed(list(value.values()))])
+        return results
+
+    def _follow(self, node, armed, paths, stack):
+        """Pushes the values held by the fields of node, arming the steps
+        following the paths which reach them"""
+        cls = node.__class__
+        names = cls._child_fields if _checked(cls) else cls._fields
+        pushed = []
+        for name in names:
+            extra = paths.get(name)
+            if extra is None:
+                walked = tuple(state for state in armed
+                               if self._walks(cls, name, state))
+                if not walked:
+                    continue
+                walked = self._table(walked)
+                for key, item in _items(getattr(node, name)):
+                    pushed.append((item, walked))
+            else:
+                for key, item in _items(getattr(node, name)):
+                    states = list(armed)
+                    for index, state in extra:
+                        if index is _ALL or index is None or index == key:
+                            states.append(state)
+                    if states:
+                        pushed.append((item, self._table(_unique(states))))
+        pushed.reverse()
+        stack.extend(pushed)
+
+
+class _Plans(dict):
+    """Plans by class of the steps armed in states"""
+
+    def __init__(self, states):
+        dict.__init__(self)
+        self.states = states
+
+
+def _unique(states):
+    """Returns states as a tuple, without repeats"""
+    unique = []
+    for state in states:
+        if state not in unique:
+            unique.append(state)
+    return tuple(unique)
+
+
+def _items(value):
+    """Yields the (index or key, Node) pairs held by a field value"""
+    if isinstance(value, Node):
+        yield None, value
+    elif isinstance(value, (list, tuple)):
+        for i, item in enumerate(value):
+            if isinstance(item, Node):
+                yield i, item
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, Node):
+                yield key, item
+
+
+def _reach(node, field, index):
+    """Returns the values of a path ending a selector"""
+    value = getattr(node, field)
+    if index is None:
+        return [value]
+    if index is _ALL:
+        if isinstance(value, dict):
+            return list(value.values())
+        return list(value)
+    try:
+        return [value[index]]
+    except (IndexError, KeyError, TypeError):
+        return []
+
+
+def compile_selector(text, classes=None):
+    """Parses and compiles a selector
+
+    Class names are looked up among classes, an iterable of Node classes,
+    or among all the Node classes defined so far; names shared by several
+    classes can't be used. Raises ValueError for invalid selectors.
+    """
+    return Selector(text, classes)
+
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def _cached(text, generation):
+    # keyed by the generation of the classes too, as the selectors bind the
+    # classes found by name when compiled
+    return Selector(text)
+
+
+def select(root, text, classes=None):
+    """Returns the values of the tree rooted at root matching the selector
+    text, compiled once"""
+    if classes is None:
+        return _cached(text, _generation()).select(root)
+    return Selector(text, classes).select(root)
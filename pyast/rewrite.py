@@ -0,0 +1,321 @@
+"""Batched rewriting of Node trees with pattern rules
+
+A Rewriter holds rules declared against a Node class and patterns on its
+fields:
+
+    rules = Rewriter()
+
+    @rules.rule(AssignmentExpression, right=Literal)
+    def fold(node):
+        ...
+
+    @rules.rule(Identifier, name='x')
+    def rename(node):
+        return {'name': 'y'}
+
+A pattern value which is a class or a tuple of classes matches the field
+values which are instances of it, any other value the field values equal to
+it. A rule applies to the Nodes of its class and of its subclasses matching
+its patterns; it returns None to leave the Node as it is, a Node to replace
+it with, or a dict of field values to assign to it. The rules of a class
+are tried in the order they were added.
+
+rewrite(tree) applies all the rules in a single depth-first walk: the
+children of a Node are rewritten before it and a Node is rewritten again
+until no rule changes it, so rules looking at a Node and its fields reach a
+fixpoint in one traversal. Replacements and new field values are rewritten
+as well.
+
+Fields of validated Nodes whose declared types can't hold a Node of a rule
+class are not walked. The children replaced below a Node, or the values a
+rule returns, are written together: each field is validated once and the
+write is observed once per Node (see pyast.mutation), instead of once per
+assignment. FrozenNodes are built again with the new values.
+"""
+from . import mutation
+from .node import Node, _classes
+from .query import _below, _checked
+from .typedlist import TypedList
+from .typeddict import TypedDict
+from .visit import _kinds, _kind, _NODE, _DICT
+
+# number of times a Node in a tree may be rewritten by a single rewrite()
+# call before the rules are deemed not to reach a fixpoint
+REWRITE_LIMIT = 1000
+
+
+class _Rule(object):
+    def __init__(self, cls, action, pattern):
+        if not isinstance(cls, type) or not issubclass(cls, Node):
+            raise TypeError('Rules apply to Node classes, not %r' % (cls,))
+        for name in pattern:
+            if name not in cls._fields:
+                raise ValueError('%s has no field %s' % (cls.__name__, name))
+        self.cls = cls
+        self.action = action
+        self.pattern = pattern
+        self.match = _matcher(cls, pattern)
+
+
+def _matcher(cls, pattern):
+    """Returns the function telling if a Node of cls matches pattern"""
+    ns = {}
+    tests = ['True']
+    for i, (name, value) in enumerate(sorted(pattern.items())):
+        ns['_value_%d' % i] = value
+        read = 'node.%s' % name
+        if isinstance(value, type) or (
+                isinstance(value, tuple) and value and
+                all(isinstance(t, type) for t in value)):
+            tests.append('isinstance(%s, _value_%d)' % (read, i))
+        elif value is None or value is True or value is False:
+            tests.append('%s is _value_%d' % (read, i))
+        elif isinstance(value, int):
+            # not True == 1
+            tests.append('%s == _value_%d and %s.__class__ is not bool' % (
+                read, i, read))
+        else:
+            tests.append('%s == _value_%d' % (read, i))
+    source = 'def match(node):\n    return %s\n' % ' and \\\n        '.join(
+        tests)
+    exec(compile(source, '<pyast.rewrite>', 'exec'), ns)
+    match = ns['match']
+    match.__source__ = source
+    return match
+
+
+class Rewriter(object):
+    """Rules applied together to trees by rewrite()
+
+    limit bounds the number of times a Node in a tree is rewritten, see
+    REWRITE_LIMIT.
+    """
+
+    def __init__(self, limit=REWRITE_LIMIT):
+        self.limit = limit
+        self._rules = []
+        self._reset()
+
+    def _reset(self):
+        # the classes of the rules
+        self._targets = tuple(set(rule.cls for rule in self._rules))
+        # (class, field name) -> the classes of the Nodes which may be held
+        # in or below the field, or None for any
+        self._reachable = {}
+        # class -> (__setattr__, fields to walk, rules)
+        self._layouts = {}
+        self._generation = len(_classes)
+
+    def add(self, cls, action, **pattern):
+        """Adds a rule calling action(node) on the Nodes of cls whose fields
+        match pattern"""
+        self._rules.append(_Rule(cls, action, pattern))
+        self._reset()
+
+    def rule(self, cls, **pattern):
+        """Decorator adding the function as a rule, see add()"""
+        def decorator(action):
+            self.add(cls, action, **pattern)
+            return action
+        return decorator
+
+    def _layout(self, cls):
+        targets = self._targets
+        fields = []
+        if targets:
+            names = cls._child_fields if _checked(cls) else cls._fields
+            for name in names:
+                below = _below(cls, name, self._reachable)
+                if below is None or any(issubclass(k, targets)
+                                        for k in below):
+                    fields.append(name)
+        rules = [rule for rule in self._rules if issubclass(cls, rule.cls)]
+        layout = self._layouts[cls] = (cls.__setattr__, fields, rules)
+        return layout
+
+    def rewrite(self, root):
+        """Applies the rules to the tree rooted at root until none of them
+        changes it, and returns its root: root itself unless a rule replaced
+        it
+
+        Raises RuntimeError if a Node is rewritten more than limit times.
+        """
+        if len(_classes) != self._generation:
+            # new classes may be held by the declared fields
+            self._reset()
+        if not self._rules:
+            return root
+        layouts = self._layouts
+        kinds = _kinds
+        limit = self.limit
+        # id -> the Nodes the rules no longer change, kept alive so that
+        # their ids are not reused
+        done = {}
+        # a Node whose children are rewritten: [Node, {(field name, index
+        # or key or None): new child} or None, number of times it was
+        # rewritten, parent entry, field name, index or key or None]
+        top = [None, None, 0, None, None, None]
+        # Nodes to rewrite, (Node, parent entry, field name, index or key
+        # or None, number of times it was rewritten), and entries whose
+        # children were rewritten
+        stack = [(root, top, None, None, 0)]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            task = pop()
+            if task.__class__ is list:
+                node, changes, count, parent, name, key = task
+                if changes:
+                    new = _assign(node, changes)
+                    if new is not node:
+                        node = new
+                        slots = parent[1]
+                        if slots is None:
+                            slots = parent[1] = {}
+                        slots[(name, key)] = node
+                rules = layouts[node.__class__][2]
+            else:
+                node, parent, name, key, count = task
+                if id(node) in done:
+                    continue
+                cls = node.__class__
+                layout = layouts.get(cls)
+                if layout is None or layout[0] is not cls.__setattr__:
+                    layout = self._layout(cls)
+                fields = layout[1]
+                rules = layout[2]
+                if fields:
+                    entry = [node, None, count, parent, name, key]
+                    push(entry)
+                    tasks = []
+                    for field in fields:
+                        value = getattr(node, field)
+                        kind = kinds.get(value.__class__)
+                        if kind is None:
+                            kind = _kind(value.__class__)
+                        if kind == _NODE:
+                            tasks.append((value, entry, field, None, 0))
+                        elif kind:
+                            items = value.items() if kind == _DICT else \
+                                enumerate(value)
+                            for index, item in items:
+                                kind = kinds.get(item.__class__)
+                                if kind is None:
+                                    kind = _kind(item.__class__)
+                                if kind == _NODE:
+                                    tasks.append((item, entry, field, index,
+                                                  0))
+                    tasks.reverse()
+                    stack.extend(tasks)
+                    continue
+                if not rules:
+                    continue
+            result = None
+            for rule in rules:
+                if rule.match(node):
+                    result = _apply(node, rule)
+                    if result is not None:
+                        break
+            if result is None:
+                if task.__class__ is list:
+                    # its subtree isn't walked again
+                    done[id(node)] = node
+                continue
+            count += 1
+            if count > limit:
+                raise RuntimeError('Rewrite rules did not reach a fixpoint '
+                                   'after %d rewrites of %s' % (
+                                       limit, node.__class__.__name__))
+            new = _assign(node, result) if isinstance(result, dict) else \
+                result
+            if new is not node:
+                slots = parent[1]
+                if slots is None:
+                    slots = parent[1] = {}
+                slots[(name, key)] = new
+            push((new, parent, name, key, count))
+        if top[1]:
+            return top[1][(None, None)]
+        return root
+
+
+def _apply(node, rule):
+    """Returns what rule, matching node, replaces it with: a Node,
+    {(field name, None): value}, or None if it leaves it as it is"""
+    result = rule.action(node)
+    if result is None or result is node:
+        return None
+    if isinstance(result, Node):
+        return result
+    if not isinstance(result, dict):
+        raise TypeError('Rule %s returned %r, expected None, a Node or a '
+                        'dict' % (rule.action.__name__, result))
+    changes = {}
+    for name, value in result.items():
+        if name not in node._fields:
+            raise ValueError('%s has no field %s' % (node.__class__.__name__,
+                                                     name))
+        if getattr(node, name) is not value:
+            changes[(name, None)] = value
+    return changes or None
+
+
+def _assign(node, changes):
+    """Writes changes, {(field name, index or key or None): value}, to the
+    fields of node at once and returns node, or the FrozenNode built in its
+    place"""
+    cls = node.__class__
+    fields = {}
+    items = {}
+    for (name, key), value in changes.items():
+        if key is None:
+            fields[name] = value
+        else:
+            items.setdefault(name, {})[key] = value
+    if cls._frozen:
+        values = dict((name, getattr(node, name)) for name in cls._fields)
+        for name, slots in items.items():
+            value = values[name]
+            value = dict(value) if isinstance(value, dict) else list(value)
+            for key, item in slots.items():
+                value[key] = item
+            values[name] = value
+        values.update(fields)
+        return cls(**values)
+    if cls._parents:
+        # the Nodes record where they are held
+        for name, value in fields.items():
+            setattr(node, name, value)
+        for name, slots in items.items():
+            container = getattr(node, name)
+            for key, item in slots.items():
+                container[key] = item
+        return node
+    checked = _checked(cls)
+    for name, value in fields.items():
+        if checked:
+            validate = cls._validators.get(name)
+            if validate is not None:
+                value = validate(value)
+        object.__setattr__(node, name, value)
+    for name, slots in items.items():
+        container = getattr(node, name)
+        if isinstance(container, (TypedList, TypedDict)):
+            values = list(slots.values())
+            if container._checker.first_invalid(values) != -1:
+                raise TypeError('%s.%s accepts only elements: %s' % (
+                    cls.__name__, name,
+                    ', '.join([str(t) for t in container._types])))
+        write = dict.__setitem__ if isinstance(container, dict) else \
+            list.__setitem__
+        for key, item in slots.items():
+            write(container, key, item)
+        if getattr(container, '_holders', None) is not None:
+            mutation.invalidate(container)
+        if mutation.observers:
+            mutation.notify(container)
+    if getattr(node, '_hash', None) is not None:
+        mutation.invalidate(node)
+    if mutation.observers:
+        mutation.notify(node)
+    return node
@@ -0,0 +1,561 @@
+"""Compiled rendering of Node templates
+
+repr() of a Node renders its _template, a %-format string whose mapping keys
+name fields of the Node:
+
+    _template = '%(left)s + %(right)s'
+
+The template is formatted with the field values: ints and strings as they
+are, lists with the _template_<field>() method of the Node when it has one
+and other values (Nodes, None, dicts) by their repr().
+
+Each template is compiled once per class into its literal text and the
+fields it references, so fields the template doesn't use are never read.
+Trees are rendered with an explicit stack: the Nodes found in fields, lists
+and dicts are expanded in place and all the text goes to a single output
+instead of one string per Node. Nodes of classes with their own __repr__
+are rendered by calling it.
+
+Templates that can't be compiled (positional or '*' conversions, keys that
+are not fields) are formatted with a dict of all the field values as before.
+"""
+import re
+import sys
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+
+from . import mutation
+from .node import Node, _compile, _observe
+from .typedlist import TypedList, FrozenList
+from .typeddict import TypedDict, FrozenDict
+
+if sys.version >= '3':
+    basestring = str
+
+# number of (class, template) pairs whose compiled form is kept
+TEMPLATE_CACHE_SIZE = 1024
+
+# number of pieces joined into each chunk yielded by iterrender()
+CHUNK_SIZE = 4096
+
+_conversion = re.compile(
+    r'%(?:\((?P<key>[^()]*)\))?'
+    r'(?P<spec>[#0\- +]*\d*(?:\.\d+)?[hlL]?[diouxXeEfFgGcrsa%])')
+
+
+def _parse(cls, template):
+    """Returns the parts of template for Nodes of cls, or None
+
+    The parts are (literal, field, format) tuples: the text preceding a
+    reference to field, and the %-format of the field or None for plain
+    '%(field)s'. The last part has no field.
+    """
+    parts = []
+    literal = []
+    pos = 0
+    while True:
+        index = template.find('%', pos)
+        if index == -1:
+            literal.append(template[pos:])
+            break
+        literal.append(template[pos:index])
+        match = _conversion.match(template, index)
+        if match is None:
+            return None
+        key, spec = match.group('key', 'spec')
+        pos = match.end()
+        if spec == '%' and key is None:
+            literal.append('%')
+            continue
+        if key is None or spec == '%' or key not in cls._fields:
+            return None
+        parts.append((''.join(literal), key, None if spec == 's' else
+                      '%' + spec))
+        literal = []
+    parts.append((''.join(literal), None, None))
+    return parts
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(cls, template):
+    """Returns the function rendering template for Nodes of cls
+
+    The function takes a Node and returns its rendering as a string, or the
+    strings, Nodes and lists of them making it up, last first.
+    """
+    parts = _parse(cls, template)
+    if parts is None:
+        return lambda node: template % _fields(node)
+    if len(parts) == 1:
+        text = parts[0][0]
+        return lambda node: text
+    ns = {
+        '_value': _value,
+        '_nodes': _nodes,
+        '_format': ''.join(literal.replace('%', '%%') + ('%s' if name else '')
+                           for literal, name, fmt in parts),
+    }
+    body = []
+    names = []
+    pieces = []
+    for i, (literal, name, fmt) in enumerate(parts):
+        if literal:
+            ns['_literal_%d' % i] = literal
+            pieces.append('_literal_%d' % i)
+        if name is None:
+            continue
+        value = '_v%d' % i
+        names.append(value)
+        pieces.append(value)
+        body.append('%s = node.%s' % (value, name))
+        if fmt is None:
+            body.append('_c = %s.__class__' % value)
+            body.append('if _c is not str and _c not in _nodes: '
+                        '%s = _value(node, %r, %s, None)' % (value, name,
+                                                             value))
+        else:
+            body.append('%s = _value(node, %r, %s, %r)' % (value, name, value,
+                                                           fmt))
+    body.append('if %s:' % ' and '.join('%s.__class__ is str' % value
+                                        for value in names))
+    if ns['_format'] == '%s':
+        body.append('    return %s' % names[0])
+    else:
+        body.append('    return _format %% (%s, )' % ', '.join(names))
+    body.append('return [%s]' % ', '.join(reversed(pieces)))
+    return _compile(cls, '_render', ['node'], body, ns)
+
+
+def _fields(node):
+    """Returns the dict of all the field values of node formatting templates
+    that can't be compiled"""
+    fields = {}
+    for leaf in node._fields:
+        field = getattr(node, leaf)
+        if isinstance(field, (int, basestring)):
+            fields[leaf] = field
+        elif isinstance(field, list):
+            if hasattr(node, '_template_%s' % leaf):
+                template = getattr(node, '_template_%s' % leaf)
+            else:
+                template = None
+            fields[leaf] = field.__repr__(template)
+        else:
+            fields[leaf] = field.__repr__()
+    return fields
+
+
+# Node classes rendered by their template, without their own __repr__
+_nodes = set()
+
+
+def _str(value):
+    if value.__class__ is str:
+        return value
+    return '%s' % (value,)
+
+
+def _repr(value):
+    """Returns value itself if it is a Node rendered by its template, or its
+    repr()"""
+    cls = value.__class__
+    if cls in _nodes:
+        return value
+    if cls.__repr__ is Node.__repr__ and isinstance(value, Node):
+        _nodes.add(cls)
+        return value
+    return repr(value)
+
+
+def _items(value):
+    """Returns the pieces of the repr() of a list, FrozenList or dict"""
+    pieces = []
+    append = pieces.append
+    if isinstance(value, dict):
+        append('{')
+        for key, item in value.items():
+            if len(pieces) > 1:
+                append(', ')
+            append(repr(key))
+            append(': ')
+            append(_repr(item))
+        append('}')
+    else:
+        append('[')
+        for item in value:
+            if len(pieces) > 1:
+                append(', ')
+            append(_repr(item))
+        append(']')
+    return pieces
+
+
+def _value(node, name, value, fmt):
+    """Returns the rendering of field name of node holding value
+
+    It is a string, a Node rendered by its template or a list of them.
+    """
+    if isinstance(value, (int, basestring)):
+        return (fmt or '%s') % (value,)
+    cls = value.__class__
+    method = cls.__repr__
+    if isinstance(value, list):
+        template = getattr(node, '_template_%s' % name, None)
+        if method is TypedList.__repr__ or method is list.__repr__:
+            if template is None:
+                piece = _items(value)
+            else:
+                piece = _str(template())
+        else:
+            piece = _str(value.__repr__(template))
+    elif method is Node.__repr__ and isinstance(value, Node):
+        _nodes.add(cls)
+        piece = value
+    elif method is FrozenList.__repr__ or method is dict.__repr__:
+        piece = _items(value)
+    else:
+        piece = _str(value.__repr__())
+    if fmt is not None and piece.__class__ is not str:
+        # formatted as a whole
+        piece = fmt % (''.join(_chunks([piece])),)
+    return piece
+
+
+def _chunks(stack, done=None):
+    """Yields the rendering of the strings, Nodes and lists of them on the
+    stack, last first
+
+    done maps the ids of Nodes already rendered to their text, written as
+    is, see pyast.parallel.
+    """
+    out = []
+    append = out.append
+    pop = stack.pop
+    extend = stack.extend
+    renderers = _renderers
+    while stack:
+        item = pop()
+        cls = item.__class__
+        if cls is str:
+            append(item)
+            continue
+        if cls is list:
+            item.reverse()
+            extend(item)
+            continue
+        if done is not None:
+            text = done.get(id(item))
+            if text is not None:
+                append(text)
+                continue
+        try:
+            template = item._template
+        except AttributeError:
+            append('<Node:%s (%s)>' % (cls.__name__, ', '.join(item._fields)))
+            continue
+        entry = renderers.get(cls)
+        if entry is None or entry[0] is not template:
+            entry = _renderer(cls, template)
+        result = entry[1](item)
+        if result.__class__ is str:
+            append(result)
+        else:
+            extend(result)
+        if len(out) >= CHUNK_SIZE:
+            yield ''.join(out)
+            del out[:]
+    if out:
+        yield ''.join(out)
+
+
+# the template last rendered for each class and its render function
+_renderers = {}
+
+
+def _renderer(cls, template):
+    """Returns the (template, render function) of Nodes of cls"""
+    if template.__class__ is str:
+        entry = (template, compile_template(cls, template))
+    else:
+        entry = (template, lambda node: node._template % _fields(node))
+    _renderers[cls] = entry
+    return entry
+
+
+def iterrender(node):
+    """Yields repr(node) in chunks"""
+    return _chunks([_repr(node)])
+
+
+def render(node, fp=None):
+    """Renders node as repr(node) does
+
+    Returns the text, or writes it to the text file object fp in chunks.
+    """
+    if fp is None:
+        return ''.join(iterrender(node))
+    write = fp.write
+    for chunk in iterrender(node):
+        write(chunk)
+
+
+# number of Nodes whose text a RenderCache keeps by default
+RENDER_CACHE_SIZE = 2 ** 20
+
+# closes the Node being rendered on the stack of RenderCache.render()
+_end = object()
+
+_SCALAR, _NODE, _CONTAINER, _FROZEN, _VOLATILE = range(5)
+
+# what RenderCache sees in field values, by concrete type
+_kinds = {}
+
+
+def _kind(t):
+    if issubclass(t, (int, float, complex, bytes, basestring, type(None))):
+        kind = _SCALAR
+    elif issubclass(t, Node):
+        if t.__repr__ is Node.__repr__ and _observe(t):
+            kind = _NODE
+        else:
+            kind = _VOLATILE
+    elif issubclass(t, (TypedList, TypedDict)):
+        kind = _CONTAINER
+    elif issubclass(t, (FrozenList, FrozenDict)):
+        kind = _FROZEN
+    else:
+        kind = _VOLATILE
+    _kinds[t] = kind
+    return kind
+
+
+def _templates(cls):
+    """Returns the _template and _template_<field> attributes of cls"""
+    return (getattr(cls, '_template', None),) + tuple(
+        getattr(cls, '_template_%s' % name, None) for name in cls._fields)
+
+
+def _links(node):
+    """Returns the ids of the Nodes, TypedLists and TypedDicts held by node,
+    or None if writes to them or to node may not be observed"""
+    kinds = _kinds
+    cls = node.__class__
+    kind = kinds.get(cls)
+    if kind is None:
+        kind = _kind(cls)
+    if kind != _NODE:
+        return None
+    if cls.__setattr__ is Node.__debug__setattr__ or \
+       cls.__setattr__ is Node.__debug_parents__setattr__:
+        # the other fields were validated
+        fields = cls._child_fields
+    else:
+        fields = cls._fields
+    ids = []
+    append = ids.append
+    for name in fields:
+        value = getattr(node, name)
+        kind = kinds.get(value.__class__)
+        if kind is None:
+            kind = _kind(value.__class__)
+        if kind == _SCALAR:
+            continue
+        if kind == _NODE:
+            append(id(value))
+            continue
+        if kind == _VOLATILE:
+            return None
+        if kind == _CONTAINER:
+            append(id(value))
+        for item in value.values() if isinstance(value, dict) else value:
+            kind = kinds.get(item.__class__)
+            if kind is None:
+                kind = _kind(item.__class__)
+            if kind == _NODE:
+                append(id(item))
+            elif kind != _SCALAR:
+                return None
+    return ids
+
+
+class RenderCache(object):
+    """Renders trees like render(), reusing the text of unchanged subtrees
+
+    The text of every Node rendered from more than its own fields is kept
+    until the Node, one of its TypedLists or TypedDicts, or any Node below
+    it is written to: writes evict the cached text of the Node written to
+    and of all the cached Nodes above it, so a tree re-rendered after a few
+    writes only renders again the Nodes on the paths to them.
+
+    At most maxsize Nodes are kept; beyond that the least recently used
+    ones are evicted, together with the Nodes above them, so maxsize should
+    exceed the number of Nodes holding other Nodes in the trees rendered.
+    evict() and clear() drop cached text explicitly.
+
+    Subtrees holding values other than scalars, Nodes, TypedLists and
+    TypedDicts, or Nodes with their own __repr__ or __setattr__ (whose
+    writes are not observed) are rendered every time, as are trees
+    rendered inside deferred() blocks.
+
+    The text is kept for the _template and _template_<field> attributes the
+    classes had when it was rendered: all of it is dropped by the next
+    render() once one of them is set on a class rendered.
+    """
+
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        # id(node) -> [node, text, ids of the objects it holds]
+        self._entries = OrderedDict()
+        # id(Node, TypedList or TypedDict) -> id of the cached Node holding
+        # it, or a set of them
+        self._parents = {}
+        # class of the Nodes rendered -> its templates, see _templates()
+        self._templates = {}
+        self._ref = weakref.ref(self, mutation.forget)
+        mutation.observers.append(self._ref)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, node):
+        return id(node) in self._entries
+
+    def close(self):
+        """Empties the cache and stops observing writes"""
+        self.clear()
+        mutation.forget(self._ref)
+
+    def clear(self):
+        """Drops all the cached text"""
+        self._entries.clear()
+        self._parents.clear()
+        self._templates.clear()
+
+    def evict(self, node):
+        """Drops the cached text of node and of the Nodes holding it"""
+        self._evict(id(node))
+
+    def touched(self, obj):
+        """Called with every Node, TypedList or TypedDict written to"""
+        key = id(obj)
+        if key in self._parents or key in self._entries:
+            self._evict(key)
+
+    def _evict(self, key):
+        entries = self._entries
+        parents = self._parents
+        stack = [key]
+        while stack:
+            key = stack.pop()
+            entry = entries.pop(key, None)
+            if entry is not None:
+                for child in entry[2]:
+                    holders = parents.get(child)
+                    if holders is None:
+                        continue
+                    if holders.__class__ is set:
+                        holders.discard(key)
+                        if not holders:
+                            del parents[child]
+                    elif holders == key:
+                        del parents[child]
+            holders = parents.get(key)
+            if holders is not None:
+                if holders.__class__ is set:
+                    stack.extend(holders)
+                else:
+                    stack.append(holders)
+
+    def _store(self, node, text, ids):
+        key = id(node)
+        self._entries[key] = [node, text, ids]
+        parents = self._parents
+        if parents.keys().isdisjoint(ids):
+            parents.update(dict.fromkeys(ids, key))
+        else:
+            for child in ids:
+                holders = parents.get(child)
+                if holders is None:
+                    parents[child] = key
+                elif holders.__class__ is set:
+                    holders.add(key)
+                elif holders != key:
+                    parents[child] = set((holders, key))
+        if len(self._entries) > self.maxsize:
+            self._evict(next(iter(self._entries)))
+
+    def render(self, node, fp=None):
+        """Renders node as repr(node) does
+
+        Returns the text, or writes it to the text file object fp.
+        """
+        entries = self._entries
+        renderers = _renderers
+        templates = self._templates
+        for cls, rendered in list(templates.items()):
+            if _templates(cls) != rendered:
+                self.clear()
+                break
+        out = []
+        append = out.append
+        stack = [_repr(node)]
+        pop = stack.pop
+        push = stack.append
+        extend = stack.extend
+        # (Node, index of its text in out, ids) of the Nodes being rendered
+        path = []
+        # the text of path[:volatile] can't be cached
+        volatile = 0
+        cache = not mutation.deferred
+        while stack:
+            item = pop()
+            cls = item.__class__
+            if cls is str:
+                append(item)
+                continue
+            if cls is list:
+                item.reverse()
+                extend(item)
+                continue
+            if item is _end:
+                owner, start, ids = path.pop()
+                if len(path) < volatile:
+                    volatile = len(path)
+                    continue
+                text = ''.join(out[start:])
+                out[start:] = [text]
+                self._store(owner, text, ids)
+                continue
+            key = id(item)
+            entry = entries.get(key)
+            if entry is not None:
+                entries.move_to_end(key)
+                append(entry[1])
+                continue
+            try:
+                template = item._template
+            except AttributeError:
+                append('<Node:%s (%s)>' % (cls.__name__,
+                                           ', '.join(item._fields)))
+                continue
+            if cls not in templates:
+                templates[cls] = _templates(cls)
+            entry = renderers.get(cls)
+            if entry is None or entry[0] is not template:
+                entry = _renderer(cls, template)
+            result = entry[1](item)
+            ids = _links(item) if cache else None
+            if ids is None and volatile < len(path):
+                volatile = len(path)
+            if result.__class__ is str:
+                append(result)
+            else:
+                if ids is not None:
+                    path.append((item, len(out), ids))
+                    push(_end)
+                extend(result)
+        text = ''.join(out)
+        if fp is None:
+            return text
+        fp.write(text)
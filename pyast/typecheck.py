@@ -0,0 +1,194 @@
+import sys
+import re
+from functools import lru_cache
+
+# Temporary solution for string/unicode in py2 vs py3
+if sys.version >= '3':
+    basestring = str
+
+# re._pattern_type is gone since Python 3.7
+_pattern_type = type(re.compile(''))
+
+# number of pattern matches remembered by each pattern guard
+PATTERN_CACHE_SIZE = 1024
+
+
+def pattern_matcher(patterns):
+    """Returns a function telling if a string matches any of the patterns
+
+    The patterns are combined into a single alternation when they can be
+    (same flags, no numbered backreferences); the results are memoized in
+    an LRU cache.
+    """
+    match = None
+    if len(set(p.flags for p in patterns)) == 1 and \
+       not any(re.search(r'\\[0-9]', p.pattern) for p in patterns):
+        try:
+            combined = re.compile('|'.join('(?:%s)' % p.pattern
+                                           for p in patterns),
+                                  patterns[0].flags)
+        except re.error:
+            pass
+        else:
+            match = lambda val: combined.match(val) is not None
+    if match is None:
+        match = lambda val: any(p.match(val) for p in patterns)
+    return lru_cache(maxsize=PATTERN_CACHE_SIZE)(match)
+
+
+def normalize(types):
+    """Returns the types of a TypedList/TypedDict guard as a tuple"""
+    if isinstance(types, (basestring, type, _pattern_type)) or \
+       not hasattr(types, '__iter__'):
+        return (types,)
+    return tuple(types)
+
+
+class Checker(object):
+    """Validates elements of TypedList and TypedDict
+
+    A Checker is shared by all containers with the same types. It keeps a
+    cache from the concrete type of an element to the way elements of that
+    type are checked:
+
+        True - every element of that type is accepted (class guards)
+        False - every element of that type is rejected
+        callable - the value has to be checked (string/int values, patterns)
+
+    so bulk operations cost one dict lookup per element.
+    """
+
+    def __init__(self, types):
+        self.types = types
+        kinds = set(self._kind(type(t)) for t in types)
+        self.kind = kinds.pop() if len(kinds) == 1 else 'mixed'
+        self.classes = tuple(t for t in types if isinstance(t, type))
+        self.dispatch = {}
+        self._members = None
+        self._matches = None
+
+    @staticmethod
+    def _kind(t):
+        if issubclass(t, (basestring, int)):
+            return 'value'
+        elif t is _pattern_type:
+            return 'pattern'
+        return 'class'
+
+    def _member(self, item):
+        try:
+            return item in self._members
+        except TypeError:
+            return item in self.types
+
+    def _match(self, item):
+        try:
+            return self._matches(item)
+        except TypeError:
+            return False
+
+    def _mixed(self, item):
+        return self._member(item) or \
+            self._matches is not None and self._match(item)
+
+    def strategy(self, t):
+        """Computes (and caches) how elements of type t are checked"""
+        kind = self.kind
+        if self._members is None:
+            self._members = frozenset(
+                i for i in self.types
+                if getattr(i, '__hash__', None) is not None)
+        patterns = tuple(i for i in self.types
+                         if isinstance(i, _pattern_type))
+        if patterns and self._matches is None:
+            self._matches = pattern_matcher(patterns)
+        if kind == 'mixed':
+            # instances of the classes are accepted outright, other strings
+            # and numbers have to be one of the values or match a pattern
+            if self.classes and issubclass(t, self.classes):
+                strategy = True
+            elif issubclass(t, (basestring, int)):
+                strategy = self._mixed
+            else:
+                strategy = False
+        elif kind == 'value':
+            strategy = self._member
+        elif kind == 'pattern':
+            strategy = self._match if patterns else False
+        else:
+            strategy = issubclass(t, self.classes)
+        self.dispatch[t] = strategy
+        return strategy
+
+    def valid(self, item):
+        strategy = self.dispatch.get(type(item))
+        if strategy is None:
+            strategy = self.strategy(type(item))
+        if strategy is True:
+            return True
+        if strategy is False:
+            return False
+        return strategy(item)
+
+    def first_invalid(self, items):
+        """Returns the index of the first rejected element or -1
+
+        The concrete types of all elements are collected first, so when each
+        of them is accepted outright no per-element Python code runs.
+        """
+        dispatch = self.dispatch
+        strategies = {}
+        kinds = set(map(type, items))
+        for t in kinds:
+            strategy = dispatch.get(t)
+            if strategy is None:
+                strategy = self.strategy(t)
+            if strategy is not True:
+                strategies[t] = strategy
+        if not strategies:
+            return -1
+        if all(s == self._member for s in strategies.values()):
+            # hashable values are checked with a single set operation
+            if len(strategies) != len(kinds):
+                values = [i for i in items if type(i) in strategies]
+            else:
+                values = items
+            try:
+                if self._members.issuperset(values):
+                    return -1
+            except TypeError:
+                pass
+        for i, item in enumerate(items):
+            strategy = strategies.get(type(item), True)
+            if strategy is True:
+                continue
+            if strategy is False or not strategy(item):
+                return i
+        return -1
+
+
+class Unchecked(object):
+    """Checker accepting everything, used while validation is deferred"""
+    kind = None
+
+    def valid(self, item):
+        return True
+
+    def first_invalid(self, items):
+        return -1
+
+UNCHECKED = Unchecked()
+
+
+_checkers = {}
+
+
+def checker(types):
+    """Returns the shared Checker for a tuple of types"""
+    try:
+        return _checkers[types]
+    except KeyError:
+        c = _checkers[types] = Checker(types)
+        return c
+    except TypeError:
+        return Checker(types)
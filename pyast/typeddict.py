@@ -1,9 +1,7 @@
-import sys
-import re
-
-# Temporary solution for string/unicode in py2 vs py3
-if sys.version >= '3':
-    basestring = str
+from contextlib import contextmanager
+from copy import deepcopy
+from .typecheck import checker, normalize, UNCHECKED
+from . import mutation
 
 
 class TypedDict(dict):
@@ -27,73 +25,187 @@ class TypedDict(dict):
     """
     _type = 'class'  # class | str | pattern
 
+    # weak reference to the Node whose cached hash covers the dict, or a dict
+    # of them by id, see pyast.mutation
+    _holders = None
+
     def __init__(self, types, init=None, null=False):
         super(TypedDict, self).__init__()
-        if isinstance(types, basestring) or not hasattr(types, '__iter__'):
-            self._types = (types,)
-        else:
-            self._types = types
-        tset = set([type(t) for t in self._types])
-        
+        self._checker = checker(normalize(types))
+        # shared by the containers with the same types
+        self._types = self._checker.types
         self._null = null
-        if len(tset) == 1:
-            tset = tset.pop()
-            self.__enforceType = self.__selectEnforcementMethod(tset)
-        else:
-            self.__enforceType = self.__enforceTypeMixed
         if init:
-            for key, value in init.items():
-                self.__setitem__(key, value)
+            values = list(init.values())
+            if self._checker.first_invalid(values) != -1:
+                raise self.__error()
+            super(TypedDict, self).update(init)
         elif null is False:
             raise TypeError("This dict must not be empty")
 
-    def __selectEnforcementMethod(self, t):
-        if issubclass(t, (basestring, int)):
-            return self.__enforceTypeStrInt
-        elif t is re._pattern_type:
-            return self.__enforceTypePattern
-        elif isinstance(t, type):
-            return self.__enforceTypeClass
-
-    def __enforceTypeMixed(self, items):
-        res = []
-        for item in items:
-            et = self.__selectEnforcementMethod(type(item))
-            res.append(et((item,)))
-        if all(res):
-            return
-        raise TypeError('This dict accepts only elements: %s' %
-                        ', '.join([str(t) for t in self._types]))
-
-    def __enforceTypeStrInt(self, items):
-        if all(i in self._types for i in items):
-            return True
-        raise TypeError('This dict accepts only elements: %s' %
-                        ', '.join([str(t) for t in self._types]))
-
-    def __enforceTypeClass(self, items):
-        if all(isinstance(i, self._types) for i in items):
-            return
-        raise TypeError('This dict accepts only elements: %s' %
-                        ', '.join([str(i.__name__) for i in self._types]))
-
-    def __enforceTypePattern(self, items):
-        if all(any(j.match(i) for j in self._types) for i in items):
+    def _clone(self, items):
+        """Returns a dict of the same types holding items, unchecked"""
+        new = dict.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        # held by no Node whose hash is cached yet
+        new.__dict__.pop('_holders', None)
+        if self._checker is UNCHECKED:
+            # copied inside a deferred block
+            new._checker = checker(self._types)
+        dict.update(new, items)
+        return new
+
+    def __reduce_ex__(self, protocol):
+        return (_restore, (self.__class__, self._types, self._null,
+                           dict(self)))
+
+    def __deepcopy__(self, memo):
+        new = memo[id(self)] = self._clone(())
+        dict.update(new, [(deepcopy(k, memo), deepcopy(v, memo))
+                          for k, v in self.items()])
+        return new
+
+    def __error(self, key=None):
+        kind = self._checker.kind
+        if kind == 'class':
+            allowed = [str(i.__name__) for i in self._types]
+        elif kind == 'pattern':
+            allowed = [i.pattern for i in self._types]
+        else:
+            allowed = [str(t) for t in self._types]
+        msg = 'This dict accepts only elements: %s' % ', '.join(allowed)
+        if key is not None:
+            msg += ' (invalid element at key %r)' % (key,)
+        return TypeError(msg)
+
+    @contextmanager
+    def deferred(self):
+        """Defers type checks of the dict until the end of the block
+
+        See TypedList.deferred; the dict is put back as it was when the
+        block was entered if the block raises or leaves invalid values.
+        """
+        if self._checker is UNCHECKED:
+            yield self
             return
-        raise TypeError('This dict accepts only elements: %s' %
-                        ', '.join([i.pattern for i in self._types]))
+        saved = dict(self)
+        self._checker = UNCHECKED
+        mutation.deferred += 1
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+        raised = True
+        try:
+            yield self
+            raised = False
+        finally:
+            mutation.deferred -= 1
+            if self._holders is not None:
+                mutation.invalidate(self)
+            if mutation.observers:
+                mutation.notify(self)
+            self._checker = checker(self._types)
+            if raised:
+                self._reset(saved)
+        keys = list(self.keys())
+        index = self._checker.first_invalid([self[k] for k in keys])
+        if index != -1:
+            self._reset(saved)
+            raise self.__error(keys[index])
+
+    def _reset(self, items):
+        """Puts back the items a deferred block started from, unchecked"""
+        dict.clear(self)
+        dict.update(self, items)
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
 
     def pop(self, key, default=None):
         if self._null is False and len(self) == 1:
             raise TypeError("This dict must not be empty")
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return super(TypedDict, self).pop(key, default)
 
     def __delitem__(self, k):
         if self._null is False and len(self) == 1:
             raise TypeError("This dict must not be empty")
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return super(TypedDict, self).__delitem__(k)
 
     def __setitem__(self, key, value):
-        self.__enforceType(value if hasattr(value, '__iter__') else (value,))
+        if not self._checker.valid(value):
+            raise self.__error()
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return super(TypedDict, self).__setitem__(key, value)
 
+    def popitem(self):
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+        return super(TypedDict, self).popitem()
+
+    def clear(self):
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+        return super(TypedDict, self).clear()
+
+    def update(self, *args, **kwargs):
+        # checked and observed like __setitem__, all values before any
+        items = dict(*args, **kwargs)
+        keys = list(items)
+        index = self._checker.first_invalid([items[k] for k in keys])
+        if index != -1:
+            raise self.__error(keys[index])
+        for key in keys:
+            self[key] = items[key]
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+
+def _restore(cls, types, null, items):
+    """Unpickles a TypedDict without checking its values again"""
+    new = dict.__new__(cls)
+    new._checker = checker(types)
+    new._types = new._checker.types
+    new._null = null
+    dict.update(new, items)
+    return new
+
+
+class FrozenDict(dict):
+    """Immutable dict held by the dict fields of FrozenNodes
+
+    The values are validated by the Node before the FrozenDict is built.
+    """
+    __slots__ = ()
+
+    def __immutable(self, *args, **kwargs):
+        raise TypeError('This dict is frozen')
+
+    __setitem__ = __delitem__ = __ior__ = __immutable
+    pop = popitem = clear = update = setdefault = __immutable
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
@@ -1,9 +1,7 @@
-import sys
-import re
-
-# Temporary solution for string/unicode in py2 vs py3
-if sys.version >= '3':
-    basestring = str
+from contextlib import contextmanager
+from copy import deepcopy
+from .typecheck import checker, normalize, UNCHECKED
+from . import mutation
 
 
 class TypedList(list):
@@ -27,20 +25,16 @@ class TypedList(list):
     """
     _type = 'class'  # class | str | pattern
 
+    # weak reference to the Node whose cached hash covers the list, or a dict
+    # of them by id, see pyast.mutation
+    _holders = None
+
     def __init__(self, types, init=None, null=False):
         super(TypedList, self).__init__()
-        if isinstance(types, basestring) or not hasattr(types, '__iter__'):
-            self._types = (types,)
-        else:
-            self._types = types
-        tset = set([type(t) for t in self._types])
-        
+        self._checker = checker(normalize(types))
+        # shared by the containers with the same types
+        self._types = self._checker.types
         self._null = null
-        if len(tset) == 1:
-            tset = tset.pop()
-            self.__enforceType = self.__selectEnforcementMethod(tset)
-        else:
-            self.__enforceType = self.__enforceTypeMixed
         if init:
             self.extend(init)
         elif null is False:
@@ -64,59 +58,179 @@ class TypedList(list):
             s = template()
         return s
 
-    def __selectEnforcementMethod(self, t):
-        if issubclass(t, (basestring, int)):
-            return self.__enforceTypeStrInt
-        elif t is re._pattern_type:
-            return self.__enforceTypePattern
-        elif isinstance(t, type):
-            return self.__enforceTypeClass
-
-    def __enforceTypeMixed(self, items):
-        res = []
-        for item in items:
-            et = self.__selectEnforcementMethod(type(item))
-            res.append(et((item,)))
-        if all(res):
+    def _clone(self, items):
+        """Returns a list of the same types holding items, unchecked"""
+        new = list.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        # held by no Node whose hash is cached yet
+        new.__dict__.pop('_holders', None)
+        if self._checker is UNCHECKED:
+            # copied inside a deferred block
+            new._checker = checker(self._types)
+            for name in ('append', 'insert', 'extend'):
+                new.__dict__.pop(name, None)
+        list.extend(new, items)
+        return new
+
+    def __reduce_ex__(self, protocol):
+        return (_restore, (self.__class__, self._types, self._null,
+                           list(self)))
+
+    def __deepcopy__(self, memo):
+        new = memo[id(self)] = self._clone(())
+        list.extend(new, [deepcopy(i, memo) for i in self])
+        return new
+
+    def __error(self, index=None):
+        msg = 'This list accepts only elements: %s' % \
+              ', '.join([str(t) for t in self._types])
+        if index is not None:
+            msg += ' (invalid element at index %d)' % index
+        return TypeError(msg)
+
+    @contextmanager
+    def deferred(self):
+        """Defers type checks of the list until the end of the block
+
+        Elements added inside the block are not checked one by one; the
+        whole list is validated in a single pass when the block exits and
+        TypeError reports the index of the first invalid element.
+
+            with prog.body.deferred():
+                for stmt in statements:
+                    prog.body.append(stmt)
+
+        If the block raises, or leaves invalid elements, the list is put
+        back as it was when the block was entered before the exception
+        propagates; the list is copied on entry for this.
+        """
+        if self._checker is UNCHECKED:
+            # nested block, the outermost one validates
+            yield self
             return
-        raise TypeError('This list accepts only elements: %s' %
-                        ', '.join([str(t) for t in self._types]))
-
-    def __enforceTypeStrInt(self, items):
-        if all(i in self._types for i in items):
-            return True
-        raise TypeError('This list accepts only elements: %s' %
-                        ', '.join([str(t) for t in self._types]))
-
-    def __enforceTypeClass(self, items):
-        if all(isinstance(i, self._types) for i in items):
-            return True
-        raise TypeError('This list accepts only elements: %s' %
-                        ', '.join([str(t) for t in self._types]))
-
-    def __enforceTypePattern(self, items):
-        if all(any(j.match(i) for j in self._types) for i in items):
-            return True
-        raise TypeError('This list accepts only elements: %s' %
-                        ', '.join([str(t) for t in self._types]))
+        saved = list(self)
+        self._checker = UNCHECKED
+        unchecked = ('append', 'insert', 'extend')
+        for name in unchecked:
+            # the plain list methods, looked up before the class ones
+            setattr(self, name, getattr(super(TypedList, self), name))
+        mutation.deferred += 1
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+        raised = True
+        try:
+            yield self
+            raised = False
+        finally:
+            mutation.deferred -= 1
+            if self._holders is not None:
+                mutation.invalidate(self)
+            if mutation.observers:
+                mutation.notify(self)
+            self._checker = checker(self._types)
+            for name in unchecked:
+                delattr(self, name)
+            if raised:
+                self._reset(saved)
+        index = self._checker.first_invalid(self)
+        if index != -1:
+            self._reset(saved)
+            raise self.__error(index)
+
+    def _reset(self, items):
+        """Puts back the items a deferred block started from, unchecked"""
+        list.__setitem__(self, slice(None), items)
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+
+    def __enforceType(self, items):
+        if not isinstance(items, (list, tuple)):
+            items = list(items)
+        if self._checker.first_invalid(items) != -1:
+            raise self.__error()
+        return items
+
+    def __enforceItem(self, item):
+        if not self._checker.valid(item):
+            raise self.__error()
 
     def append(self, item):
-        self.__enforceType((item,))
+        self.__enforceItem(item)
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return super(TypedList, self).append(item)
 
     def insert(self, pos, item):
-        self.__enforceType((item,))
+        self.__enforceItem(item)
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return super(TypedList, self).insert(pos, item)
 
     def extend(self, items):
-        self.__enforceType(items)
+        items = self.__enforceType(items)
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return super(TypedList, self).extend(items)
 
     def pop(self, key=-1):
         if self._null is False and len(self) == 1:
             raise TypeError("This list must not be empty")
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return super(TypedList, self).pop(key)
 
+    def remove(self, item):
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+        return super(TypedList, self).remove(item)
+
+    def clear(self):
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+        return super(TypedList, self).clear()
+
+    def sort(self, *args, **kwargs):
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+        return super(TypedList, self).sort(*args, **kwargs)
+
+    def reverse(self):
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+        return super(TypedList, self).reverse()
+
+    def __iadd__(self, items):
+        # checked and observed like extend()
+        self.extend(items)
+        return self
+
+    def __imul__(self, n):
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
+        return super(TypedList, self).__imul__(n)
+
     def __delitem__(self, k):
         if self._null is False:
             if type(k) is slice:
@@ -125,18 +239,60 @@ class TypedList(list):
                     raise TypeError("This list must not be empty")
             elif len(self) == 1:
                 raise TypeError("This list must not be empty")
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return list.__delitem__(self, k)
 
     def __setitem__(self, key, value):
-        self.__enforceType(value if hasattr(value, '__iter__') else (value,))
+        if type(key) is slice:
+            value = self.__enforceType(value)
+        else:
+            self.__enforceItem(value)
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return list.__setitem__(self, key, value)
 
     def __setslice__(self, i, j, sequence):
-        self.__enforceType(sequence)
+        sequence = self.__enforceType(sequence)
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return list.__setslice__(self, i, j, sequence)
 
     def __delslice__(self, i, j):
         absslice = slice(i, j).indices(len(self))
         if self._null is False and absslice[1] - absslice[0] >= len(self):
             raise TypeError("This list must not be empty")
+        if self._holders is not None:
+            mutation.invalidate(self)
+        if mutation.observers:
+            mutation.notify(self)
         return list.__delslice__(self, i, j)
+
+
+def _restore(cls, types, null, items):
+    """Unpickles a TypedList without checking its elements again"""
+    new = list.__new__(cls)
+    new._checker = checker(types)
+    new._types = new._checker.types
+    new._null = null
+    list.extend(new, items)
+    return new
+
+
+class FrozenList(tuple):
+    """Immutable sequence held by the seq fields of FrozenNodes
+
+    The elements are validated by the Node before the FrozenList is built.
+    """
+    __slots__ = ()
+
+    def __repr__(self, template=None):
+        if template is None:
+            return '[%s]' % ', '.join(map(repr, self))
+        return template()
@@ -0,0 +1,296 @@
+"""Traversal of Node trees
+
+walk() yields every Node of a tree, NodeVisitor dispatches them to
+visit_<ClassName> methods and NodeTransformer replaces or removes them,
+like their counterparts in the ast module of the standard library.
+
+Only the _child_fields of each class are looked at: the fields whose guards
+allow Nodes, or lists and dicts of Nodes. Trees are walked with explicit
+stacks, so their depth is not limited by the recursion limit.
+"""
+from types import GeneratorType
+
+from .node import Node
+
+_NODE, _SEQ, _DICT = 1, 2, 3
+
+# what a field value is, by concrete type
+_kinds = {}
+
+
+def _kind(t):
+    if issubclass(t, Node):
+        kind = _NODE
+    elif issubclass(t, (list, tuple)):
+        kind = _SEQ
+    elif issubclass(t, dict):
+        kind = _DICT
+    else:
+        kind = 0
+    _kinds[t] = kind
+    return kind
+
+
+def _children(node, kinds=_kinds):
+    """Returns the Nodes held by the fields of node, last first"""
+    children = []
+    for name in node._child_fields:
+        value = getattr(node, name)
+        kind = kinds.get(value.__class__)
+        if kind is None:
+            kind = _kind(value.__class__)
+        if kind == _NODE:
+            children.append(value)
+        elif kind:
+            if kind == _DICT:
+                value = value.values()
+            for item in value:
+                kind = kinds.get(item.__class__)
+                if kind is None:
+                    kind = _kind(item.__class__)
+                if kind == _NODE:
+                    children.append(item)
+    children.reverse()
+    return children
+
+
+def iter_child_nodes(node):
+    """Returns an iterator over the Nodes held by the fields of node"""
+    return reversed(_children(node))
+
+
+def walk(node):
+    """Yields node and all the Nodes below it, depth first in field order"""
+    stack = [node]
+    pop = stack.pop
+    extend = stack.extend
+    while stack:
+        node = pop()
+        yield node
+        if node._child_fields:
+            extend(_children(node))
+
+
+def _methods(cls):
+    """Returns the table of visit methods of the visitor class cls
+
+    The method for each Node class is looked up the first time a Node of
+    that class is visited.
+    """
+    methods = cls.__dict__.get('_methods')
+    if methods is None:
+        methods = cls._methods = {}
+    return methods
+
+
+class NodeVisitor(object):
+    """Walks a tree calling visit_<ClassName>(node) for each Node
+
+    Nodes without such a method go to generic_visit(), which visits their
+    children. A visit_ method has to call generic_visit(node) itself to
+    have the children visited.
+
+    Unlike ast.NodeVisitor, generic_visit() does not recurse: it schedules
+    the children, which are visited after the current method returns. A
+    visit_ method that has work left once the children were visited is
+    written as a generator: it yields after calling generic_visit() and is
+    resumed when they are done; what it returns is its result.
+
+        def visit_Call(self, node):
+            self.depth += 1
+            self.generic_visit(node)
+            yield
+            self.depth -= 1
+    """
+    # stack of the visit() call in progress
+    _stack = None
+
+    def _method(self, node):
+        cls = self.__class__
+        methods = _methods(cls)
+        t = node.__class__
+        method = methods.get(t)
+        if method is None:
+            method = getattr(cls, 'visit_' + t.__name__, None)
+            if method is None:
+                method = cls.generic_visit
+                if method is NodeVisitor.generic_visit:
+                    # inlined by NodeVisitor.visit()
+                    method = False
+            methods[t] = method
+        return method
+
+    def visit(self, node):
+        """Visits node and the Nodes scheduled by the visit methods
+
+        Returns what the method called for node returned.
+        """
+        outer = self._stack
+        # Nodes to visit and suspended generator methods to resume
+        stack = self._stack = [node]
+        pop = stack.pop
+        extend = stack.extend
+        methods = _methods(self.__class__)
+        first = True
+        # the method of node while it is suspended
+        root = None
+        try:
+            while stack:
+                item = pop()
+                mark = len(stack)
+                if item.__class__ is GeneratorType:
+                    value = item
+                else:
+                    method = methods.get(item.__class__)
+                    if method is None:
+                        method = self._method(item)
+                    if method is False:
+                        if item._child_fields:
+                            extend(_children(item))
+                        value = None
+                    else:
+                        value = method(self, item)
+                if value.__class__ is GeneratorType:
+                    try:
+                        next(value)
+                    except StopIteration as e:
+                        value = e.value
+                    else:
+                        stack.insert(mark, value)
+                        if first:
+                            root = value
+                            first = False
+                        continue
+                if first or item is root:
+                    result = value
+                    first = False
+        finally:
+            self._stack = outer
+        return result
+
+    def generic_visit(self, node):
+        """Schedules the children of node to be visited"""
+        self._stack.extend(_children(node))
+
+
+class NodeTransformer(NodeVisitor):
+    """A NodeVisitor replacing the Nodes it visits
+
+    What a visit_ method returns takes the place of the Node in its field:
+    the Node itself to keep it, another value to replace it, or None to
+    remove it from a list or dict (or to empty the field). In a list, a
+    list of Nodes is spliced in place of the Node.
+
+    The fields of a Node are updated once all its children were visited,
+    after the visit_ method that called generic_visit(node) returned, or,
+    for generator methods, before they are resumed:
+
+        def visit_Parenthesized(self, node):
+            self.generic_visit(node)
+            yield
+            return node.expression
+
+    visit() returns the new root.
+    """
+
+    def visit(self, node):
+        outer = self._stack
+        # items of the stack:
+        #   (results, key, node)    visits node and stores what the method
+        #                           returns in results[key]
+        #   (None, node, fields)    updates the fields of node from the
+        #                           results of its children
+        #   (generator, results, key)  resumes a suspended method
+        root = [None]
+        stack = self._stack = [(root, 0, node)]
+        pop = stack.pop
+        methods = _methods(self.__class__)
+        try:
+            while stack:
+                results, key, child = pop()
+                if results is None:
+                    _update(key, child)
+                    continue
+                mark = len(stack)
+                if results.__class__ is GeneratorType:
+                    result, results, key = results, key, child
+                else:
+                    method = methods.get(child.__class__) or \
+                        self._method(child)
+                    result = method(self, child)
+                if result.__class__ is GeneratorType:
+                    try:
+                        next(result)
+                    except StopIteration as e:
+                        result = e.value
+                    else:
+                        stack.insert(mark, (result, results, key))
+                        continue
+                results[key] = result
+        finally:
+            self._stack = outer
+        return root[0]
+
+    def generic_visit(self, node):
+        kinds = _kinds
+        stack = self._stack
+        fields = []
+        tasks = []
+        for name in node._child_fields:
+            value = getattr(node, name)
+            kind = kinds.get(value.__class__)
+            if kind is None:
+                kind = _kind(value.__class__)
+            if kind == _NODE:
+                results = [value]
+                tasks.append((results, 0, value))
+            elif kind:
+                if kind == _DICT:
+                    results = dict(value)
+                    items = value.items()
+                else:
+                    results = list(value)
+                    items = enumerate(value)
+                for key, item in items:
+                    kind = kinds.get(item.__class__)
+                    if kind is None:
+                        kind = _kind(item.__class__)
+                    if kind == _NODE:
+                        tasks.append((results, key, item))
+            else:
+                continue
+            fields.append((name, value, results))
+        stack.append((None, node, fields))
+        tasks.reverse()
+        stack.extend(tasks)
+        return node
+
+
+def _update(node, fields):
+    """Writes the visited children of node back into its fields"""
+    for name, value, results in fields:
+        if isinstance(results, dict):
+            for key, item in results.items():
+                if item is None:
+                    del value[key]
+                elif item is not value[key]:
+                    value[key] = item
+        elif isinstance(value, list):
+            items = []
+            for item in results:
+                if item is None:
+                    continue
+                if isinstance(item, list):
+                    items.extend(item)
+                else:
+                    items.append(item)
+            if len(items) != len(value) or \
+               any(a is not b for a, b in zip(items, value)):
+                value[:] = items
+        elif isinstance(value, tuple):
+            items = tuple(item for item in results if item is not None)
+            if len(items) != len(value) or \
+               any(a is not b for a, b in zip(items, value)):
+                setattr(node, name, items)
+        elif results[0] is not value:
+            setattr(node, name, results[0])
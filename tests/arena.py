@@ -0,0 +1,159 @@
+import unittest
+import sys
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast import arena as columns
+from pyast.arena import Arena, NodeView
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Keyword(Identifier):
+    pass
+
+
+class Literal(Expression):
+    value = ast.field((str, int, bool, float), null=True)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class Unchecked(ast.Node):
+    _debug = False
+    name = ast.field(str)
+    args = ast.seq(Expression, null=True)
+
+
+class Constant(ast.FrozenNode):
+    _debug = True
+    value = ast.field(int)
+    args = ast.seq(Expression, null=True)
+
+
+def tree():
+    return Call(Identifier('f'), [
+        Identifier('x'),
+        Literal(1),
+        Literal(True),
+        Literal(2 ** 70),
+        Literal(1.5),
+        Call(Keyword('g'), [Identifier('x'), Literal(None)]),
+        Literal('x'),
+    ], {'y': Identifier('y')})
+
+
+class ArenaTestCase(unittest.TestCase):
+    use_numpy = False
+
+    def arena(self, root):
+        return Arena(root, use_numpy=self.use_numpy)
+
+    def test_columns(self):
+        root = tree()
+        arena = self.arena(root)
+        self.assertEqual(len(arena), 13)
+        self.assertEqual(arena.types[arena.classes[0]], Call)
+        self.assertEqual(arena.parents[0], -1)
+        self.assertEqual(arena.ends[0], 13)
+        # callee, then the items of args
+        self.assertEqual(arena.parents[1], 0)
+        self.assertEqual(arena.ends[1], 2)
+        inner = arena.find(Call)[1]
+        self.assertEqual(arena.ends[inner], inner + 4)
+        self.assertEqual(arena.strings.count('x'), 1)
+
+    def test_views(self):
+        root = tree()
+        arena = self.arena(root)
+        view = arena.root
+        self.assertIsInstance(view, NodeView)
+        self.assertEqual(view._fields, ['callee', 'args', 'kwargs'])
+        self.assertEqual(view.callee.name, 'f')
+        self.assertEqual([getattr(item, item._fields[0])
+                          for item in view.args[:5]],
+                         ['x', 1, True, 2 ** 70, 1.5])
+        self.assertIs(view.args[2].value, True)
+        self.assertEqual(view.args[5].args[1].value, None)
+        self.assertEqual(view.kwargs['y'].name, 'y')
+        self.assertEqual(view.args[5].callee.parent, view.args[5])
+        self.assertIsNone(view.parent)
+        self.assertEqual(arena[-1], view.kwargs['y'])
+        with self.assertRaises(AttributeError):
+            view.value
+        with self.assertRaises(IndexError):
+            arena[13]
+
+    def test_tree(self):
+        root = tree()
+        arena = self.arena(root)
+        copy = arena.tree()
+        self.assertEqual(copy, root)
+        self.assertIsNot(copy.args[0], root.args[0])
+        self.assertIsInstance(copy.args, ast.TypedList)
+        self.assertEqual(arena.root.args[5].materialize(), root.args[5])
+
+        other = Unchecked('u', [Identifier('a')])
+        copy = self.arena(other).tree()
+        self.assertEqual(copy, other)
+        self.assertIs(copy.__class__, Unchecked)
+        # FrozenNodes holding new Nodes are new FrozenNodes
+        other = Constant(1, [Literal(2)])
+        copy = self.arena(other).tree()
+        self.assertIs(copy.__class__, Constant)
+        self.assertEqual(copy.value, 1)
+        self.assertEqual(copy.args, other.args)
+
+    def test_count(self):
+        arena = self.arena(tree())
+        self.assertEqual(arena.count(Expression), 13)
+        self.assertEqual(arena.count(Identifier), 5)
+        self.assertEqual(arena.count(Keyword), 1)
+        # bools are ints, like for isinstance()
+        self.assertEqual(arena.count(Literal, value=int), 3)
+        self.assertEqual(arena.count(Literal, value=(str, float)), 2)
+        self.assertEqual(arena.count(Literal, value=type(None)), 1)
+        # 1 is not True
+        self.assertEqual(arena.count(Literal, value=1), 1)
+        self.assertEqual(arena.count(Literal, value=True), 1)
+        self.assertEqual(arena.count(Literal, value=1.5), 1)
+        self.assertEqual(arena.count(Literal, value=2 ** 70), 1)
+        self.assertEqual(arena.count(Literal, value='y'), 0)
+        self.assertEqual(arena.count(Identifier, name='x'), 2)
+        self.assertEqual(arena.count(Identifier, name='z'), 0)
+        self.assertEqual(arena.count(Call, callee=Keyword), 1)
+        self.assertEqual(arena.count(Call, callee=Identifier), 2)
+        self.assertEqual(arena.count(Expression, name='x'), 2)
+
+    def test_find(self):
+        root = tree()
+        arena = self.arena(root)
+        found = arena.find(Identifier, name='x')
+        self.assertEqual([arena[i].name for i in found], ['x', 'x'])
+        self.assertEqual(arena[found[1]].parent, arena.root.args[5])
+        self.assertEqual(list(arena.find(Expression)), list(range(13)))
+        self.assertEqual(list(arena.find(Identifier)),
+                         sorted(arena.find(Identifier)))
+        literals = arena.find(Literal, value=(int, type(None)))
+        self.assertEqual([arena[i].value for i in literals],
+                         [1, True, 2 ** 70, None])
+
+
+@unittest.skipIf(columns.numpy is None, 'NumPy is not installed')
+class NumpyArenaTestCase(ArenaTestCase):
+    use_numpy = True
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,27 @@
 import unittest
+import sys
 
+import pickle
 import pyast as ast
 from copy import deepcopy
 
 
+# pickled classes have to be importable
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Name(Expression):
+    name = ast.field(str)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
 class BaseASTTestCase(unittest.TestCase):
     def test_basic_init(self):
         class Example(ast.Node):
@@ -370,6 +388,281 @@ class BaseASTTestCase(unittest.TestCase):
         self.assertEqual(x.left.name, 'foo')
         self.assertEqual(x2.left.name, 'foo2')
 
+    def test_generated_init(self):
+        class Example(ast.Node):
+            _debug = True
+            field = ast.field(str, null=True)
+            seq = ast.seq((str, int), null=True)
+
+        e = Example('foo', seq=['a'])
+        self.assertEqual(e.field, 'foo')
+        self.assertEqual(list(e.seq), ['a'])
+        self.assertTrue(isinstance(e.seq, ast.TypedList))
+        self.assertRaises(TypeError, Example, 'foo', field='foo')
+        # extra arguments are ignored, as by Node.__init__
+        e = Example('foo', ['a'], 'bar', other=1)
+        self.assertEqual(e.field, 'foo')
+        self.assertEqual(list(e.seq), ['a'])
+        self.assertFalse(hasattr(e, 'other'))
+
+        e1 = Example()
+        e2 = Example()
+        e1.seq.append('a')
+        self.assertEqual(len(e2.seq), 0)
+
+        class Example2(ast.Node):
+            _debug = False
+            seq = ast.seq(str, null=True)
+
+        e1 = Example2()
+        e2 = Example2()
+        e1.seq.append(2)
+        self.assertEqual(e1.seq, [2])
+        self.assertEqual(e2.seq, [])
+
+    def test_custom_init(self):
+        class Example(ast.Node):
+            _debug = True
+            field = ast.field(str)
+
+            def __init__(self, field):
+                super(Example, self).__init__(field.lower())
+
+        class Example2(Example):
+            field2 = ast.field(str, null=True)
+
+        e = Example('FOO')
+        self.assertEqual(e.field, 'foo')
+        e = Example2('FOO')
+        self.assertEqual(e.field, 'foo')
+        self.assertEqual(e.field2, None)
+
+    def test_abstract(self):
+        class Expression(ast.Node):
+            _abstract = True
+            _debug = True
+
+        class Identifier(Expression):
+            name = ast.field(str, null=True)
+
+        self.assertRaises(TypeError, Expression)
+        self.assertEqual(Identifier('x').name, 'x')
+
+    def test_slots(self):
+        class Expression(ast.Node):
+            _abstract = True
+            _slots = True
+
+        class Literal(Expression):
+            _template = '%(value)s'
+            value = ast.field((str, int))
+
+        class BinaryExpression(Expression):
+            left = ast.field(Expression)
+            right = ast.field(Expression)
+            _template = '%(left)s+%(right)s'
+
+        x = BinaryExpression(Literal(1), Literal('a'))
+        self.assertFalse(hasattr(x, '__dict__'))
+        self.assertFalse(hasattr(x.left, '__dict__'))
+        self.assertEqual(Literal.__slots__, ('value',))
+        self.assertEqual(x['left'].value, 1)
+        self.assertRaises(KeyError, x.__getitem__, 'foo')
+        self.assertRaises(AttributeError, setattr, x, 'foo', 1)
+        self.assertRaises(TypeError, setattr, x, 'left', 'foo')
+        self.assertEqual(str(x), '1+a')
+
+        x2 = deepcopy(x)
+        self.assertEqual(x, x2)
+        self.assertFalse(x.left is x2.left)
+        x2.left = Literal(2)
+        self.assertNotEqual(x, x2)
+
+    def test_clone(self):
+        class Expression(ast.Node):
+            _abstract = True
+            _debug = True
+
+        class Identifier(Expression):
+            name = ast.field(str)
+
+        class Call(Expression):
+            callee = ast.field(Expression)
+            args = ast.seq(Expression, null=True)
+            kwargs = ast.dict(Expression, null=True)
+
+            def __init__(self, *args, **kwargs):
+                self.inits = getattr(self, 'inits', 0) + 1
+                super(Call, self).__init__(*args, **kwargs)
+
+        shared = Identifier('x')
+        x = Call(Identifier('f'), [shared, shared], {'y': Identifier('y')})
+        x2 = x.clone()
+        self.assertEqual(x, x2)
+        self.assertFalse(x2.callee is x.callee)
+        self.assertTrue(x2.args[0] is x2.args[1])
+        self.assertFalse(x2.args[0] is shared)
+        self.assertTrue(isinstance(x2.args, ast.TypedList))
+        self.assertTrue(isinstance(x2.kwargs, ast.TypedDict))
+        # not re-initialized, still validated
+        self.assertFalse(hasattr(x2, 'inits'))
+        self.assertRaises(TypeError, x2.args.append, 'foo')
+        self.assertRaises(TypeError, x2.kwargs.__setitem__, 'z', 'foo')
+        x2.args.append(Identifier('z'))
+        self.assertEqual(len(x.args), 2)
+
+        x3 = deepcopy(x)
+        self.assertEqual(x, x3)
+        self.assertFalse(x3.args is x.args)
+
+        deep = Identifier('x')
+        for i in range(sys.getrecursionlimit() * 2):
+            deep = Call(deep)
+        self.assertEqual(deepcopy(deep), deep)
+
+    def test_pickle(self):
+        shared = Name('x')
+        x = Call(Name('f'), [shared, shared], {'y': Name('y')})
+        data = pickle.dumps(x, pickle.HIGHEST_PROTOCOL)
+        self.assertFalse(b'callee' in data)
+        x2 = pickle.loads(data)
+        self.assertEqual(x, x2)
+        self.assertTrue(x2.args[0] is x2.args[1])
+        self.assertTrue(isinstance(x2.args, ast.TypedList))
+        self.assertTrue(isinstance(x2.kwargs, ast.TypedDict))
+        self.assertRaises(TypeError, x2.args.append, 'foo')
+        self.assertRaises(TypeError, x2.kwargs.__setitem__, 'z', 'foo')
+        self.assertRaises(TypeError, setattr, x2, 'callee', 'foo')
+
+        # not validated again
+        object.__setattr__(x, 'callee', 'foo')
+        self.assertEqual(pickle.loads(pickle.dumps(x)).callee, 'foo')
+
+    def test_set_debug(self):
+        class Expression(ast.Node):
+            _abstract = True
+
+        class Identifier(Expression):
+            name = ast.field(str)
+
+        class Literal(Expression):
+            _debug = True
+            value = ast.field(int)
+
+        try:
+            self.assertRaises(TypeError, Identifier, 2)
+            ast.set_debug(False)
+            self.assertEqual(ast.DEBUG, False)
+            self.assertEqual(Identifier(2).name, 2)
+            self.assertRaises(TypeError, Literal, 'foo')
+
+            class Identifier2(Expression):
+                name = ast.field(str)
+
+            self.assertEqual(Identifier2(2).name, 2)
+
+            ast.set_debug(True)
+            self.assertRaises(TypeError, Identifier, 2)
+            self.assertRaises(TypeError, Identifier2, 2)
+            i = Identifier('x')
+            self.assertRaises(TypeError, setattr, i, 'name', 2)
+
+            ast.set_debug(False, Expression)
+            self.assertEqual(Identifier(2).name, 2)
+            i.name = 2
+            self.assertEqual(i.name, 2)
+            self.assertEqual(Expression().__class__, Expression)
+            self.assertRaises(TypeError, Literal, 'foo')
+        finally:
+            ast.set_debug(True)
+
+    def test_validator_messages(self):
+        class Expression(ast.Node):
+            _abstract = True
+            _debug = True
+
+        class Literal(Expression):
+            value = ast.field(int)
+
+        class Example(ast.Node):
+            _debug = True
+            op = ast.field(("+", "-"), null=True)
+            name = ast.field((ast.re("[a-z]+"), ast.re("_[0-9]+")), null=True)
+            expr = ast.field(Expression, null=True)
+
+        e = Example('+', 'abc', Literal(2))
+        e.name = '_12'
+        e.expr = Literal(True)
+        self.assertRaises(TypeError, setattr, e, 'name', '12')
+        self.assertRaises(TypeError, setattr, e, 'name', 12)
+        self.assertRaises(TypeError, setattr, e, 'op', '*')
+        self.assertRaises(TypeError, setattr, e, 'op', ['+'])
+        self.assertRaises(TypeError, setattr, e, 'expr', 'foo')
+
+        try:
+            e.op = '*'
+        except TypeError as err:
+            self.assertEqual(str(err), "Element op must be one of '+,-'")
+        try:
+            e.name = '12'
+        except TypeError as err:
+            self.assertEqual(str(err),
+                             "Element name must be one of '[a-z]+,_[0-9]+'")
+        try:
+            Literal(None)
+        except TypeError as err:
+            self.assertEqual(str(err), "Element value must not be empty")
+
+    def test_pattern_backreference(self):
+        class Example(ast.Node):
+            _debug = True
+            name = ast.field((ast.re(r"([a-z])\1"), ast.re("[0-9]")))
+
+        self.assertEqual(Example('aa').name, 'aa')
+        self.assertEqual(Example('1').name, '1')
+        self.assertRaises(TypeError, Example, 'ab')
+
+    def test_deferred(self):
+        class Statement(ast.Node):
+            _debug = True
+            name = ast.field(str)
+
+        class Program(ast.Node):
+            _debug = True
+            body = ast.seq(Statement, null=True)
+            attrs = ast.dict(str, null=True)
+
+        p = Program()
+        with p.deferred():
+            for i in range(10):
+                p.body.append(Statement('x%d' % i))
+            p.attrs['foo'] = 'bar'
+        self.assertEqual(len(p.body), 10)
+
+        def fill():
+            with p.deferred():
+                p.body.append(Statement('y'))
+                p.body.append('z')
+        self.assertRaises(TypeError, fill)
+        self.assertRaises(TypeError, p.body.append, 'z')
+        # both fields are put back as they were
+        self.assertEqual(len(p.body), 10)
+
+        def update():
+            with p.deferred():
+                p.body.append(Statement('y'))
+                p.attrs['baz'] = 1
+        self.assertRaises(TypeError, update)
+        self.assertEqual(len(p.body), 10)
+        self.assertEqual(p.attrs, {'foo': 'bar'})
+
+        def fail():
+            with p.deferred():
+                p.body.append(Statement('y'))
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(len(p.body), 10)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import unittest
+import sys
+import io
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast.dump import binary
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    value = ast.field((str, int, float, bool, list, tuple, dict), null=True)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class Constant(ast.FrozenNode):
+    value = ast.field((str, int))
+
+
+class Pair(ast.FrozenNode):
+    left = ast.field(Constant)
+    right = ast.field(Constant, null=True)
+
+
+def tree():
+    return Call(Identifier('f'), [
+        Literal(None),
+        Literal(True),
+        Literal(False),
+        Literal(0),
+        Literal(-1),
+        Literal(2 ** 70),
+        Literal(-2 ** 70),
+        Literal(1.5),
+        Literal(u'zażółć'),
+        Literal([1, [2, 'x'], {'a': (3, None)}]),
+        Call(Identifier('g'), [], {'x': Identifier('x')}),
+    ], {'y': Literal('y'), 'z': Identifier('f')})
+
+
+class BinaryDumpTestCase(unittest.TestCase):
+    def test_roundtrip(self):
+        a = tree()
+        data = binary.dump(a)
+        self.assertTrue(isinstance(data, bytes))
+        b = binary.load(data)
+        self.assertEqual(a, b)
+        self.assertTrue(isinstance(b.args, ast.TypedList))
+        self.assertTrue(isinstance(b.kwargs, ast.TypedDict))
+        self.assertEqual(b.args[9].value[2]['a'], (3, None))
+        self.assertRaises(TypeError, b.args.append, 'x')
+        self.assertRaises(TypeError, b.kwargs.__setitem__, 'x', 'x')
+        self.assertEqual(binary.load(data, validate=True), a)
+
+    def test_strings(self):
+        a = Call(Identifier('f'), [Identifier('x') for i in range(100)])
+        data = binary.dump(a)
+        self.assertEqual(data.count(b'x'), 1)
+
+    def test_buffers(self):
+        data = binary.dump(tree())
+        self.assertEqual(binary.load(bytearray(data)), tree())
+        self.assertEqual(binary.load(memoryview(data)), tree())
+        fp = io.BytesIO()
+        self.assertEqual(binary.dump(tree(), fp), None)
+        self.assertEqual(fp.getvalue(), data)
+        self.assertEqual(binary.load(fp.getbuffer()), tree())
+
+    def test_validate(self):
+        a = Call(Identifier('f'))
+        object.__setattr__(a, 'callee', 'f')
+        data = binary.dump(a)
+        self.assertEqual(binary.load(data).callee, 'f')
+        self.assertRaises(TypeError, binary.load, data, validate=True)
+
+    def test_frozen(self):
+        a = Pair(Constant(1), Constant('a'))
+        self.assertTrue(binary.load(binary.dump(a)) is a)
+
+    def test_classes(self):
+        data = binary.dump(tree())
+        self.assertEqual(binary.load(data, classes=[Call, Identifier,
+                                                    Literal]), tree())
+        self.assertRaises(ValueError, binary.load, data, classes=[Call])
+        self.assertRaises(ValueError, binary.load, b'PYAST\x02')
+        a = Literal(None)
+        object.__setattr__(a, 'value', object())
+        self.assertRaises(TypeError, binary.dump, a)
+
+    def test_deep(self):
+        a = Identifier('x')
+        for i in range(sys.getrecursionlimit() * 2):
+            a = Call(a)
+        self.assertEqual(binary.load(binary.dump(a)), a)
+
+if __name__ == '__main__':
+    unittest.main()
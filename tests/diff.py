@@ -0,0 +1,190 @@
+import unittest
+import random
+import sys
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast.diff import diff, apply_patch, UPDATE, INSERT, DELETE, MOVE
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    value = ast.field((int, bool))
+
+
+class Binary(Expression):
+    operator = ast.field(('+', '*'))
+    left = ast.field(Expression)
+    right = ast.field(Expression)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class Constant(ast.FrozenNode):
+    _debug = True
+    value = ast.field(int)
+
+
+class Block(ast.Node):
+    _debug = True
+    body = ast.seq(Expression)
+    kwargs = ast.dict(Expression)
+
+
+class Program(ast.Node):
+    _debug = True
+    body = ast.seq(Expression, null=True)
+    names = ast.seq(str, null=True)
+    constant = ast.field(Constant, null=True)
+
+
+def call(i):
+    return Call(Identifier('f%d' % i),
+                [Binary('+', Literal(i), Identifier('x')), Literal(i)],
+                {'key': Literal(i)})
+
+
+def program(size):
+    return Program([call(i) for i in range(size)], ['a', 'b', 'c'],
+                   Constant(1))
+
+
+class DiffTestCase(unittest.TestCase):
+    def check(self, old, new):
+        edits = diff(old, new)
+        copy = old.clone()
+        root = apply_patch(copy, edits)
+        self.assertEqual(root, new)
+        return edits
+
+    def test_equal(self):
+        self.assertEqual(diff(program(10), program(10)), [])
+        root = program(3)
+        self.assertEqual(diff(root, root), [])
+
+    def test_update(self):
+        old = program(5)
+        new = program(5)
+        new.body[2].args[0].left.value = 7
+        new.body[3].callee = Literal(3)
+        new.constant = Constant(2)
+        new.body[0].args[1].value = True
+        edits = self.check(old, new)
+        self.assertEqual(sorted((kind, path) for kind, path, _ in edits), [
+            (UPDATE, ('body', 0, 'args', 1, 'value')),
+            (UPDATE, ('body', 2, 'args', 0, 'left', 'value')),
+            (UPDATE, ('body', 3, 'callee')),
+            (UPDATE, ('constant',)),
+        ])
+
+    def test_lists(self):
+        old = program(6)
+        new = program(6)
+        del new.body[1]
+        new.body.insert(3, call(10))
+        new.body.append(Identifier('end'))
+        new.names[1:2] = ['d', 'e']
+        edits = self.check(old, new)
+        kinds = [edit[0] for edit in edits]
+        self.assertEqual(kinds.count(DELETE), 1)
+        self.assertNotIn(MOVE, kinds)
+        # call(10) is compared with the call it replaces, not inserted
+        self.assertIn((UPDATE, ('names', 1), 'd'), edits)
+
+    def test_moves(self):
+        old = program(8)
+        new = program(8)
+        new.body.insert(0, new.body.pop(5))
+        new.body.append(new.body.pop(2))
+        new.body[3].args.reverse()
+        edits = self.check(old, new)
+        moves = [edit for edit in edits if edit[0] == MOVE]
+        self.assertEqual(len(moves), 3)
+        self.assertFalse([edit for edit in edits
+                          if edit[0] in (INSERT, DELETE)])
+
+    def test_not_null(self):
+        # replaced items keep the list and dict from being emptied
+        old = Block([Identifier('x')], {'a': Identifier('x')})
+        new = Block([Literal(1)], {'b': Literal(1)})
+        edits = self.check(old, new)
+        self.assertIn((UPDATE, ('body', 0), new.body[0]), edits)
+        old = Block([Identifier('x'), Literal(1), Identifier('y')],
+                    {'a': Identifier('x')})
+        new = Block([Literal(2), Literal(1),
+                     Binary('+', Literal(1), Literal(2))], {'a': Literal(1)})
+        self.check(old, new)
+        self.check(new, old)
+
+    def test_dicts(self):
+        old = program(3)
+        new = program(3)
+        new.body[0].kwargs['key'].value = 5
+        new.body[1].kwargs['other'] = Identifier('y')
+        del new.body[2].kwargs['key']
+        edits = self.check(old, new)
+        self.assertIn((DELETE, ('body', 2, 'kwargs', 'key')), edits)
+        self.assertIn((UPDATE, ('body', 0, 'kwargs', 'key', 'value'), 5),
+                      edits)
+
+    def test_root(self):
+        old = program(2)
+        new = Identifier('x')
+        edits = self.check(old, new)
+        self.assertEqual(edits, [(UPDATE, (), new)])
+        root = apply_patch(old, edits)
+        self.assertEqual(root, new)
+        self.assertIsNot(root, new)
+        with self.assertRaises(ValueError):
+            apply_patch(old, [(DELETE, ())])
+
+    def test_random(self):
+        rng = random.Random(0)
+        for _ in range(30):
+            old = program(20)
+            new = program(20)
+            body = new.body
+            for _ in range(rng.randrange(1, 8)):
+                action = rng.randrange(5)
+                if action == 0 and body:
+                    del body[rng.randrange(len(body))]
+                elif action == 1:
+                    body.insert(rng.randrange(len(body) + 1),
+                                call(rng.randrange(40)))
+                elif action == 2 and body:
+                    body.insert(rng.randrange(len(body) + 1),
+                                body.pop(rng.randrange(len(body))))
+                elif action == 3 and body:
+                    body[rng.randrange(len(body))].callee.name = 'g'
+                else:
+                    body.insert(rng.randrange(len(body) + 1),
+                                Literal(rng.randrange(3)))
+            self.check(old, new)
+            self.check(new, old)
+
+    def test_copies(self):
+        old = program(2)
+        new = program(3)
+        root = apply_patch(old, diff(old, new))
+        self.assertEqual(root, new)
+        self.assertIsNot(root.body[2], new.body[2])
+        root.body[2].callee.name = 'changed'
+        self.assertEqual(new.body[2].callee.name, 'f2')
+        with self.assertRaises(ValueError):
+            apply_patch(old, [('replace', ('body', 0), None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
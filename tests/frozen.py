@@ -0,0 +1,120 @@
+import unittest
+import gc
+import math
+import pickle
+from copy import deepcopy
+
+import pyast as ast
+
+
+class Expression(ast.FrozenNode):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    value = ast.field((str, int, bool), null=True)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class FrozenNodeTestCase(unittest.TestCase):
+    def test_interning(self):
+        a = Call(Identifier('f'), [Literal(1), Identifier('x')])
+        b = Call(Identifier('f'), args=[Literal(1), Identifier('x')])
+        c = Call(Identifier('f'), [Identifier('x'), Literal(1)])
+        self.assertTrue(a is b)
+        self.assertFalse(a is c)
+        self.assertTrue(a.args[1] is c.args[0])
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+        self.assertEqual(len(set([a, b, c])), 2)
+
+    def test_identity(self):
+        class Name(ast.Node):
+            _debug = True
+            name = ast.field(str)
+
+        class Holder(ast.FrozenNode):
+            _debug = True
+            child = ast.field(Name)
+
+        class Mutable(ast.Node):
+            _debug = True
+            callee = ast.field(Expression)
+
+        # not frozen children are only shared when they are the same object
+        name = Name('x')
+        a = Holder(name)
+        self.assertTrue(Holder(name) is a)
+        b = Holder(Name('x'))
+        self.assertFalse(b is a)
+        self.assertTrue(b.child is not name)
+        self.assertNotEqual(a, b)
+        self.assertEqual(len(set([a, b])), 2)
+        # FrozenNodes are only equal to themselves
+        frozen = Identifier('x')
+        self.assertNotEqual(frozen, name)
+        self.assertNotEqual(name, frozen)
+        self.assertEqual(Mutable(frozen), Mutable(Identifier('x')))
+        self.assertEqual(hash(Mutable(frozen)), hash(Mutable(frozen)))
+
+    def test_distinct_scalars(self):
+        self.assertFalse(Literal(1) is Literal(True))
+        self.assertFalse(Literal('1') is Literal(1))
+        self.assertTrue(Literal(None) is Literal())
+
+        class Number(ast.FrozenNode):
+            _debug = True
+            value = ast.field(float)
+
+        self.assertTrue(Number(0.5) is Number(0.5))
+        self.assertFalse(Number(0.0) is Number(-0.0))
+        self.assertEqual(math.copysign(1, Number(-0.0).value), -1)
+
+    def test_immutable(self):
+        a = Call(Identifier('f'), [Literal(1)], {'x': Literal(2)})
+        self.assertTrue(isinstance(a.args, ast.FrozenList))
+        self.assertTrue(isinstance(a.kwargs, ast.FrozenDict))
+        self.assertRaises(AttributeError, setattr, a, 'callee', Identifier('g'))
+        self.assertRaises(AttributeError, delattr, a, 'callee')
+        self.assertFalse(hasattr(a.args, 'append'))
+        self.assertRaises(TypeError, a.kwargs.__setitem__, 'y', Literal(3))
+        self.assertRaises(TypeError, a.kwargs.pop, 'x')
+
+    def test_validation(self):
+        self.assertRaises(TypeError, Literal, 1.5)
+        self.assertRaises(TypeError, Call, Identifier('f'), [1])
+        self.assertRaises(TypeError, Expression)
+        self.assertTrue(Identifier('x', 'y', other=1) is Identifier('x'))
+
+    def test_copy(self):
+        a = Call(Identifier('f'), [Literal(1)], {'x': Literal(2)})
+        self.assertTrue(deepcopy(a) is a)
+        self.assertTrue(pickle.loads(pickle.dumps(a)) is a)
+
+    def test_weak_table(self):
+        Identifier('unused-identifier')
+        gc.collect()
+        names = [k[0] for k in Identifier._interned.keys()]
+        self.assertFalse('unused-identifier' in names)
+
+    def test_slots(self):
+        class Name(ast.FrozenNode):
+            _slots = True
+            name = ast.field(str)
+
+        self.assertTrue(Name('x') is Name('x'))
+        self.assertFalse(hasattr(Name('x'), '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,281 @@
+import unittest
+import sys
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast.node import structural_hash
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    value = ast.field((str, int, bool, list), null=True)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class Unchecked(ast.Node):
+    _debug = False
+    name = ast.field(str)
+    args = ast.seq(Expression, null=True)
+
+
+class Slotted(ast.Node):
+    _debug = True
+    _slots = True
+    name = ast.field(str)
+    args = ast.seq(Expression, null=True)
+
+
+def call(name='f'):
+    return Call(Identifier(name), [Literal(1), Identifier('x')],
+                {'y': Literal('z')})
+
+
+class HashTestCase(unittest.TestCase):
+    def test_structural(self):
+        a = call()
+        b = call()
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(a, b)
+        self.assertNotEqual(hash(a), hash(call('g')))
+        self.assertNotEqual(a, call('g'))
+
+        index = {a: 'a'}
+        self.assertEqual(index[b], 'a')
+        self.assertNotIn(b.args[1], index)
+
+    def test_cached(self):
+        a = call()
+        h = structural_hash(a)
+        self.assertEqual(a._hash, h)
+        self.assertEqual(a.callee._hash, structural_hash(a.callee))
+
+    def test_invalidation(self):
+        a = call()
+        b = call()
+        hash(a)
+        hash(b)
+        # writes elsewhere keep the hashes
+        other = call('g')
+        other.args.append(Literal(2))
+        other.callee.name = 'h'
+        self.assertIsNotNone(a._hash)
+        # a write drops the hashes of the Nodes above it only
+        a.args[1].name = 'y'
+        self.assertIsNone(a.args[1]._hash)
+        self.assertIsNone(a._hash)
+        self.assertIsNotNone(a.args[0]._hash)
+        self.assertIsNotNone(a.callee._hash)
+        self.assertIsNotNone(b._hash)
+        self.assertNotEqual(hash(a), hash(b))
+        a.kwargs['y'].value = 'w'
+        self.assertIsNone(a._hash)
+        self.assertIsNotNone(a.args[1]._hash)
+
+    def test_shared(self):
+        shared = Identifier('x')
+        a = Call(Identifier('f'), [shared])
+        b = Call(Identifier('g'), kwargs={'k': Call(shared)})
+        h = hash(a)
+        hash(b)
+        shared.name = 'y'
+        self.assertIsNone(a._hash)
+        self.assertIsNone(b._hash)
+        self.assertIsNone(b.kwargs['k']._hash)
+        self.assertNotEqual(hash(a), h)
+        shared.name = 'x'
+        self.assertEqual(hash(a), h)
+
+    def test_holders(self):
+        shared = Identifier('x')
+        for i in range(100):
+            parents = [Call(shared) for _ in range(10)]
+            for parent in parents:
+                hash(parent)
+        self.assertTrue(len(shared._holders) <= 64)
+        shared.name = 'y'
+        self.assertIsNone(shared._holders)
+        self.assertTrue(all(parent._hash is None for parent in parents))
+
+    def test_clone(self):
+        a = call()
+        h = hash(a)
+        b = a.clone()
+        self.assertEqual(b._hash, h)
+        b.args[0].value = 2
+        self.assertIsNone(b._hash)
+        self.assertEqual(a._hash, h)
+        self.assertNotEqual(hash(b), h)
+
+    def test_set_debug(self):
+        class Name(ast.Node):
+            _debug = True
+            name = ast.field(str)
+
+        class Holder(ast.Node):
+            _debug = True
+            child = ast.field(Name)
+
+        a = Holder(Name('x'))
+        h = hash(a)
+        ast.set_debug(False, Name)
+        # writes to Nodes whose hash was kept stay observed
+        a.child.name = 'y'
+        self.assertNotEqual(hash(a), h)
+        ast.set_debug(True, Name)
+
+    def test_setattr(self):
+        a = call()
+        b = call()
+        hash(a)
+        hash(b)
+        a.callee.name = 'g'
+        self.assertNotEqual(hash(a), hash(b))
+        self.assertNotEqual(a, b)
+        a.callee = Identifier('f')
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(a, b)
+
+    def test_typedlist(self):
+        a = call()
+        b = call()
+        h = hash(a)
+        hash(b)
+        a.args.append(Literal(2))
+        self.assertNotEqual(a, b)
+        a.args.pop()
+        self.assertEqual(hash(a), h)
+        a.args[0] = Literal(3)
+        self.assertNotEqual(hash(a), h)
+        self.assertNotEqual(a, b)
+        a.args[0:1] = [Literal(1)]
+        self.assertEqual(hash(a), h)
+        a.args.reverse()
+        self.assertNotEqual(hash(a), h)
+        a.args.sort(key=lambda e: e.__class__.__name__, reverse=True)
+        self.assertEqual(hash(a), h)
+        del a.args[0]
+        self.assertNotEqual(hash(a), h)
+
+    def test_typeddict(self):
+        a = call()
+        h = hash(a)
+        a.kwargs['y'] = Literal('w')
+        self.assertNotEqual(hash(a), h)
+        a.kwargs.update({'y': Literal('z')})
+        self.assertEqual(hash(a), h)
+        a.kwargs.pop('y')
+        self.assertNotEqual(hash(a), h)
+        a.kwargs.setdefault('y', Literal('z'))
+        self.assertEqual(hash(a), h)
+
+    def test_deferred(self):
+        a = call()
+        h = hash(a)
+        with a.deferred():
+            a.args.append(Literal(2))
+            self.assertNotEqual(hash(a), h)
+            a.args.append(Literal(3))
+            inner = hash(a)
+        self.assertEqual(hash(a), inner)
+        self.assertNotEqual(hash(a), h)
+
+    def test_unchecked(self):
+        a = Unchecked('f', [Identifier('x')])
+        b = Unchecked('f', [Identifier('x')])
+        self.assertEqual(hash(a), hash(b))
+        # the writes aren't observed, so the hash isn't kept
+        self.assertIs(Unchecked.__setattr__, object.__setattr__)
+        self.assertIsNone(a._hash)
+        self.assertIsNotNone(a.args[0]._hash)
+        a.name = 'g'
+        self.assertNotEqual(hash(a), hash(b))
+        self.assertNotEqual(a, b)
+        # still unchecked
+        a.name = 1
+        self.assertEqual(Unchecked(name='f').name, 'f')
+
+    def test_unchecked_lists(self):
+        # writes to the plain lists of unchecked classes aren't observed
+        a = Unchecked('f', [Unchecked('g', [Identifier('x')])])
+        b = Unchecked('f', [Unchecked('g', [Identifier('x')])])
+        self.assertEqual(hash(a), hash(b))
+        a.args[0].args.append(Identifier('y'))
+        self.assertNotEqual(hash(a), hash(b))
+        self.assertNotEqual(a, b)
+        b.args[0].args.append(Identifier('y'))
+        self.assertEqual(a, b)
+        self.assertEqual({a: 'a'}[b], 'a')
+        a = Unchecked('f', [Identifier('x')])
+        b = Unchecked('f', [Identifier('x')])
+        hash(a)
+        hash(b)
+        a.args.append(Identifier('x'))
+        b.args.append(Identifier('x'))
+        self.assertEqual(a, b)
+        self.assertIn(b, set([a]))
+        # nor to the lists held by a field
+        a = Literal([1])
+        h = hash(a)
+        a.value.append(2)
+        self.assertNotEqual(hash(a), h)
+        self.assertEqual(a, Literal([1, 2]))
+
+    def test_slots(self):
+        a = Slotted('f', [Identifier('x')])
+        b = Slotted('f', [Identifier('x')])
+        self.assertEqual(hash(a), hash(b))
+        self.assertIsNotNone(a._hash)
+        self.assertEqual(a, b)
+        a.args.append(Identifier('y'))
+        self.assertIsNone(a._hash)
+        self.assertNotEqual(hash(a), hash(b))
+
+    def test_unhashable(self):
+        a = Literal([1, 2])
+        self.assertEqual(hash(a), hash(Literal([1, 2])))
+        a = Literal(None)
+        object.__setattr__(a, 'value', {'a': set()})
+        self.assertRaises(TypeError, hash, a)
+        b = Literal(None)
+        object.__setattr__(b, 'value', {'a': set()})
+        self.assertEqual(a, b)
+
+    def test_equality(self):
+        self.assertEqual(Literal(1), Literal(True))
+        self.assertEqual(hash(Literal(1)), hash(Literal(True)))
+        self.assertNotEqual(Literal(1), Identifier('x'))
+        self.assertNotEqual(Literal(1), 1)
+        a = call()
+        b = call()
+        b.args[1] = Literal(None)
+        hash(a)
+        hash(b)
+        self.assertNotEqual(a, b)
+
+    def test_deep(self):
+        def chain(depth):
+            node = Identifier('x')
+            for i in range(depth):
+                node = Call(node)
+            return node
+        depth = sys.getrecursionlimit() * 2
+        a = chain(depth)
+        b = chain(depth)
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(a, b)
+
+if __name__ == '__main__':
+    unittest.main()
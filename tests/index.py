@@ -0,0 +1,123 @@
+import unittest
+import sys
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast.index import Index
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Keyword(Identifier):
+    pass
+
+
+class Literal(Expression):
+    value = ast.field((str, int, bool), null=True)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class Unchecked(ast.Node):
+    _debug = False
+    name = ast.field(str)
+    args = ast.seq(Expression, null=True)
+
+
+def tree():
+    return Call(Identifier('f'), [
+        Identifier('x'),
+        Literal(1),
+        Call(Keyword('g'), [Identifier('x')]),
+    ], {'y': Identifier('y')})
+
+
+class IndexTestCase(unittest.TestCase):
+    def test_find(self):
+        root = tree()
+        index = Index(root, fields=[(Identifier, 'name')])
+        self.assertEqual(len(index), 8)
+        self.assertEqual(index.count(Expression), 8)
+        self.assertEqual(index.count(Identifier), 5)
+        self.assertEqual(index.find(Keyword), [root.args[2].callee])
+        self.assertEqual(len(index.find(Identifier, name='x')), 2)
+        self.assertEqual(index.find(Keyword, name='g'),
+                         [root.args[2].callee])
+        self.assertEqual(index.find(Keyword, name='x'), [])
+        # fields without a table are compared one by one
+        self.assertEqual(index.find(Literal, value=1), [root.args[1]])
+        self.assertIn(root.kwargs['y'], index)
+        self.assertNotIn(Identifier('y'), index)
+
+        with self.assertRaises(ValueError):
+            Index(root, fields=[(Call, 'callee')])
+        with self.assertRaises(ValueError):
+            Index(root, fields=[(Identifier, 'value')])
+
+    def test_writes(self):
+        root = tree()
+        index = Index(root, fields=[(Identifier, 'name')])
+        inner = root.args[2]
+        inner.args.append(Identifier('x'))
+        self.assertEqual(len(index.find(Identifier, name='x')), 3)
+        inner.callee.name = 'x'
+        self.assertEqual(len(index.find(Identifier, name='x')), 4)
+        self.assertEqual(index.find(Identifier, name='g'), [])
+        removed = root.args.pop(2)
+        self.assertEqual(len(index.find(Identifier, name='x')), 1)
+        self.assertNotIn(removed, index)
+        # no longer in the tree
+        removed.args.append(Identifier('x'))
+        self.assertEqual(index.count(Identifier, name='x'), 1)
+        root.kwargs['z'] = removed
+        self.assertEqual(index.count(Identifier, name='x'), 5)
+        root.callee = Literal(2)
+        self.assertEqual(index.count(Literal), 2)
+        self.assertEqual(index.count(Identifier, name='f'), 0)
+        with root.args.deferred():
+            root.args.append(Identifier('d'))
+        self.assertEqual(index.count(Identifier, name='d'), 1)
+
+    def test_shared(self):
+        x = Identifier('x')
+        root = Call(x, [x, x])
+        index = Index(root, fields=[(Identifier, 'name')])
+        self.assertEqual(index.find(Identifier, name='x'), [x])
+        root.args.pop()
+        root.callee = Identifier('f')
+        self.assertEqual(index.find(Identifier, name='x'), [x])
+        root.args.clear()
+        self.assertEqual(index.find(Identifier), [root.callee])
+
+    def test_unobserved(self):
+        x = Identifier('x')
+        root = Unchecked('u', [x])
+        index = Index(root, fields=[(Identifier, 'name')])
+        self.assertEqual(index.find(Identifier), [x])
+        # a plain list, compared on every lookup
+        root.args.append(Identifier('y'))
+        self.assertEqual(index.count(Identifier, name='y'), 1)
+        root.args = []
+        self.assertEqual(index.count(Identifier), 0)
+
+    def test_close(self):
+        root = tree()
+        index = Index(root)
+        index.close()
+        root.args.append(Identifier('z'))
+        self.assertEqual(len(index), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
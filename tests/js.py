@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import unittest
+import sys
+import io
+import json
+from collections import OrderedDict
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast.dump import js
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    value = ast.field((str, int, bool, float, tuple), null=True)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq((Expression, str, int), null=True)
+    kwargs = ast.dict((Expression, int, float), null=True)
+
+
+class Typed(Expression):
+    type = ast.field(str)
+    name = ast.field(str, null=True)
+
+
+class Constant(ast.FrozenNode):
+    _debug = True
+    value = ast.field((str, int), null=True)
+
+
+class Tuple(ast.FrozenNode):
+    _debug = True
+    items = ast.seq(Constant, null=True)
+    names = ast.dict(Constant, null=True)
+
+
+def struct(node):
+    """The structure the dump used to be built from, for json.dumps"""
+    if node is None or isinstance(node, (int, bool, str)):
+        return node
+    result = OrderedDict({'type': None})
+    if isinstance(node, ast.Node):
+        result['type'] = node.__class__.__name__
+        for name in node._fields:
+            result[name] = struct(getattr(node, name))
+    elif isinstance(node, (list, tuple)):
+        result = [struct(item) for item in node]
+    elif isinstance(node, dict):
+        result = dict((key, struct(item)) for key, item in node.items())
+    return result
+
+
+def tree():
+    return Call(Identifier('f'), [
+        Literal(None),
+        Literal(True),
+        Literal(-12),
+        Literal(u'zażółć "x"\n'),
+        Literal(1.5),
+        Literal((1, 2)),
+        'arg', 3,
+        Call(Identifier('g')),
+        Typed('t', 'n'),
+    ], {'y': Literal('y'), 'z': 1.5, 'w': 2})
+
+
+class JSDumpTestCase(unittest.TestCase):
+    def test_same_output(self):
+        for node in (tree(), Call(Identifier('f')), Typed('t'), None):
+            expected = struct(node)
+            self.assertEqual(js.dump(node), json.dumps(expected, indent=2))
+            self.assertEqual(js.dump(node, compact=True),
+                             json.dumps(expected, separators=(',', ':')))
+
+    def test_keys(self):
+        # None is a valid key, written "null" like json.dumps does
+        node = Call(Identifier('f'), [Literal(1)], {None: 2, 1: Literal(3)})
+        text = js.dump(node)
+        self.assertEqual(text, json.dumps(struct(node), indent=2))
+        self.assertEqual(json.loads(text)['kwargs']['null'], 2)
+
+    def test_stream(self):
+        fp = io.StringIO()
+        self.assertEqual(js.dump(tree(), fp), None)
+        self.assertEqual(fp.getvalue(), js.dump(tree()))
+        chunks = list(js.iterdump(Call(Identifier('f'), [
+            Identifier('x%d' % i) for i in range(js.CHUNK_SIZE)])))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(len(json.loads(''.join(chunks))['args']),
+                         js.CHUNK_SIZE)
+
+    def test_deep(self):
+        a = Identifier('x')
+        for i in range(sys.getrecursionlimit() * 2):
+            a = Call(a)
+        text = js.dump(a, compact=True)
+        self.assertTrue(text.startswith('{"type":"Call","callee":{'))
+        self.assertTrue(text.endswith('"kwargs":{}}'))
+
+    def test_load(self):
+        classes = (Identifier, Literal, Call)
+        a = Call(Identifier('f'), [Literal(None), Literal(u'zażółć'), 'x', 3,
+                                   Call(Identifier('g'))],
+                 {'y': Literal(True), 'z': 2})
+        for validate in (False, True):
+            b = js.load(js.dump(a), validate=validate, classes=classes)
+            self.assertEqual(a, b)
+            self.assertTrue(isinstance(b.args, ast.TypedList))
+            self.assertTrue(isinstance(b.kwargs, ast.TypedDict))
+            self.assertRaises(TypeError, b.args.append, 1.5)
+        self.assertEqual(js.load(js.dump([a, {'k': a}]), classes=classes),
+                         [a, {'k': a}])
+
+        # fields missing from the dump take their defaults
+        b = js.load('{"type": "Call", "callee": {"type": "Identifier", '
+                    '"name": "f"}}', classes=classes)
+        self.assertEqual(b, Call(Identifier('f')))
+
+    def test_frozen(self):
+        a = Tuple([Constant(1), Constant('x')], {'y': Constant(None)})
+        text = js.dump(a, compact=True)
+        self.assertEqual(text, '{"type":"Tuple","items":[{"type":"Constant",'
+                         '"value":1},{"type":"Constant","value":"x"}],'
+                         '"names":{"y":{"type":"Constant","value":null}}}')
+        for validate in (False, True):
+            self.assertTrue(js.load(text, validate=validate,
+                                    classes=(Tuple, Constant)) is a)
+
+    def test_load_errors(self):
+        # floats are dumped as {"type": null}
+        text = js.dump(Literal(1.5))
+        self.assertRaises(TypeError, js.load, text, validate=True,
+                          classes=(Literal,))
+        self.assertRaises(ValueError, js.load, js.dump(Identifier('x')),
+                          classes=(Literal,))
+        Other = type('Identifier', (ast.Node,), {'name': ast.field(str)})
+        self.assertRaises(ValueError, js.load, js.dump(Identifier('x')),
+                          classes=(Identifier, Other))
+        self.assertEqual(js.registry((Expression, Identifier, Other)),
+                         {'Identifier': None})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import unittest
+import tempfile
+import pickle
+import os
+import io
+import sys
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast.dump import binary, mapped
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    value = ast.field((str, int, float, bool, list, tuple, dict), null=True)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class Empty(Expression):
+    pass
+
+
+class Slotted(ast.Node):
+    _slots = True
+    _parents = True
+    callee = ast.field(ast.Node)
+    args = ast.seq(ast.Node, null=True)
+
+
+class Constant(ast.FrozenNode):
+    value = ast.field((str, int))
+    args = ast.seq(ast.Node, null=True)
+
+
+def tree():
+    return Call(Identifier('f'), [
+        Literal(None),
+        Literal(True),
+        Literal(-1),
+        Literal(2 ** 70),
+        Literal(1.5),
+        Literal(u'zażółć'),
+        Literal([1, [2, 'x'], {'a': (3, None)}]),
+        Call(Identifier('g'), [Empty()], {'x': Identifier('x')}),
+    ], {'y': Literal('y'), 'z': Identifier('f')})
+
+
+class MappedTestCase(unittest.TestCase):
+    def test_roundtrip(self):
+        a = tree()
+        b = mapped.load(mapped.dump(a))
+        self.assertEqual(len(b), 15)
+        self.assertEqual(b.root, a)
+        self.assertEqual(b.decoded, 15)
+        root = b.root
+        self.assertIs(type(root), Call)
+        self.assertIsInstance(root.args, ast.TypedList)
+        self.assertIsInstance(root.kwargs, ast.TypedDict)
+        self.assertEqual(root.args[6].value[2]['a'], (3, None))
+        self.assertRaises(TypeError, root.args.append, 'x')
+        # dumped again as Nodes of their class
+        self.assertEqual(binary.load(binary.dump(b.root)), a)
+
+    def test_lazy(self):
+        a = tree()
+        b = mapped.load(mapped.dump(a))
+        self.assertEqual(b.decoded, 0)
+        root = b.root
+        self.assertIsInstance(root, Call)
+        self.assertIsNot(type(root), Call)
+        self.assertEqual(root.args[7].callee.name, 'g')
+        # the root, the inner call, its callee and the Empty Node it holds
+        self.assertEqual(b.decoded, 4)
+        self.assertIs(type(root), Call)
+        self.assertIsNot(type(root.args[0]), Literal)
+        self.assertIs(type(root.args[7]), Call)
+        # read along with the call
+        self.assertIs(type(root.args[7].args[0]), Empty)
+        # written before being read
+        root.args[1].value = 2
+        self.assertEqual(root.args[1].value, 2)
+        self.assertIs(type(root.args[1]), Literal)
+        with self.assertRaises(TypeError):
+            root.args[2].value = object()
+        self.assertEqual(pickle.loads(pickle.dumps(root.kwargs['z'])),
+                         Identifier('f'))
+        self.assertEqual(b.decoded, 7)
+
+    def test_files(self):
+        a = tree()
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.assertIsNone(mapped.dump(a, path))
+            with mapped.load(path) as b:
+                self.assertEqual(b.root, a)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), mapped.dump(a))
+                b = mapped.load(f)
+            callee = b.root.callee
+            b.close()
+            with self.assertRaises(ValueError):
+                callee.name
+        finally:
+            os.remove(path)
+        fp = io.BytesIO()
+        mapped.dump(a, fp)
+        self.assertEqual(mapped.load(fp.getvalue()).root, a)
+
+    def test_modes(self):
+        a = Slotted(Identifier('f'), [Slotted(Identifier('g'), [])])
+        b = mapped.load(mapped.dump(a)).root
+        self.assertEqual(b, a)
+        self.assertIs(b.args[0].parent, b)
+        self.assertIs(b.args[0].root(), b)
+        self.assertIs(b.args[0].args.__class__, a.args[0].args.__class__)
+
+        c = Constant(1, [Identifier('x'), Constant(2)])
+        d = mapped.load(mapped.dump(Slotted(Identifier('f'), [c]))).root
+        # read along with the Node holding it
+        self.assertIs(type(d.args[0]), Constant)
+        self.assertEqual(d.args[0].value, 1)
+        self.assertIs(d.args[0].args[1], Constant(2))
+        self.assertEqual(d.args[0].args[0].name, 'x')
+        self.assertIs(mapped.load(mapped.dump(c)).root.args[1], Constant(2))
+
+    def test_errors(self):
+        data = mapped.dump(tree())
+        self.assertRaises(ValueError, mapped.load, data, classes=[Call])
+        self.assertRaises(ValueError, mapped.load, b'PYAST\x01')
+        self.assertRaises(TypeError, mapped.dump, [Identifier('x')])
+        self.assertEqual(mapped.load(data, classes=[
+            Call, Identifier, Literal, Empty]).root, tree())
+
+        class Identifier2(ast.Node):
+            name = ast.field(str)
+            value = ast.field(int)
+        data = mapped.dump(Identifier2('x', 1))
+        self.assertRaises(ValueError, mapped.load, data, classes=[
+            type('Identifier2', (ast.Node,), {
+                '__qualname__': Identifier2.__qualname__,
+                'name': ast.field(str)})])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+import io
+import sys
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast import parallel
+from pyast.dump import js, raw
+from pyast.template import render
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    _template = '%(name)s'
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    _template = '%(value)r'
+    value = ast.field((str, int), null=True)
+
+
+class Call(Expression):
+    _template = '%(callee)s(%(args)s)'
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+
+
+class Program(ast.Node):
+    _debug = True
+    _template = '%(body)s'
+    body = ast.seq(Expression, null=True)
+    names = ast.seq(str, null=True)
+
+
+class Module(Program):
+    def _template_body(self):
+        return '\n'.join(repr(item) for item in self.body)
+
+
+def program(size, cls=Program):
+    shared = Identifier('shared')
+    body = []
+    for i in range(size):
+        body.append(Call(Identifier('f%d' % i),
+                         [Literal(i), Literal('x'), Literal(None)]))
+    # held at several depths
+    body.append(shared)
+    body.append(Call(shared, [shared]))
+    return cls(body, ['a', 'b'])
+
+
+class ParallelTestCase(unittest.TestCase):
+    def check(self, root, transport):
+        self.assertEqual(parallel.render(root, workers=3,
+                                         transport=transport), render(root))
+        for compact in (False, True):
+            self.assertEqual(parallel.dump_js(root, compact=compact,
+                                              workers=3, transport=transport),
+                             js.dump(root, compact=compact))
+        for max_depth in (None, 0, 1, 2):
+            self.assertEqual(parallel.dump_raw(root, max_depth=max_depth,
+                                               workers=3,
+                                               transport=transport),
+                             raw.dump(root, max_depth=max_depth))
+
+    def test_fork(self):
+        self.check(program(50), 'fork')
+
+    def test_binary(self):
+        self.check(program(50), 'binary')
+
+    def test_serial(self):
+        root = program(50)
+        # written by the method of the root
+        self.check(program(50, Module), None)
+        self.assertEqual(parallel.dump_raw(root, max_nodes=30, workers=3),
+                         raw.dump(root, max_nodes=30))
+        self.assertEqual(parallel.render(root, workers=1), render(root))
+        small = Program([Identifier('x')])
+        self.assertEqual(parallel.render(small, workers=3), render(small))
+        fp = io.StringIO()
+        self.assertIsNone(parallel.dump_js(root, fp, workers=2))
+        self.assertEqual(fp.getvalue(), js.dump(root))
+
+    def test_fields(self):
+        root = program(10)
+        self.assertEqual(parallel.render(root, field='body', workers=2),
+                         render(root))
+        self.assertEqual(parallel.render(root, field='names', workers=2),
+                         render(root))
+        for field in ('nothing', 'name'):
+            with self.assertRaises(ValueError):
+                parallel.render(Identifier('x'), field=field, workers=2)
+        with self.assertRaises(ValueError):
+            parallel.render(Identifier('x'), workers=2)
+        with self.assertRaises(ValueError):
+            parallel.render(root, workers=2, transport='pipe')
+
+    def test_own_templates(self):
+        root = program(20)
+        root.body[3]._template = 'own'
+        root.body[5].args[0]._template = '<%(value)s>'
+        expected = render(root)
+        self.assertIn('own', expected)
+        for transport in ('binary', None):
+            self.assertEqual(parallel.render(root, workers=3,
+                                             transport=transport), expected)
+
+    def test_import_error(self):
+        class Missing(Expression):
+            _template = 'missing'
+        Missing.__module__ = 'pyast_missing_grammar'
+        root = Program([Call(Missing(), []), Identifier('x')])
+        with self.assertRaises(ImportError) as caught:
+            parallel.render(root, workers=2, transport='binary')
+        self.assertEqual(caught.exception.name, 'pyast_missing_grammar')
+        self.assertIn('pyast_missing_grammar', str(caught.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import unittest
+import pickle
+import gc
+import sys
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast.dump import binary
+from pyast.parents import ParentedList, ParentedDict
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+    _parents = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class Unchecked(ast.Node):
+    _debug = False
+    _parents = True
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+
+
+class Slotted(ast.Node):
+    _debug = True
+    _slots = True
+    _parents = True
+    args = ast.seq(Expression, null=True)
+
+
+class Plain(ast.Node):
+    _debug = True
+    args = ast.seq(Expression, null=True)
+
+
+class ParentsTestCase(unittest.TestCase):
+    def test_fields(self):
+        f, a, b = Identifier('f'), Identifier('a'), Identifier('b')
+        call = Call(f, [a], {'b': b})
+        self.assertIs(f.parent, call)
+        self.assertIs(a.parent, call)
+        self.assertIs(b.parent, call)
+        self.assertIsNone(call.parent)
+        self.assertIsInstance(call.args, ParentedList)
+        self.assertIsInstance(call.kwargs, ParentedDict)
+        self.assertEqual(f.path(), ['callee'])
+        self.assertEqual(a.path(), ['args', 0])
+        self.assertEqual(b.path(), ['kwargs', 'b'])
+
+        outer = Call(Identifier('g'), [Identifier('x'), call])
+        self.assertEqual(a.path(), ['args', 1, 'args', 0])
+        self.assertIs(a.root(), outer)
+        self.assertIs(outer.root(), outer)
+
+        g = Identifier('g')
+        call.callee = g
+        self.assertIsNone(f.parent)
+        self.assertIs(g.parent, call)
+        # reassigning the same Node keeps it
+        call.callee = g
+        self.assertIs(g.parent, call)
+
+    def test_lists(self):
+        a, b, c = Identifier('a'), Identifier('b'), Identifier('c')
+        call = Call(Identifier('f'), [a, b])
+        call.args.insert(0, c)
+        self.assertEqual(b.path(), ['args', 2])
+        self.assertEqual(c.path(), ['args', 0])
+        self.assertIs(call.args.pop(), b)
+        self.assertIsNone(b.parent)
+        call.args.remove(c)
+        self.assertIsNone(c.parent)
+        call.args[0] = b
+        self.assertIsNone(a.parent)
+        self.assertEqual(b.path(), ['args', 0])
+        call.args[1:] = [a, c]
+        self.assertEqual(c.path(), ['args', 2])
+        del call.args[:2]
+        self.assertIsNone(a.parent)
+        self.assertIsNone(b.parent)
+        call.args.extend([a, b])
+        call.args.reverse()
+        self.assertEqual(a.path(), ['args', 1])
+        call.args.clear()
+        self.assertIsNone(c.parent)
+
+        with call.args.deferred():
+            call.args.append(a)
+            call.args.append(b)
+        self.assertEqual(b.path(), ['args', 1])
+
+        def fail():
+            with call.args.deferred():
+                call.args.pop(0)
+                call.args.append(c)
+                call.args.append('x')
+        self.assertRaises(TypeError, fail)
+        self.assertEqual(call.args, [a, b])
+        self.assertEqual(a.path(), ['args', 0])
+        self.assertIsNone(c.parent)
+
+        # the items of the replaced list are no longer held
+        old = call.args
+        call.args = [c]
+        self.assertIsNone(a.parent)
+        self.assertIs(c.parent, call)
+        old.append(b)
+        self.assertIsNone(b.parent)
+
+    def test_dicts(self):
+        a, b = Identifier('a'), Identifier('b')
+        call = Call(Identifier('f'), [], {'a': a})
+        call.kwargs['a'] = b
+        self.assertIsNone(a.parent)
+        self.assertEqual(b.path(), ['kwargs', 'a'])
+        call.kwargs.update(c=a)
+        self.assertEqual(a.path(), ['kwargs', 'c'])
+        self.assertIs(call.kwargs.pop('c'), a)
+        self.assertIsNone(a.parent)
+        call.kwargs.setdefault('d', a)
+        self.assertEqual(a.path(), ['kwargs', 'd'])
+        del call.kwargs['a']
+        self.assertIsNone(b.parent)
+        call.kwargs.clear()
+        self.assertIsNone(a.parent)
+
+    def test_modes(self):
+        a, b = Identifier('a'), Identifier('b')
+        unchecked = Unchecked(Identifier('f'), [a])
+        unchecked.args.append(b)
+        self.assertEqual(b.path(), ['args', 1])
+        unchecked.args.pop(0)
+        self.assertIsNone(a.parent)
+
+        slotted = Slotted([a])
+        self.assertIs(a.parent, slotted)
+        self.assertIn('_parent', Slotted.__slots__)
+
+        # classes without _parents don't record anything
+        plain = Plain([b])
+        self.assertIs(b.parent, unchecked)
+        self.assertIs(plain.args.__class__, ast.TypedList)
+
+        with self.assertRaises(TypeError):
+            class Frozen(ast.FrozenNode):
+                _parents = True
+
+    def test_copies(self):
+        a = Identifier('a')
+        call = Call(Identifier('f'), [a], {})
+        outer = Call(Identifier('g'), [call])
+        for copied in (outer.clone(),
+                       pickle.loads(pickle.dumps(outer)),
+                       binary.load(binary.dump(outer))):
+            inner = copied.args[0]
+            self.assertIs(inner.parent, copied)
+            self.assertEqual(inner.args[0].path(), ['args', 0, 'args', 0])
+            self.assertIs(inner.args[0].root(), copied)
+        self.assertIs(a.parent, call)
+
+    def test_weak(self):
+        a = Identifier('a')
+        call = Call(Identifier('f'), [a])
+        del call
+        gc.collect()
+        self.assertIsNone(a.parent)
+        self.assertEqual(a.path(), [])
+        self.assertIs(a.root(), a)
+
+
+if __name__ == '__main__':
+    unittest.main()
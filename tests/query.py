@@ -0,0 +1,141 @@
+import unittest
+import sys
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast.query import compile_selector, select
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Keyword(Identifier):
+    pass
+
+
+class Literal(Expression):
+    value = ast.field((str, int, bool), null=True)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class Unchecked(ast.Node):
+    _debug = False
+    name = ast.field(str)
+    args = ast.seq(Expression, null=True)
+
+
+classes = [Expression, Identifier, Keyword, Literal, Call, Unchecked]
+
+
+def tree():
+    return Call(Identifier('f'), [
+        Identifier('x'),
+        Literal(1),
+        Call(Keyword('g'), [Identifier('x'), Literal(True)]),
+    ], {'y': Identifier('y')})
+
+
+class QueryTestCase(unittest.TestCase):
+    def select(self, root, text):
+        return compile_selector(text, classes).select(root)
+
+    def test_steps(self):
+        root = tree()
+        inner = root.args[2]
+        self.assertEqual(self.select(root, 'Call'), [root, inner])
+        self.assertEqual(len(self.select(root, 'Identifier')), 5)
+        self.assertEqual(self.select(root, 'Keyword'), [inner.callee])
+        self.assertEqual(self.select(root, 'Identifier[name="x"]'),
+                         [root.args[0], inner.args[0]])
+        self.assertEqual(len(self.select(root, "Identifier[name!='x']")), 3)
+        self.assertEqual(self.select(root, 'Literal[value=1]'),
+                         [root.args[1]])
+        # 1 is not true
+        self.assertEqual(self.select(root, 'Literal[value=true]'),
+                         [inner.args[1]])
+        self.assertEqual(self.select(root, 'Literal[value=null]'), [])
+        self.assertEqual(self.select(root, '*[name="g"]'), [inner.callee])
+        self.assertEqual(len(self.select(root, '*[value]')), 2)
+        self.assertEqual(len(self.select(root, '*')), 9)
+
+    def test_combinators(self):
+        root = tree()
+        inner = root.args[2]
+        self.assertEqual(self.select(root, 'Call Call'), [inner])
+        self.assertEqual(self.select(root, 'Call > Keyword'), [inner.callee])
+        self.assertEqual(self.select(root, 'Call Call > Identifier'),
+                         [inner.callee, inner.args[0]])
+        self.assertEqual(self.select(root, 'Call > Call > Literal'),
+                         [inner.args[1]])
+        self.assertEqual(self.select(root, 'Keyword Identifier'), [])
+        # selected once however they are reached
+        self.assertEqual(len(self.select(root, 'Call Identifier')), 5)
+
+    def test_paths(self):
+        root = tree()
+        inner = root.args[2]
+        self.assertEqual(self.select(root, 'Call.args[*] > Call'), [inner])
+        self.assertEqual(self.select(root, 'Call.args[1] > Literal'),
+                         [root.args[1], inner.args[1]])
+        self.assertEqual(self.select(root, 'Call.kwargs["y"] > Identifier'),
+                         [root.kwargs['y']])
+        self.assertEqual(self.select(root, 'Call.callee > Keyword'),
+                         [inner.callee])
+        self.assertEqual(self.select(root, 'Call.args[*] Identifier[name="x"]'),
+                         [root.args[0], inner.args[0]])
+        self.assertEqual(self.select(root, 'Identifier.name'),
+                         ['f', 'x', 'g', 'x', 'y'])
+        self.assertEqual(self.select(root, 'Call Call.args[0]'),
+                         [inner.args[0]])
+        self.assertEqual(self.select(root, 'Call.args[5]'), [])
+
+    def test_unchecked(self):
+        x = Identifier('x')
+        root = Unchecked('u', [x])
+        self.assertEqual(self.select(root, 'Identifier'), [x])
+        # not validated, so not pruned
+        root.args.append(Call(Identifier('f'), []))
+        self.assertEqual(self.select(root, 'Call > Identifier'),
+                         [root.args[1].callee])
+        self.assertEqual(self.select(root, 'Unchecked[name="u"]'), [root])
+
+    def test_errors(self):
+        for text in ('Identifier[value=1]', 'Nothing', 'Call.callee[0]',
+                     'Call >', 'Identifier[name=x]', 'Call.args[*', '',
+                     'Call,Identifier'):
+            with self.assertRaises(ValueError):
+                compile_selector(text, classes)
+        # names shared by several classes
+        class Expression(ast.Node):
+            pass
+        with self.assertRaises(ValueError):
+            compile_selector('Expression', classes + [Expression])
+        self.assertEqual(select(tree(), 'Keyword', classes=classes),
+                         [tree().args[2].callee])
+
+    def test_redefined(self):
+        def define():
+            class QueryRedefined(Expression):
+                name = ast.field(str)
+            return QueryRedefined
+        old = define()('x')
+        self.assertEqual(select(Call(old), 'QueryRedefined'), [old])
+        # the compiled selector names the class replacing the first one
+        new = define()('x')
+        self.assertEqual(select(Call(new), 'QueryRedefined'), [new])
+        self.assertEqual(select(Call(old), 'QueryRedefined'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
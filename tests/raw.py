@@ -0,0 +1,122 @@
+import unittest
+import sys
+import io
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast.dump import raw
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    value = ast.field((str, int, bool), null=True)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class Constant(ast.FrozenNode):
+    _debug = True
+    value = ast.field((str, int), null=True)
+
+
+class Tuple(ast.FrozenNode):
+    _debug = True
+    items = ast.seq(Constant, null=True)
+    names = ast.dict(Constant, null=True)
+
+
+def tree():
+    return Call(Identifier('f'), [
+        Literal(None),
+        Literal(True),
+        Literal(-12),
+        Literal('x'),
+        Call(Identifier('g')),
+    ], {'y': Literal('y'), 'z': Identifier('z')})
+
+
+# the output of the recursive dump this module used to return
+TREE = """\
+[Call]
+  .callee[Identifier]
+    .name[str="f"]
+  .args
+    [Literal]
+    [Literal]
+      .value[bool=True]
+    [Literal]
+      .value[int=-12]
+    [Literal]
+      .value[str="x"]
+    [Call]
+      .callee[Identifier]
+        .name[str="g"]
+      .args
+      .kwargs
+  .kwargs
+    [Literal]
+      .value[str="y"]
+    [Identifier]
+      .name[str="z"]
+"""
+
+
+class RawDumpTestCase(unittest.TestCase):
+    def test_same_output(self):
+        self.assertEqual(raw.dump(tree()), TREE)
+        self.assertEqual(raw.dump(Call(Identifier('f'))),
+                         '[Call]\n  .callee[Identifier]\n    .name[str="f"]\n'
+                         '  .args\n  .kwargs\n')
+        self.assertEqual(raw.dump(Literal(None)), '[Literal]\n')
+        self.assertEqual(raw.dump(None), '')
+
+    def test_stream(self):
+        fp = io.StringIO()
+        self.assertEqual(raw.dump(tree(), fp), None)
+        self.assertEqual(fp.getvalue(), raw.dump(tree()))
+        chunks = list(raw.iterdump(Call(Identifier('f'), [
+            Identifier('x%d' % i) for i in range(raw.CHUNK_SIZE)])))
+        self.assertTrue(len(chunks) > 1)
+
+    def test_frozen(self):
+        a = Tuple([Constant(1), Constant('x')], {'y': Constant(None)})
+        self.assertEqual(raw.dump(a), '[Tuple]\n'
+                         '  .items\n'
+                         '    [Constant]\n'
+                         '      .value[int=1]\n'
+                         '    [Constant]\n'
+                         '      .value[str="x"]\n'
+                         '  .names\n'
+                         '    [Constant]\n')
+
+    def test_limits(self):
+        self.assertEqual(raw.dump(tree(), max_depth=0), '[Call]\n  ...\n')
+        self.assertEqual(raw.dump(tree(), max_nodes=2),
+                         '[Call]\n  .callee[Identifier]\n    ...\n')
+        lines = raw.dump(tree(), max_depth=1).splitlines()
+        self.assertEqual(lines[:5], ['[Call]', '  .callee[Identifier]',
+                                     '    ...', '  .args', '    [Literal]'])
+        self.assertEqual(raw.dump(tree(), max_nodes=100), raw.dump(tree()))
+
+    def test_deep(self):
+        a = Identifier('x')
+        for i in range(sys.getrecursionlimit() * 2):
+            a = Call(a)
+        lines = raw.dump(a).splitlines()
+        self.assertEqual(lines[-1].strip(), '.kwargs')
+        self.assertEqual(len(raw.dump(a, max_nodes=10).splitlines()), 11)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+import weakref
+import sys
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast import mutation
+from pyast.rewrite import Rewriter
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    value = ast.field(int)
+
+
+class Binary(Expression):
+    operator = ast.field(('+', '*'))
+    left = ast.field(Expression)
+    right = ast.field(Expression)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+class Names(ast.Node):
+    _debug = True
+    names = ast.seq(Identifier, null=True)
+
+
+class Unchecked(ast.Node):
+    _debug = False
+    args = ast.seq(Expression, null=True)
+
+
+class Constant(ast.FrozenNode):
+    _debug = True
+    value = ast.field(int)
+    args = ast.seq(Expression, null=True)
+
+
+def folding():
+    rules = Rewriter()
+
+    @rules.rule(Binary, operator='+', left=Literal, right=Literal)
+    def add(node):
+        return Literal(node.left.value + node.right.value)
+
+    @rules.rule(Binary, operator='*', left=Literal, right=Literal)
+    def multiply(node):
+        return Literal(node.left.value * node.right.value)
+
+    @rules.rule(Binary, operator='+', right=Literal)
+    def zero(node):
+        if node.right.value == 0:
+            return node.left
+
+    @rules.rule(Identifier, name='x')
+    def rename(node):
+        return {'name': 'y'}
+    return rules
+
+
+class RewriteTestCase(unittest.TestCase):
+    def test_fold(self):
+        rules = folding()
+        # (1 + 2) * (x + (3 * 0))
+        tree = Call(Identifier('f'), [
+            Binary('*', Binary('+', Literal(1), Literal(2)),
+                   Binary('+', Identifier('x'),
+                          Binary('*', Literal(3), Literal(0)))),
+            Binary('+', Binary('+', Literal(1), Literal(1)), Literal(1)),
+        ], {'k': Identifier('x')})
+        args = tree.args
+        self.assertIs(rules.rewrite(tree), tree)
+        self.assertIs(tree.args, args)
+        self.assertEqual(tree, Call(Identifier('f'), [
+            Binary('*', Literal(3), Identifier('y')),
+            Literal(3),
+        ], {'k': Identifier('y')}))
+        # a fixpoint
+        h = hash(tree)
+        self.assertIs(rules.rewrite(tree), tree)
+        self.assertEqual(tree._hash, h)
+
+        self.assertEqual(rules.rewrite(Binary('+', Literal(1), Literal(2))),
+                         Literal(3))
+
+    def test_replacements(self):
+        rules = Rewriter()
+
+        @rules.rule(Call, callee=Identifier)
+        def inline(node):
+            # rewritten in turn
+            return Binary('+', Identifier('x'), Literal(len(node.args)))
+
+        @rules.rule(Identifier, name='x')
+        def rename(node):
+            return Identifier('z')
+        tree = Call(Literal(0), [Call(Identifier('f'), [Literal(1)])])
+        rules.rewrite(tree)
+        self.assertEqual(tree.args[0], Binary('+', Identifier('z'),
+                                              Literal(1)))
+
+    def test_batched(self):
+        rules = folding()
+        tree = Call(Identifier('f'), [
+            Binary('+', Literal(1), Literal(2)),
+            Binary('+', Literal(3), Literal(4)),
+        ])
+        writes = []
+
+        class Observer(object):
+            def touched(self, obj):
+                writes.append(obj)
+        observer = Observer()
+        ref = weakref.ref(observer)
+        mutation.observers.append(ref)
+        try:
+            rules.rewrite(tree)
+        finally:
+            mutation.forget(ref)
+        self.assertEqual(tree.args, [Literal(3), Literal(7)])
+        # the list once, not once per item
+        self.assertEqual([obj for obj in writes if obj is tree.args],
+                         [tree.args])
+
+        names = Names([Identifier('a'), Identifier('x')])
+        rules.rewrite(names)
+        self.assertEqual(names.names[1].name, 'y')
+
+        bad = Rewriter()
+        bad.add(Identifier, lambda node: Literal(1))
+        with self.assertRaises(TypeError):
+            bad.rewrite(Names([Identifier('a')]))
+
+    def test_modes(self):
+        rules = folding()
+        unchecked = Unchecked([Binary('+', Literal(1), Literal(2))])
+        rules.rewrite(unchecked)
+        self.assertEqual(unchecked.args, [Literal(3)])
+
+        frozen = Constant(1, [Binary('+', Literal(1), Literal(2))])
+        rewritten = rules.rewrite(frozen)
+        self.assertIsNot(rewritten, frozen)
+        self.assertEqual(rewritten.args, (Literal(3),))
+        self.assertEqual(rewritten.value, 1)
+
+    def test_rules(self):
+        rules = Rewriter(limit=10)
+        rules.add(Identifier, lambda node: Identifier(node.name + 'x'))
+        with self.assertRaises(RuntimeError):
+            rules.rewrite(Call(Identifier('f'), []))
+        with self.assertRaises(ValueError):
+            rules.add(Identifier, lambda node: None, value=1)
+        rules = Rewriter()
+        rules.add(Identifier, lambda node: {'value': 1})
+        with self.assertRaises(ValueError):
+            rules.rewrite(Identifier('x'))
+        rules = Rewriter()
+        # nothing to do: unchanged values, unmatched classes
+        rules.add(Identifier, lambda node: {'name': node.name})
+        rules.add(Literal, lambda node: Literal(node.value + 1), value=-1)
+        tree = Call(Identifier('f'), [Literal(1)])
+        self.assertIs(rules.rewrite(tree), tree)
+        self.assertEqual(tree, Call(Identifier('f'), [Literal(1)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
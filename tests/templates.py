@@ -1,6 +1,44 @@
 import unittest
+import sys
+import io
 
 import pyast as ast
+from pyast.template import render, iterrender, CHUNK_SIZE, RenderCache
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+    _template = '%(name)s'
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq(Expression, null=True)
+    kwargs = ast.dict(Expression, null=True)
+    _template = '%(callee)s(%(args)s, %(kwargs)s)'
+
+
+class Unchecked(ast.Node):
+    _debug = False
+    value = ast.field(Expression)
+    _template = '<%(value)s>'
+
+
+class Custom(Expression):
+    name = ast.field(str)
+
+    def __repr__(self):
+        return self.name
+
+
+def call():
+    return Call(Identifier('f'), [Identifier('a'), Call(Identifier('g'))],
+                {'k': Identifier('v')})
 
 
 class BaseASTTestCase(unittest.TestCase):
@@ -140,5 +178,228 @@ class BaseASTTestCase(unittest.TestCase):
        
         self.assertEqual(str(e), '{"key1": "val1"}')
 
+    def test_formats(self):
+        class Value(ast.Node):
+            content = ast.field((str, int))
+
+            _template = '%(content)s'
+
+        class Entity(ast.Node):
+            _debug = True
+            id = ast.field(str)
+            value = ast.field(Value, null=True)
+            count = ast.field(int)
+
+            _template = '%(id)-5s|%(value)r|%(value)4s|%(count)03d|100%%'
+
+        e = Entity('foo', Value('val'), 7)
+        self.assertEqual(str(e), "foo  |'val'| val|007|100%")
+        e.value = None
+        self.assertEqual(str(e), "foo  |None|None|007|100%")
+
+        # not compiled, formatted with every field
+        Entity._template = '%s'
+        self.assertTrue(str(e).startswith("{'id': 'foo'"))
+        Entity._template = '%(other)s'
+        self.assertRaises(KeyError, str, e)
+
+    def test_containers(self):
+        class Value(ast.Node):
+            content = ast.field((str, int))
+
+            _template = '%(content)s'
+
+        class Raw(ast.Node):
+            content = ast.field(str)
+
+        class Entity(ast.Node):
+            _debug = True
+            items = ast.seq((Value, Raw, str), null=True)
+            attrs = ast.dict((Value, int), null=True)
+
+            _template = '%(items)s %(attrs)s'
+
+        e = Entity([Value('a'), Raw('b'), 'c'], {'x': Value(1), 'y': 2})
+        self.assertEqual(str(e), "[a, <Node:Raw (content)>, 'c'] "
+                                 "{'x': 1, 'y': 2}")
+
+        class Listed(Entity):
+            def _template_items(self):
+                return '; '.join(map(str, self.items))
+
+        e = Listed([Value('a'), Value('b')])
+        self.assertEqual(str(e), 'a; b {}')
+
+    def test_unreferenced(self):
+        class Entity(ast.Node):
+            _debug = True
+            id = ast.field(str)
+            value = ast.field(str, null=True)
+
+            _template = '<%(id)s>'
+
+        e = Entity('foo')
+        # formatting it would fail
+        object.__setattr__(e, 'value', [1])
+        e._template_value = 'not callable'
+        self.assertEqual(str(e), '<foo>')
+
+    def test_render(self):
+        class Value(ast.Node):
+            content = ast.field(str)
+
+            _template = '"%(content)s"'
+
+        class Entity(ast.Node):
+            _debug = True
+            values = ast.seq(Value, null=True)
+            next = ast.field(ast.Node, null=True)
+
+            _template = '%(values)s%(next)s'
+
+        e = Entity([Value(str(i)) for i in range(CHUNK_SIZE)])
+        fp = io.StringIO()
+        self.assertEqual(render(e, fp), None)
+        self.assertEqual(fp.getvalue(), str(e))
+        self.assertTrue(len(list(iterrender(e))) > 1)
+
+        for i in range(sys.getrecursionlimit() * 2):
+            e = Entity([Value('x')], e)
+        self.assertTrue(render(e).startswith('["x"]["x"]'))
+
+
+class RenderCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = RenderCache()
+
+    def tearDown(self):
+        self.cache.close()
+
+    def assertRendered(self, node):
+        self.assertEqual(self.cache.render(node), render(node))
+
+    def test_cached(self):
+        a = call()
+        self.assertRendered(a)
+        self.assertIn(a, self.cache)
+        self.assertIn(a.args[1], self.cache)
+        # leaves are rendered every time
+        self.assertNotIn(a.callee, self.cache)
+        self.assertEqual(len(self.cache), 2)
+        fp = io.StringIO()
+        self.cache.render(a, fp)
+        self.assertEqual(fp.getvalue(), repr(a))
+
+    def test_writes(self):
+        a = call()
+        inner = a.args[1]
+        self.cache.render(a)
+        inner.callee.name = 'h'
+        self.assertNotIn(inner, self.cache)
+        self.assertNotIn(a, self.cache)
+        self.assertRendered(a)
+        self.assertTrue('h([], {})' in self.cache.render(a))
+
+        writes = (
+            lambda: inner.args.append(Identifier('x')),
+            lambda: inner.args.insert(0, Identifier('y')),
+            lambda: inner.args.extend([Identifier('z')]),
+            lambda: inner.args.__setitem__(0, Identifier('w')),
+            lambda: inner.args.__delitem__(0),
+            lambda: inner.args.pop(),
+            lambda: inner.kwargs.__setitem__('k', Identifier('v')),
+            lambda: inner.kwargs.pop('k'),
+            lambda: setattr(inner, 'callee', Identifier('i')),
+        )
+        for write in writes:
+            self.cache.render(a)
+            self.assertIn(a, self.cache)
+            write()
+            self.assertNotIn(a, self.cache)
+            self.assertRendered(a)
+
+    def test_shared(self):
+        shared = Call(Identifier('s'))
+        a = Call(Identifier('a'), [shared])
+        b = Call(Identifier('b'), [shared])
+        self.cache.render(a)
+        self.cache.render(b)
+        shared.args.append(Identifier('x'))
+        self.assertNotIn(a, self.cache)
+        self.assertNotIn(b, self.cache)
+        self.assertRendered(a)
+        self.assertRendered(b)
+
+    def test_deferred(self):
+        a = call()
+        self.cache.render(a)
+        with a.deferred():
+            a.args.append(Identifier('x'))
+            self.assertRendered(a)
+            self.assertNotIn(a, self.cache)
+            a.args.append(Identifier('y'))
+        self.assertRendered(a)
+        self.assertIn(a, self.cache)
+
+    def test_volatile(self):
+        a = Call(Identifier('f'), [Call(Custom('c'))])
+        self.assertRendered(a)
+        self.assertNotIn(a, self.cache)
+
+        u = Unchecked(Identifier('x'))
+        self.assertRendered(u)
+        self.assertIn(u, self.cache)
+        u.value = Identifier('y')
+        self.assertNotIn(u, self.cache)
+        self.assertRendered(u)
+        # unchecked seq fields hold plain lists
+        u.value = Call(Identifier('f'))
+        object.__setattr__(u.value, 'args', [Identifier('x')])
+        self.assertRendered(u)
+        self.assertNotIn(u, self.cache)
+
+    def test_eviction(self):
+        a = call()
+        self.cache.render(a)
+        self.cache.evict(a.args[1])
+        self.assertEqual(len(self.cache), 0)
+        self.cache.render(a)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+        small = RenderCache(maxsize=3)
+        b = Call(Identifier('b'), [Call(Identifier('c%d' % i))
+                                   for i in range(5)])
+        self.assertEqual(small.render(b), render(b))
+        self.assertTrue(len(small) <= 3)
+        self.assertNotIn(b, small)
+        small.close()
+    def test_templates(self):
+        class Name(ast.Node):
+            _debug = True
+            _template = '%(name)s'
+            name = ast.field(str)
+
+        class Group(ast.Node):
+            _debug = True
+            _template = '(%(items)s)'
+            items = ast.seq(Name, null=True)
+
+        class Outer(ast.Node):
+            _debug = True
+            _template = '%(group)s'
+            group = ast.field(Group)
+
+        a = Outer(Group([Name('x'), Name('y')]))
+        self.assertRendered(a)
+        self.assertIn(a, self.cache)
+        Name._template = '<%(name)s>'
+        self.assertEqual(self.cache.render(a), '([<x>, <y>])')
+        Group._template_items = lambda self: ' '.join(map(repr, self.items))
+        self.assertEqual(self.cache.render(a), '(<x> <y>)')
+        Group._template = '[%(items)s]'
+        self.assertEqual(self.cache.render(a), '[<x> <y>]')
+        self.assertIn(a, self.cache)
+
 if __name__ == '__main__':
     unittest.main()
@@ -53,6 +53,52 @@ class BaseTypedDictTestCase(unittest.TestCase):
         a['w'] = "ab"
         a['l'] = "ba"
 
+    def test_init(self):
+        a = TypedDict(types=("ab", 2), init={'x': "ab", 'y': 2})
+        self.assertEqual(a, {'x': "ab", 'y': 2})
+        self.assertRaises(TypeError, TypedDict, ("ab", 2), {'x': "ab", 'y': 3})
+        try:
+            TypedDict(str, {'x': 2})
+        except TypeError as e:
+            self.assertEqual(str(e), 'This dict accepts only elements: str')
+    def test_bulk(self):
+        a = TypedDict(str, null=True)
+        a.update({'x': 'a'}, y='b')
+        a.update([('z', 'c')])
+        a |= {'w': 'd'}
+        self.assertEqual(a.setdefault('v', 'e'), 'e')
+        self.assertEqual(a.setdefault('v', 'f'), 'e')
+        self.assertEqual(a, {'x': 'a', 'y': 'b', 'z': 'c', 'w': 'd',
+                             'v': 'e'})
+        self.assertRaises(TypeError, a.update, {'u': 'a', 't': 1})
+        self.assertRaises(TypeError, a.update, t=1)
+        self.assertRaises(TypeError, a.setdefault, 't', 1)
+        self.assertRaises(TypeError, a.__ior__, {'t': 1})
+        self.assertNotIn('u', a)
+        self.assertNotIn('t', a)
+
+    def test_deferred(self):
+        a = TypedDict(str, null=True)
+        with a.deferred():
+            a['x'] = 'a'
+            a['y'] = 2
+            a['y'] = 'b'
+        self.assertEqual(a, {'x': 'a', 'y': 'b'})
+
+        def fill():
+            with a.deferred():
+                a['z'] = 2
+        self.assertRaises(TypeError, fill)
+        self.assertRaises(TypeError, a.__setitem__, 'w', 2)
+        # put back as it was when the block was entered
+        self.assertEqual(a, {'x': 'a', 'y': 'b'})
+
+        def fail():
+            with a.deferred():
+                del a['x']
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(a, {'x': 'a', 'y': 'b'})
 
 if __name__ == '__main__':
     unittest.main()
@@ -63,6 +63,63 @@ class BaseTypedListTestCase(unittest.TestCase):
         a.append("ab")
         a.append("ba")
 
+    def test_mixed_bulk(self):
+        a = TypedList(types=(str, int), null=True)
+        a.extend(['a', 1, True, 'b'])
+        a.extend(i for i in ('c', 2))
+        self.assertEqual(a, ['a', 1, True, 'b', 'c', 2])
+        self.assertRaises(TypeError, a.extend, ['a', 1, 2.0])
+        self.assertEqual(len(a), 6)
+
+        a = TypedList(types=("ab", 2, "ba"), init=["ab", 2] * 100)
+        a[0:2] = ["ba", "ba"]
+        self.assertRaises(TypeError, a.__setitem__, slice(0, 2), ["ab", 3])
+        self.assertRaises(TypeError, a.__setitem__, 0, [2])
+        self.assertRaises(TypeError, a.extend, [["ab"]])
+        self.assertEqual(a[:3], ["ba", "ba", "ab"])
+
+        a = TypedList(types=("ab",), null=True)
+        a.append("ab")
+        a[0] = "ab"
+        self.assertRaises(TypeError, a.__setitem__, 0, "ce")
+
+        a = TypedList(types=(str,), null=True)
+        a += ['a', 'b']
+        a += (i for i in 'c')
+        self.assertEqual(a, ['a', 'b', 'c'])
+        with self.assertRaises(TypeError):
+            a += ['d', 1]
+        self.assertEqual(a, ['a', 'b', 'c'])
+    def test_deferred(self):
+        a = TypedList(types=(str,), null=True)
+        with a.deferred():
+            a.append("foo")
+            a.append(2)
+            a.append("bar")
+            a.pop(1)
+        self.assertEqual(a, ["foo", "bar"])
+
+        try:
+            with a.deferred():
+                a.extend(["x", "y"])
+                with a.deferred():
+                    a.insert(1, 3)
+                a[0] = "z"
+        except TypeError as e:
+            self.assertEqual(str(e), "This list accepts only elements: "
+                             "<class 'str'> (invalid element at index 1)")
+        else:
+            self.fail('TypeError not raised')
+        self.assertRaises(TypeError, a.append, 2)
+        # put back as it was when the outermost block was entered
+        self.assertEqual(a, ["foo", "bar"])
+
+        def fail():
+            with a.deferred():
+                a.append("baz")
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(a, ["foo", "bar"])
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import sys
+sys.path.insert(0, './')
+
+import pyast as ast
+from pyast.visit import walk, iter_child_nodes, NodeVisitor, NodeTransformer
+
+
+class Expression(ast.Node):
+    _abstract = True
+    _debug = True
+
+
+class Identifier(Expression):
+    name = ast.field(str)
+
+
+class Literal(Expression):
+    value = ast.field((str, int, bool), null=True)
+
+
+class Call(Expression):
+    callee = ast.field(Expression)
+    args = ast.seq((Expression, str), null=True)
+    kwargs = ast.dict(Expression, null=True)
+
+
+def tree():
+    return Call(Identifier('f'), [
+        Literal(1),
+        'x',
+        Call(Identifier('g'), [Identifier('a')]),
+    ], {'y': Identifier('y')})
+
+
+class VisitTestCase(unittest.TestCase):
+    def test_child_fields(self):
+        self.assertEqual(Identifier._child_fields, ())
+        self.assertEqual(Literal._child_fields, ())
+        self.assertEqual(Call._child_fields, ('callee', 'args', 'kwargs'))
+
+    def test_walk(self):
+        a = tree()
+        names = [n.__class__.__name__ for n in walk(a)]
+        self.assertEqual(names, ['Call', 'Identifier', 'Literal', 'Call',
+                                 'Identifier', 'Identifier', 'Identifier'])
+        self.assertEqual(list(iter_child_nodes(a)),
+                         [a.callee, a.args[0], a.args[2], a.kwargs['y']])
+
+    def test_visitor(self):
+        class Names(NodeVisitor):
+            def __init__(self):
+                self.names = []
+
+            def visit_Identifier(self, node):
+                self.names.append(node.name)
+
+            def visit_Call(self, node):
+                self.generic_visit(node)
+                return 'call'
+
+        visitor = Names()
+        self.assertEqual(visitor.visit(tree()), 'call')
+        self.assertEqual(visitor.names, ['f', 'g', 'a', 'y'])
+        self.assertEqual(Names._methods[Identifier], Names.visit_Identifier)
+        # generic_visit(), inlined
+        self.assertIs(Names._methods[Literal], False)
+
+    def test_nested_visit(self):
+        class Counter(NodeVisitor):
+            count = 0
+
+            def visit_Call(self, node):
+                self.visit(node.callee)
+                self.generic_visit(node)
+
+            def visit_Identifier(self, node):
+                self.count += 1
+
+        visitor = Counter()
+        visitor.visit(tree())
+        self.assertEqual(visitor.count, 6)
+
+    def test_transformer(self):
+        class Rename(NodeTransformer):
+            def visit_Identifier(self, node):
+                if node.name == 'a':
+                    return None
+                if node.name == 'y':
+                    return None
+                return Identifier(node.name.upper())
+
+            def visit_Literal(self, node):
+                return [Literal(2), Literal(3)]
+
+        a = Rename().visit(tree())
+        self.assertEqual(a, Call(Identifier('F'), [
+            Literal(2), Literal(3), 'x', Call(Identifier('G'))]))
+        self.assertTrue(isinstance(a.args, ast.TypedList))
+
+        class Invalid(NodeTransformer):
+            def visit_Literal(self, node):
+                return 1.5
+        self.assertRaises(TypeError, Invalid().visit, tree())
+
+    def test_generators(self):
+        class Depth(NodeVisitor):
+            depth = deepest = 0
+
+            def visit_Call(self, node):
+                self.depth += 1
+                self.deepest = max(self.depth, self.deepest)
+                self.generic_visit(node)
+                yield
+                self.depth -= 1
+                return self.depth
+
+        visitor = Depth()
+        self.assertEqual(visitor.visit(tree()), 0)
+        self.assertEqual(visitor.deepest, 2)
+
+        class Inline(NodeTransformer):
+            # replaces calls of f by their first argument, innermost first
+            def visit_Call(self, node):
+                self.generic_visit(node)
+                yield
+                if node.callee.name == 'f' and node.args:
+                    return node.args[0]
+                return node
+
+        a = Call(Identifier('f'), [Call(Identifier('f'), [Identifier('x')])])
+        self.assertEqual(Inline().visit(a), Identifier('x'))
+        a = Call(Identifier('g'), [Call(Identifier('f'), [Identifier('x')])])
+        self.assertEqual(Inline().visit(a),
+                         Call(Identifier('g'), [Identifier('x')]))
+
+    def test_deep(self):
+        a = Identifier('x')
+        for i in range(sys.getrecursionlimit() * 2):
+            a = Call(a)
+        self.assertEqual(len(list(walk(a))), sys.getrecursionlimit() * 2 + 1)
+
+        class Unwrap(NodeTransformer):
+            def visit_Call(self, node):
+                self.generic_visit(node)
+                yield
+                return node.callee
+
+        self.assertEqual(Unwrap().visit(a), Identifier('x'))
+
+if __name__ == '__main__':
+    unittest.main()